@@ -0,0 +1,53 @@
+'''
+Paquete con las funciones para transformar, analizar, tabular y visualizar los datos de la encuesta.
+
+Las funciones públicas se pueden importar directamente del paquete (por ejemplo
+"from modulos import prevalencias"). Los módulos se importan hasta que se usa alguna de sus funciones,
+de modo que importar el paquete no carga pandas, samplics, openpyxl ni plotly
+(ver "python -m modulos.tiempos_importacion").
+'''
+import importlib
+
+# funciones y clases públicas de cada módulo
+API = {
+    'func_analisis': ['proporciones', 'proporciones_des', 'codigos_observados', 'validar_dicc',
+                      'tabla_recodificacion', 'recodificar', 'prevalencias', 'prevalencias_des',
+                      'tabulados_prevalencias', 'prevalencias_subconjuntos', 'patrones_policonsumo',
+                      'varianza_conglomerados', 'regresiones_logisticas', 'regresion_logistica',
+                      'agregados_upm', 'prevalencias_agregadas'],
+    'func_transformacion': ['procesar_datos_geo', 'generar_diccs_geo', 'obj_a_num', 'arreglar_palabras',
+                            'grupo_etario', 'claves_enteras', 'vincular_hogares', 'ImputacionHotDeck', 'imputar_hot_deck'],
+    'func_calibracion': ['totales_control', 'matriz_calibracion', 'raking', 'calibracion_lineal', 'resumen_ponderadores',
+                         'calibrar', 'prevalencias_calibradas'],
+    'func_validacion': ['LibroCodigos', 'ReglaPase', 'leer_pases', 'validar_variable', 'validar_base', 'IndiceCodigos'],
+    'func_derivadas': ['VariableDerivada', 'RegistroDerivadas'],
+    'func_salida': ['establecer_fuente_global', 'obtener_fuente_global', 'DataFrameAnid', 'Tabulado',
+                    'generar_reporte', 'generar_reporte_estilizado', 'generar_reporte_continuo', 'actualizar_reporte',
+                    'aplicar_estilo', 'IndiceAgrupaciones', 'esquema_xlsx_consulta', 'esquema_csv_xlsx_gema',
+                    'esquema_gema_lote', 'exportar_gema', 'guardar_tabulados_parquet', 'leer_tabulados_parquet',
+                    'exportar_tabulados_parquet'],
+    'func_visualizacion': ['grafico_dispersion', 'barras_sexo', 'barras_temporalidad', 'barras_renglon', 'barras_reticula',
+                           'construir_dispersion', 'construir_barras_sexo', 'construir_barras_temporalidad',
+                           'construir_barras_renglon', 'construir_barras_reticula', 'renderizar_lote', 'guardar_grafico',
+                           'exportar_tablero', 'cargar_geometrias', 'construir_mapa', 'mapas_lote'],
+    'servicio_estimaciones': ['AlmacenEstimaciones', 'ServicioEstimaciones'],
+}
+
+_MODULO = {nombre: modulo for modulo, nombres in API.items() for nombre in nombres}
+
+__all__ = sorted(_MODULO)
+
+def __getattr__(nombre):
+    """
+    Importa el módulo de "nombre" la primera vez que se usa y guarda la función en el paquete.
+    """
+    if nombre in _MODULO:
+        valor = getattr(importlib.import_module('.' + _MODULO[nombre], __name__), nombre)
+        globals()[nombre] = valor
+        return valor
+    if nombre in API:
+        return importlib.import_module('.' + nombre, __name__)
+    raise AttributeError("el paquete '" + __name__ + "' no tiene el atributo '" + nombre + "'")
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(API))
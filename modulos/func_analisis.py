@@ -8,11 +8,12 @@ import pandas as pd
 import json
 
 from statistics import NormalDist
-from samplics.estimation import TaylorEstimator
-from samplics.utils.types import SinglePSUEst
 
 # - # - # - # - # - # ----------------- PROCESAMIENTO DE DATOS ----------------- # - # - # - # - # - # 
 
+# valor de la tabla de reclasificación para las claves que no están en el diccionario
+SIN_CLASIFICAR = 255
+
 # ------------------ Función para calcular prevalencia en una sola variable ------------------ #
 def proporciones(b, clave_preg, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
     """ 
@@ -51,6 +52,10 @@ def proporciones(b, clave_preg, alp = 0.95, ponderador = 'factor_exp', estrato =
         Tabla con la estimación puntual, intervalo de confianza, coeficiente de variación y error estándar.
     """
 
+    # samplics tarda en importarse, sólo se importa cuando se necesita
+    from samplics.estimation import TaylorEstimator
+    from samplics.utils.types import SinglePSUEst
+
     # creación del objeto
     c = TaylorEstimator("proportion")
     # estimacion puntual, coeficiente de variación y error estándar.
@@ -140,6 +145,286 @@ def proporciones_des(b, clave_preg, var_des, alp = 0.95, ponderador = 'factor_ex
 
     return resultado.sort_values(var_des)
 
+# ------------------ Función para obtener las claves de respuesta observadas en una variable ------------------ #
+def codigos_observados(b, var):
+    """
+    Regresa el conjunto de claves de respuesta (sin nulos) que aparecen en la variable "var" de la base "b".
+
+    El conjunto se calcula con una búsqueda vectorizada de valores únicos sobre los datos recibidos. Las claves no 
+    se guardan en la base: pandas comparte sus atributos ("attrs") con las copias y los subconjuntos, por lo que 
+    un caché guardado ahí podría regresar las claves de otra base. Para revisar diccionarios sin recorrer los datos 
+    se puede usar "IndiceCodigos" (func_validacion).
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    var : str
+        Nombre de la variable.
+
+    Salida
+    ------
+    frozenset
+        Claves de respuesta observadas en la variable.
+    """
+    return frozenset(pd.unique(b[var].dropna()).tolist())
+
+# ------------------ Función para revisar el diccionario de reclasificación ------------------ #
+def validar_dicc(b, lista_vars, dicc):
+    """
+    Revisa que el diccionario "dicc" reclasifique como 0 o 1 todas las respuestas observadas en "lista_vars".
+
+    Las claves 0 y 1 que no estén en el diccionario se conservan como 0 y 1 respectivamente.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    lista_vars : lista
+        Lista con los nombres de las variables que se van a reclasificar.
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+
+    Salida
+    ------
+    None
+        Genera un AssertionError si el diccionario no está bien hecho.
+    """
+    revisar_codigos([codigos_observados(b, x) for x in lista_vars], dicc)
+
+# ------------------ Función para revisar las claves de respuesta contra el diccionario ------------------ #
+def revisar_codigos(rv, dicc):
+    """
+    Revisa que el diccionario "dicc" reclasifique como 0 o 1 todas las claves de respuesta observadas "rv" 
+    (lista con un conjunto de claves por variable). Ver "validar_dicc".
+    """
+    # criterio para revisar que todas las posibles respuestas de 'lista_vars' están en 'dicc'
+    c1=set().union(*rv)-(set(dicc.keys()).union({1,0}))
+    # criterio para revisar que todas las posibles respuestas se clasifican como 0s o 1s
+    c2=set(dicc.values())
+
+    if c1!=set({}):
+        raise AssertionError("En el diccionario para reclasificar falta incluir la(s) clave(s): "+str(c1).replace('{','').replace('}',''))
+
+    elif c2.issubset({0,1})==False:
+        raise AssertionError(
+            "Los valores para reclasificar sólo pueden ser 1 o 0")
+
+# ------------------ Función para construir la tabla de reclasificación ------------------ #
+def tabla_recodificacion(dicc, max_codigo):
+    """
+    Construye un arreglo de NumPy que traduce cada clave entera de respuesta (su posición) a 0 o 1.
+
+    Las claves 0 y 1 que no estén en el diccionario se conservan como 0 y 1; las demás claves que no están 
+    en el diccionario se marcan con SIN_CLASIFICAR. La última posición del arreglo (max_codigo + 1) se 
+    reserva para los valores nulos y vale 0.
+
+    Parámetros
+    ----------
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+    max_codigo : int
+        Clave de respuesta más grande que se va a traducir.
+
+    Salida
+    ------
+    ndarray
+        Arreglo de tipo uint8 de longitud max_codigo + 2.
+    """
+    tabla = np.full(max_codigo + 2, SIN_CLASIFICAR, dtype=np.uint8)
+    tabla[0] = 0
+    if max_codigo >= 1:
+        tabla[1] = 1
+    tabla[-1] = 0
+    for k, v in dicc.items():
+        if isinstance(k, (int, float, np.integer, np.floating)) and float(k).is_integer() and 0 <= k <= max_codigo:
+            tabla[int(k)] = v
+    return tabla
+
+# ------------------ Función para reclasificar una variable como 0 o 1 ------------------ #
+def recodificar(b, var, dicc):
+    """
+    Reclasifica las respuestas de la variable "var" como 0 o 1 de acuerdo con "dicc".
+
+    Cuando las claves de respuesta son enteros pequeños y no negativos (el caso de los cuestionarios), 
+    la reclasificación se hace con una tabla de traducción y `np.take`, sin recorrer los datos en Python. 
+    El tamaño de la tabla se toma de la clave más grande de los datos. En otro caso se utiliza `Series.map`. 
+    Los valores nulos se reclasifican como 0.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    var : str
+        Nombre de la variable que se va a reclasificar.
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+
+    Salida
+    ------
+    ndarray
+        Arreglo de tipo uint8 con la variable reclasificada. 
+        Genera un AssertionError si hay claves en los datos que no están en el diccionario.
+    """
+    if pd.api.types.is_numeric_dtype(b[var]):
+        x = b[var].to_numpy(dtype=np.float64, na_value=np.nan)
+        nulos = np.isnan(x)
+        validos = x[~nulos]
+        if len(validos) == 0:
+            return np.zeros(len(x), dtype=np.uint8)
+
+        max_codigo = validos.max()
+        if validos.min() >= 0 and max_codigo <= np.iinfo(np.uint16).max and (validos == np.floor(validos)).all():
+            max_codigo = int(max_codigo)
+            tabla = tabla_recodificacion(dicc, max_codigo)
+            r = np.take(tabla, np.where(nulos, max_codigo + 1, x).astype(np.intp))
+            sin_clasificar = r == SIN_CLASIFICAR
+            if sin_clasificar.any():
+                faltan = set(pd.unique(x[sin_clasificar]).astype(np.int64).tolist())
+                raise AssertionError("En el diccionario para reclasificar falta incluir la(s) clave(s): "+str(faltan).replace('{','').replace('}',''))
+            return r
+
+    mapeo = {0:0, 1:1}
+    mapeo.update(dicc)
+    r = b[var].map(mapeo)
+    sin_clasificar = r.isna() & b[var].notna()
+    if sin_clasificar.any():
+        faltan = set(pd.unique(b[var][sin_clasificar]).tolist())
+        raise AssertionError("En el diccionario para reclasificar falta incluir la(s) clave(s): "+str(faltan).replace('{','').replace('}',''))
+    return r.fillna(0).to_numpy().astype(np.uint8)
+
+# ------------------ Función para generar la variable indicadora de ocurrencia ------------------ #
+def indicador_prevalencia(b, lista_vars, dicc):
+    """
+    Genera la variable que indica si a cada persona le ocurrió al menos uno de los eventos en "lista_vars".
+
+    El diccionario se valida una sola vez y cada variable se reclasifica con "recodificar";
+    la ocurrencia es el "o" lógico de las variables reclasificadas.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    lista_vars : lista
+        Lista con los nombres de las variables para las que se desea calcular prevalencia.
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+
+    Salida
+    ------
+    ndarray
+        Arreglo de tipo uint8 con 1 si ocurrió el evento y 0 si no ocurrió.
+    """
+    validar_dicc(b, lista_vars, dicc)
+
+    ocurrencia = np.zeros(len(b), dtype=np.uint8)
+    for v in lista_vars:
+        ocurrencia |= recodificar(b, v, dicc)
+
+    return ocurrencia
+
+# ------------------ Función para estimar la prevalencia a partir de la variable indicadora ------------------ #
+def prevalencia_indicador(b, var_ind, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima el porcentaje de la población en la que la variable indicadora "var_ind" vale 1.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    var_ind : str
+        Nombre de la variable indicadora (con valores 0 y 1).
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con la estimación puntual para la ocurrencia, su intervalo de confianza, coeficiente de variación y error estándar.
+    """
+    # estimación para la variable que indica ocurrencia.
+    pcj = proporciones(b, var_ind, alp, ponderador, estrato, upm)
+
+    # correción para los casos en que sólo hay un tipo de respuesta
+    if len(pcj)==1:
+        #inclusión de nuevo renglón llenado con ceros en variables que sabemos que serán cero
+        porcentajes = pd.concat([pcj,pd.DataFrame({'poblacion':[0],'error_std':[0],'cv':[0]}, index=[1])])
+        #llenado manual de valores distintos de cero
+        porcentajes.at[1,'clave_respuesta']=1-porcentajes.loc[0,'clave_respuesta']
+        porcentajes.at[1,'estimacion']=100-porcentajes.loc[0,'estimacion']
+        porcentajes.at[1,'ic_inf']=porcentajes.loc[1,'estimacion']
+        porcentajes.at[1,'ic_sup']=porcentajes.loc[1,'estimacion']
+
+    else:
+        porcentajes = pcj
+
+    # estructuración del dataframe de salida
+    ocurrencia = porcentajes[porcentajes['clave_respuesta']==1]
+    ocurrencia = ocurrencia[['estimacion','ic_inf','ic_sup','poblacion','error_std','cv']]
+
+    return ocurrencia
+
+# --------- Función para estimar la prevalencia de la variable indicadora desagregada por otra variable -------- #
+def prevalencia_indicador_des(b, var_ind, var_des, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Desagrega la población de acuerdo a la variable "var_des" y estima en cada subconjunto el porcentaje 
+    de la población en la que la variable indicadora "var_ind" vale 1.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    var_ind : str
+        Nombre de la variable indicadora (con valores 0 y 1).
+    var_des: list
+        Lista con las variable(s) en las que se desea desagregar la base b.
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con la estimación puntual para la ocurrencia, su intervalo de confianza, coeficiente de variación y error estándar.
+    """
+    # división de la base de datos en subconjuntos de acuerdo a la variable "var_des"
+    res={}
+    b_gb=b.groupby(var_des,sort=False)
+
+    # estimación calculada para cada subconjunto de la muestra
+    for ks, b_red in b_gb:
+        res[ks] = prevalencia_indicador(b_red, var_ind, alp, ponderador, estrato, upm).set_index('estimacion')
+
+    # estructuración del dataframe de salida
+    resultado = pd.concat(res).reset_index()
+    resultado.rename(columns=dict(zip(list(resultado.columns[0:len(var_des)]),var_des)), inplace=True)
+
+    return resultado.sort_values(var_des)
+
+# ------------------ Función para reducir la base y agregar la variable indicadora ------------------ #
+def _base_indicador(b, lista_vars, dicc, var_des, ponderador, estrato, upm):
+    """
+    Genera una copia reducida de "b" con las variables de diseño, las de desagregación y la variable 
+    indicadora de ocurrencia "var_agrupada", calculada una sola vez sobre toda la base.
+    """
+    cols = list(dict.fromkeys(var_des + [ponderador, estrato, upm]))
+    b_red = b[cols]
+    b_red.insert(0, 'var_agrupada', indicador_prevalencia(b, lista_vars, dicc))
+    return b_red
+
 # --------------- Función para calcular prevelencia de una variable o más ---------------- #
 def prevalencias(b, lista_vars, dicc, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
     """
@@ -151,8 +436,7 @@ def prevalencias(b, lista_vars, dicc, alp = 0.95, ponderador = 'factor_exp', est
     Mediante el diccionario 'dicc', la función recategoriza las respuestas a las preguntas de la lista de variables 'lista_vars' de la siguiente manera: 
     1 si el evento ocurrió
     0 si el evento no ocurrió
-    Posteriormente suma las respuestas recategorizadas, de modo que si en alguna de las preguntas ocurrió el evento, la suma será positiva. 
-    Mientras que la magnitud del número entero describe la cantidad de ocurrencias del evento.
+    Posteriormente genera la variable indicadora de ocurrencia, que vale 1 si en alguna de las preguntas ocurrió el evento (ver "indicador_prevalencia").
     
     Parámetros
     ----------
@@ -162,6 +446,7 @@ def prevalencias(b, lista_vars, dicc, alp = 0.95, ponderador = 'factor_exp', est
         Lista con los nombres de las variables para las que se desea calcular prevalencia.
     dicc : diccionario
         Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+        Para variables que ya están reclasificadas como 0 y 1 (por ejemplo, las variables derivadas de "func_derivadas") se usa {}.
     alp: float
         Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
         El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
@@ -179,62 +464,19 @@ def prevalencias(b, lista_vars, dicc, alp = 0.95, ponderador = 'factor_exp', est
     DataFrame
         Tabla con la estimación puntual para la ocurrencia, su intervalo de confianza, coeficiente de variación y error estándar.
     """
-    
-    listaT = lista_vars + [ponderador, estrato, upm]
-    
-    # condicionales para garantizar que el diccionario que utiliza la función está bien hecho
-    rv=[set(b[x].dropna()) for x in lista_vars]
-    # criterio para revisar que todas las posibles respuestas de 'lista_vars' están en 'dicc'
-    c1=set.union(*rv)-(set(dicc.keys()).union({1,0}))
-    # criterio para revisar que todas las posibles respuestas se clasifican como 0s o 1s
-    c2=set(dicc.values())
-    
-    if c1==set({}) and c2.issubset({0,1}):
-        # cálculo de frecuencia con la que ocurrió el evento en una copia reducida del conjunto de datos originales.
-        b_red = b[listaT]
-        b_red.insert(0, 'var_agrupada_frec', b_red[lista_vars].replace(dicc).sum(axis=1))
-        # creación de la variable que indica si hubo ocurrencia del evento.
-        b_red.insert(0, 'var_agrupada', 0)
-        b_red.loc[b_red['var_agrupada_frec']>0,'var_agrupada'] = 1
-
-        # estimación para la variable que indica ocurrencia.
-        pcj = proporciones(b_red, 'var_agrupada', alp, ponderador, estrato, upm)
-
-        # correción para los casos en que sólo hay un tipo de respuesta
-        if len(pcj)==1:
-            #inclusión de nuevo renglón llenado con ceros en variables que sabemos que serán cero
-            porcentajes = pd.concat([pcj,pd.DataFrame({'poblacion':[0],'error_std':[0],'cv':[0]}, index=[1])])
-            #llenado manual de valores distintos de cero
-            porcentajes.at[1,'clave_respuesta']=1-porcentajes.loc[0,'clave_respuesta']
-            porcentajes.at[1,'estimacion']=100-porcentajes.loc[0,'estimacion']
-            porcentajes.at[1,'ic_inf']=porcentajes.loc[1,'estimacion']
-            porcentajes.at[1,'ic_sup']=porcentajes.loc[1,'estimacion']
-           
-        else:
-            porcentajes = pcj
+    # cálculo de la variable que indica si hubo ocurrencia del evento en una copia reducida del conjunto de datos originales.
+    b_red = _base_indicador(b, lista_vars, dicc, [], ponderador, estrato, upm)
 
-        # estructuración del dataframe de salida
-        ocurrencia = porcentajes[porcentajes['clave_respuesta']==1]
-    
-    else:
-        # criterio para revisar que todas las posibles respuestas de 'lista_vars' están en 'dicc'
-        if c1!=set({}):
-            raise AssertionError("En el diccionario para reclasificar falta incluir la(s) clave(s): "+str(c1).replace('{','').replace('}',''))
-    
-        # criterio para revisar que todas las posibles respuestas se clasifican como 0s o 1s
-        elif c2.issubset({0,1})==False:
-            raise AssertionError(
-                "Los valores para reclasificar sólo pueden ser 1 o 0")
-            
-    ocurrencia = ocurrencia[['estimacion','ic_inf','ic_sup','poblacion','error_std','cv']]
-    
-    return ocurrencia
+    return prevalencia_indicador(b_red, 'var_agrupada', alp, ponderador, estrato, upm)
 
 # --------- Función para calcular prevelencias desagregadas por otra variable -------- #
 def prevalencias_des(b, lista_vars, dicc, var_des, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
     """
     Desagrega la población de acuerdo a la variable "var_des" y posteriormente estima a qué porcentaje de cada subconjunto le ha ocurrido al menos uno de los eventos en la lista de variables "lista_vars".
     Las estimaciones se calculan como porcentajes.
+
+    La reclasificación de las respuestas se hace una sola vez sobre toda la base; 
+    en cada subconjunto sólo se estima la variable indicadora de ocurrencia.
     
     Parámetros
     ----------
@@ -263,20 +505,9 @@ def prevalencias_des(b, lista_vars, dicc, var_des, alp = 0.95, ponderador = 'fac
     DataFrame
         Tabla con la estimación puntual para la ocurrencia, su intervalo de confianza, coeficiente de variación y error estándar.
     """
-    
-    # división de la base de datos en subconjuntos de acuerdo a la variable "var_des"
-    res={}
-    b_gb=b.groupby(var_des,sort=False)
-    
-    # estimación calculada para cada subconjunto de la muestra
-    for ks, b_red in b_gb:
-        res[ks] = prevalencias(b_red, lista_vars, dicc, alp, ponderador, estrato, upm).set_index('estimacion')
+    b_red = _base_indicador(b, lista_vars, dicc, var_des, ponderador, estrato, upm)
 
-    # estructuración del dataframe de salida
-    resultado = pd.concat(res).reset_index()
-    resultado.rename(columns=dict(zip(list(resultado.columns[0:len(var_des)]),var_des)), inplace=True)
-
-    return resultado.sort_values(var_des)
+    return prevalencia_indicador_des(b_red, 'var_agrupada', var_des, alp, ponderador, estrato, upm)
 
 # --- Función para agupar los cálculos de prevelencias totales y desagregadas por sexo y grupo etario --- #
 def tabulados_prevalencias(b, lista_vars, dicc, var_des = [], alp = 0.95, var_sexo='sexo', var_ge='grupo_etario', ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
@@ -291,6 +522,7 @@ def tabulados_prevalencias(b, lista_vars, dicc, var_des = [], alp = 0.95, var_se
         Lista con los nombres de las variables para las que se desea calcular prevalencia.
     dicc: diccionario
         Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+        Para variables que ya están reclasificadas como 0 y 1 se usa {}.
     var_des: list
         Lista con las variable(s) en las que se desea desagregar la base b.
     alp: float
@@ -314,18 +546,21 @@ def tabulados_prevalencias(b, lista_vars, dicc, var_des = [], alp = 0.95, var_se
     DataFrame
         Tabla agrupando las estimaciones por sexo y grupo etario de acuerdo a la desagregación var_des (si es que se incluyó).
     """
+    # reclasificación de las respuestas (una sola vez para todas las desagregaciones)
+    b_red = _base_indicador(b, lista_vars, dicc, var_des + [var_sexo, var_ge], ponderador, estrato, upm)
+
     # estimación de prevalencia para toda la población desagregada por sexo y grupo etario
-    x2 = prevalencias_des(b, lista_vars, dicc, var_des + [var_sexo,var_ge], alp, ponderador, estrato, upm)
+    x2 = prevalencia_indicador_des(b_red, 'var_agrupada', var_des + [var_sexo,var_ge], alp, ponderador, estrato, upm)
     
     # estimación de prevalencia para toda la población desagregada por sexo
-    x1 = prevalencias_des(b, lista_vars, dicc, var_des + [var_sexo], alp, ponderador, estrato, upm)
+    x1 = prevalencia_indicador_des(b_red, 'var_agrupada', var_des + [var_sexo], alp, ponderador, estrato, upm)
     x1.insert(0,var_ge,'Población total')
     
     # estimación de prevalencia para toda la población
     if var_des == []:       
-        x0 = prevalencias(b, lista_vars, dicc, alp, ponderador, estrato, upm)
+        x0 = prevalencia_indicador(b_red, 'var_agrupada', alp, ponderador, estrato, upm)
     else: 
-        x0 = prevalencias_des(b, lista_vars, dicc, var_des, alp, ponderador, estrato, upm)
+        x0 = prevalencia_indicador_des(b_red, 'var_agrupada', var_des, alp, ponderador, estrato, upm)
     
     x0.insert(0,var_ge,'Población total')
     x0.insert(0,var_sexo, 'Mujeres y hombres')
@@ -334,3 +569,717 @@ def tabulados_prevalencias(b, lista_vars, dicc, var_des = [], alp = 0.95, var_se
     x=pd.concat([x0,x1,x2]).rename(columns={var_ge:'grupo_etario'})
     
     return x
+
+# - # - # - # - # - # ----------------- ÍNDICE DE BITS PARA CONSUMO DE SUSTANCIAS ----------------- # - # - # - # - # - # 
+
+# número de bits encendidos de cada entero de 16 bits (tabla para contar sustancias de forma vectorizada)
+CONTEO_BITS = np.unpackbits(np.arange(2**16, dtype=np.uint16).view(np.uint8).reshape(-1, 2), axis=1).sum(axis=1, dtype=np.uint8)
+
+# ------------------ Función para generar el índice de bits ------------------ #
+def indice_bits(b, lista_vars, dicc):
+    """
+    Genera un entero de 16 bits por persona en el que el bit i vale 1 si ocurrió el evento de la variable lista_vars[i].
+
+    Cada variable se reclasifica una sola vez con "dicc" (ver "recodificar"), de modo que cualquier 
+    combinación de variables ("al menos una de", "al menos k de") se obtiene después con operaciones 
+    de bits, sin volver a recorrer las respuestas.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    lista_vars : lista
+        Lista con los nombres de las variables (máximo 16).
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+
+    Salida
+    ------
+    ndarray
+        Arreglo de tipo uint16 con el índice de bits de cada persona.
+    """
+    if len(lista_vars) > 16:
+        raise AssertionError("El índice de bits admite como máximo 16 variables")
+
+    validar_dicc(b, lista_vars, dicc)
+
+    bits = np.zeros(len(b), dtype=np.uint16)
+    for i, v in enumerate(lista_vars):
+        bits |= recodificar(b, v, dicc).astype(np.uint16) << np.uint16(i)
+
+    return bits
+
+# ------------------ Función para generar la máscara de un subconjunto de variables ------------------ #
+def mascara_bits(lista_vars, subconjunto):
+    """
+    Regresa el entero cuyos bits encendidos corresponden a las variables de "subconjunto" dentro de "lista_vars".
+    """
+    faltantes = set(subconjunto) - set(lista_vars)
+    if faltantes != set({}):
+        raise AssertionError("Las variables no están en el índice de bits: "+str(faltantes).replace('{','').replace('}',''))
+
+    return np.uint16(sum(1 << lista_vars.index(v) for v in set(subconjunto)))
+
+# ------------------ Función para generar el indicador de un subconjunto de variables ------------------ #
+def indicador_subconjunto(bits, mascara, k = 1):
+    """
+    Genera la variable que indica si ocurrieron al menos "k" de los eventos marcados en "mascara".
+
+    Parámetros
+    ----------
+    bits : ndarray
+        Índice de bits generado con "indice_bits".
+    mascara : int
+        Máscara del subconjunto de variables generada con "mascara_bits".
+    k : int
+        Número mínimo de eventos. El valor predeterminado es 1 ("al menos uno de").
+
+    Salida
+    ------
+    ndarray
+        Arreglo de tipo uint8 con 1 si ocurrieron al menos k eventos y 0 en otro caso.
+    """
+    return (np.take(CONTEO_BITS, bits & mascara) >= k).astype(np.uint8)
+
+# ------------------ Función para estimar prevalencias de varios subconjuntos de variables ------------------ #
+def prevalencias_subconjuntos(b, lista_vars, dicc, subconjuntos, var_des = [], alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima en lote la prevalencia de varios subconjuntos de "lista_vars" a partir de un solo índice de bits.
+
+    Las respuestas se reclasifican una sola vez; el indicador de cada subconjunto se obtiene con 
+    operaciones de bits (ver "indicador_subconjunto").
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    lista_vars : lista
+        Lista con los nombres de las variables que forman el índice de bits (máximo 16).
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+    subconjuntos : diccionario
+        Diccionario con el nombre de cada indicador y la lista de variables del subconjunto 
+        ("al menos una de"), o un diccionario {'variables': lista de variables, 'k': k} para "al menos k de".
+        Por ejemplo: {'mariguana_o_cocaina': ['di1a','di1b'], 'dos_o_mas': {'variables': lista_vars, 'k': 2}}
+    var_des : list
+        Lista con las variable(s) en las que se desea desagregar la base b.
+        El valor predeterminado es [], sin desagregación.
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con la columna "indicador" y la estimación de cada subconjunto (desagregada por var_des si se incluyó).
+    """
+    bits = indice_bits(b, lista_vars, dicc)
+    b_red = b[list(dict.fromkeys(var_des + [ponderador, estrato, upm]))].copy()
+
+    res = []
+    for nombre, s in subconjuntos.items():
+        if isinstance(s, dict):
+            vars_s, k = s['variables'], s.get('k', 1)
+        elif isinstance(s, list):
+            vars_s, k = s, 1
+        else:
+            raise AssertionError("El subconjunto '"+str(nombre)+"' debe ser una lista de variables o un diccionario {'variables': lista, 'k': k}")
+        b_red['var_agrupada'] = indicador_subconjunto(bits, mascara_bits(lista_vars, vars_s), k)
+
+        if var_des == []:
+            x = prevalencia_indicador(b_red, 'var_agrupada', alp, ponderador, estrato, upm)
+        else:
+            x = prevalencia_indicador_des(b_red, 'var_agrupada', var_des, alp, ponderador, estrato, upm)
+        x.insert(0, 'indicador', nombre)
+        res.append(x)
+
+    return pd.concat(res, ignore_index=True)
+
+# ------------------ Función para estimar los patrones de policonsumo ------------------ #
+def patrones_policonsumo(b, lista_vars, dicc, var_des = [], etiquetas = None, alp = 0.95, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima en una sola pasada la distribución del número de eventos (sustancias) y de las combinaciones de eventos.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    lista_vars : lista
+        Lista con los nombres de las variables que forman el índice de bits (máximo 16).
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+    var_des : list
+        Lista con las variable(s) en las que se desea desagregar la base b.
+        El valor predeterminado es [], sin desagregación.
+    etiquetas : diccionario
+        Diccionario con el nombre con el que se mostrará cada variable en los patrones.
+        El valor predeterminado es None, se usan los nombres de las variables.
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    tuple de DataFrames
+        Tabla con la distribución del número de eventos ("clave_respuesta" es el número de eventos) y 
+        tabla con la distribución de los patrones (la columna "patron" describe la combinación de eventos).
+    """
+    etiquetas = etiquetas if etiquetas else {}
+    bits = indice_bits(b, lista_vars, dicc)
+
+    b_red = b[list(dict.fromkeys(var_des + [ponderador, estrato, upm]))].copy()
+    b_red['num_eventos'] = np.take(CONTEO_BITS, bits)
+    b_red['patron_bits'] = bits
+
+    if var_des == []:
+        num = proporciones(b_red, 'num_eventos', alp, ponderador, estrato, upm)
+        pat = proporciones(b_red, 'patron_bits', alp, ponderador, estrato, upm)
+    else:
+        num = proporciones_des(b_red, 'num_eventos', var_des, alp, ponderador, estrato, upm)
+        pat = proporciones_des(b_red, 'patron_bits', var_des, alp, ponderador, estrato, upm)
+
+    # descripción de cada patrón (sólo se decodifican los patrones observados)
+    nombres = {}
+    for p in pd.unique(pat['clave_respuesta'].dropna()):
+        eventos = [etiquetas.get(v, v) for i, v in enumerate(lista_vars) if int(p) >> i & 1]
+        nombres[p] = ' + '.join(eventos) if eventos else 'Ninguno'
+    pat.insert(pat.columns.get_loc('clave_respuesta') + 1, 'patron', pat['clave_respuesta'].map(nombres))
+
+    return num, pat
+
+# - # - # - # - # - # ----------------- MODELOS DE REGRESIÓN ----------------- # - # - # - # - # - # 
+
+# ------------------ Función para estimar la varianza a partir de los totales por unidad primaria ------------------ #
+def varianza_conglomerados(puntajes, estratos, upms):
+    """
+    Estima la matriz de varianza por linealización de Taylor a partir de las variables linealizadas (puntajes) de cada registro.
+
+    Los puntajes se suman por unidad primaria de muestreo (upm) y la varianza se calcula con las desviaciones de 
+    los totales de cada upm con respecto al promedio de su estrato:
+        V = suma_h n_h/(n_h-1) suma_j (z_hj - z_h)(z_hj - z_h)'
+    Los estratos con una sola upm no aportan a la varianza (equivalente a SinglePSUEst.skip).
+
+    Parámetros
+    ----------
+    puntajes : ndarray
+        Arreglo (n,) o (n, p) con los puntajes ponderados de cada registro.
+    estratos : array
+        Estrato de cada registro.
+    upms : array
+        Unidad primaria de muestreo de cada registro.
+
+    Salida
+    ------
+    ndarray
+        Matriz de varianza de (p, p) (o un número si los puntajes son de una dimensión).
+    """
+    z = np.asarray(puntajes, dtype=np.float64)
+    una_dim = z.ndim == 1
+    z = z.reshape(len(z), -1)
+
+    # totales por unidad primaria
+    tot = pd.DataFrame(z).groupby([np.asarray(estratos), np.asarray(upms)], sort=False).sum()
+    est_upm = tot.index.get_level_values(0)
+    tot = tot.to_numpy()
+
+    # desviaciones con respecto al promedio del estrato
+    cod_est, _ = pd.factorize(est_upm)
+    n_h = np.bincount(cod_est)
+    medias = np.zeros((len(n_h), z.shape[1]))
+    for j in range(z.shape[1]):
+        medias[:, j] = np.bincount(cod_est, weights=tot[:, j]) / n_h
+    dev = tot - medias[cod_est]
+
+    # factor n_h/(n_h-1); los estratos con una sola upm se omiten
+    f = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0.0)
+    dev = dev * np.sqrt(f[cod_est])[:, None]
+
+    v = dev.T @ dev
+    return v[0, 0] if una_dim else v
+
+# ------------------ Función para construir la matriz de diseño ------------------ #
+def matriz_diseno(b, covariables, categoricas = None, referencias = None, disperso = False):
+    """
+    Construye la matriz de diseño (con intercepto) para un modelo de regresión.
+
+    Las covariables categóricas se codifican con variables indicadoras, omitiendo la categoría de referencia.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    covariables : list
+        Lista con los nombres de las covariables.
+    categoricas : list
+        Lista con las covariables que se tratan como categóricas.
+        El valor predeterminado es None, se tratan como categóricas las covariables que no son numéricas.
+    referencias : dict
+        Diccionario con la categoría de referencia de cada covariable categórica.
+        El valor predeterminado es None, se usa la primera categoría en orden.
+    disperso : bool
+        Si es True la matriz se construye como matriz dispersa (scipy.sparse.csr_matrix).
+        El valor predeterminado es False.
+
+    Salida
+    ------
+    tuple
+        Matriz de diseño, lista con los nombres de las columnas y arreglo booleano con los registros sin valores nulos.
+    """
+    referencias = referencias if referencias else {}
+    if categoricas is None:
+        categoricas = [v for v in covariables if not pd.api.types.is_numeric_dtype(b[v]) or pd.api.types.is_bool_dtype(b[v])]
+
+    n = len(b)
+    completos = np.ones(n, dtype=bool)
+    filas, cols, vals = [np.arange(n)], [np.zeros(n, dtype=np.int64)], [np.ones(n)]
+    nombres = ['intercepto']
+
+    for v in covariables:
+        if v in categoricas:
+            niveles = sorted(pd.unique(b[v].dropna()), key=str)
+            ref = referencias.get(v, niveles[0] if niveles else None)
+            niveles = [ref] + [x for x in niveles if x != ref]
+            cod = pd.Categorical(b[v], categories=niveles).codes
+            completos &= cod >= 0
+            sel = np.flatnonzero(cod > 0)
+            filas.append(sel)
+            cols.append(len(nombres) + cod[sel].astype(np.int64) - 1)
+            vals.append(np.ones(len(sel)))
+            nombres += [f'{v}[{x}]' for x in niveles[1:]]
+        else:
+            x = b[v].to_numpy(dtype=np.float64, na_value=np.nan)
+            completos &= ~np.isnan(x)
+            filas.append(np.arange(n))
+            cols.append(np.full(n, len(nombres), dtype=np.int64))
+            vals.append(np.nan_to_num(x))
+            nombres.append(v)
+
+    filas, cols, vals = np.concatenate(filas), np.concatenate(cols), np.concatenate(vals)
+    if disperso:
+        from scipy import sparse
+        X = sparse.csr_matrix((vals, (filas, cols)), shape=(n, len(nombres)))
+    else:
+        X = np.zeros((n, len(nombres)))
+        X[filas, cols] = vals
+
+    return X, nombres, completos
+
+# ------------------ Función para ajustar una regresión logística ponderada ------------------ #
+def _ajuste_logistico(X, y, w, max_iter = 25, tol = 1e-8):
+    """
+    Ajusta una regresión logística ponderada mediante mínimos cuadrados reponderados iterativamente (IRLS).
+
+    Regresa los coeficientes, la matriz de información (X'WX) y un indicador de convergencia.
+    """
+    beta = np.zeros(X.shape[1])
+    convergencia = False
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-(X @ beta)))
+        gradiente = X.T @ (w * (y - p))
+        pesos = w * p * (1 - p)
+        if hasattr(X, 'multiply'):
+            info = (X.T @ X.multiply(pesos[:, None])).toarray()
+        else:
+            info = X.T @ (X * pesos[:, None])
+        try:
+            paso = np.linalg.solve(info, gradiente)
+        except np.linalg.LinAlgError:
+            raise AssertionError("La matriz de información es singular durante el ajuste; puede haber separación completa (alguna covariable predice perfectamente la respuesta)")
+        beta = beta + paso
+        if np.max(np.abs(paso)) < tol:
+            convergencia = True
+            break
+
+    p = 1 / (1 + np.exp(-(X @ beta)))
+    pesos = w * p * (1 - p)
+    if hasattr(X, 'multiply'):
+        info = (X.T @ X.multiply(pesos[:, None])).toarray()
+    else:
+        info = X.T @ (X * pesos[:, None])
+
+    return beta, p, info, convergencia
+
+# ------------------ Función para identificar términos linealmente dependientes ------------------ #
+def _terminos_dependientes(X, w, nombres, tol = 1e-10):
+    """
+    Regresa los términos de la matriz de diseño que no tienen registros con peso (por ejemplo, una categoría vacía) 
+    o que son combinación lineal de los términos anteriores, con los que la matriz de información es singular.
+    """
+    if hasattr(X, 'multiply'):
+        G = (X.T @ X.multiply(w[:, None])).toarray()
+    else:
+        G = X.T @ (X * w[:, None])
+
+    d = np.sqrt(np.diag(G))
+    dependientes, conservados = [], []
+    for j in range(len(nombres)):
+        if d[j] == 0:
+            dependientes.append(nombres[j])
+            continue
+        c = conservados + [j]
+        R = G[np.ix_(c, c)] / np.outer(d[c], d[c])
+        if np.linalg.eigvalsh(R)[0] < tol:
+            dependientes.append(nombres[j])
+        else:
+            conservados.append(j)
+    return dependientes
+
+# ------------------ Función para estimar regresiones logísticas en lote ------------------ #
+def regresiones_logisticas(b, respuestas, covariables, alp = 0.95, categoricas = None, referencias = None, disperso = False, max_iter = 25, tol = 1e-8, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima en lote regresiones logísticas para muestras complejas con el mismo diseño (estrato, upm y ponderador).
+
+    La matriz de diseño se construye una sola vez y cada respuesta se ajusta con IRLS vectorizado. 
+    La varianza de los coeficientes se estima por linealización (estimador sándwich): 
+        V = I^-1 * Var(suma de puntajes por upm) * I^-1
+    con I = X'WX y los puntajes w_i x_i (y_i - p_i) (ver "varianza_conglomerados").
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    respuestas : dict
+        Diccionario con el nombre de cada respuesta y la variable indicadora (0 o 1) que la define, 
+        o una tupla (lista_vars, dicc) para reclasificarla como en "prevalencias".
+        Por ejemplo: {'alcohol': (['al4'], {1:1,2:0}), 'tabaco': 'tb_actual'}
+    covariables : list
+        Lista con los nombres de las covariables (por ejemplo ['sexo', 'grupo_etario', 'cve_ent']).
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    categoricas : list
+        Lista con las covariables que se tratan como categóricas (ver "matriz_diseno").
+    referencias : dict
+        Diccionario con la categoría de referencia de cada covariable categórica.
+    disperso : bool
+        Si es True la matriz de diseño es dispersa, útil cuando hay muchas categorías (por ejemplo, entidades).
+        El valor predeterminado es False.
+    max_iter : int
+        Número máximo de iteraciones de IRLS. El valor predeterminado es 25.
+    tol : float
+        Tolerancia para la convergencia de los coeficientes. El valor predeterminado es 1e-8.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con una fila por respuesta y término: coeficiente, error estándar, estadístico z, p-valor, 
+        intervalo de confianza, razón de momios y número de encuestas.
+    """
+    X, nombres, completos = matriz_diseno(b, covariables, categoricas, referencias, disperso)
+    w_base = b[ponderador].to_numpy(dtype=np.float64)
+    z_alp = NormalDist().inv_cdf((1 + alp) / 2)
+
+    res = []
+    for nombre, r in respuestas.items():
+        if isinstance(r, tuple):
+            y = indicador_prevalencia(b, r[0], r[1]).astype(np.float64)
+        else:
+            y = b[r].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        # los registros con valores nulos no participan en el ajuste, pero se conservan en el diseño
+        validos = completos & ~np.isnan(y)
+        w = np.where(validos, w_base, 0.0)
+        y = np.nan_to_num(y)
+
+        # criterio para revisar que la respuesta esté reclasificada como 0 o 1
+        claves = {int(c) if c.is_integer() else c for c in pd.unique(y[validos]).tolist()} - {0, 1}
+        if claves:
+            raise AssertionError("La respuesta '"+str(nombre)+"' sólo puede valer 0 o 1 y tiene la(s) clave(s): "+str(claves).replace('{','').replace('}','')+". Es necesario reclasificarla con (lista_vars, dicc)")
+
+        # criterio para revisar que la matriz de información no sea singular
+        dependientes = _terminos_dependientes(X, w, nombres)
+        if dependientes:
+            raise AssertionError("En el ajuste de '"+str(nombre)+"' los términos "+', '.join(dependientes)+" no tienen registros válidos o son combinación lineal de los demás, es necesario quitarlos o agrupar sus categorías")
+
+        beta, p, info, convergencia = _ajuste_logistico(X, y, w, max_iter, tol)
+        if not convergencia:
+            print("El ajuste de '"+str(nombre)+"' no convergió en "+str(max_iter)+" iteraciones.")
+
+        # estimador sándwich
+        puntajes = X.multiply((w * (y - p))[:, None]) if disperso else X * (w * (y - p))[:, None]
+        puntajes = puntajes.toarray() if disperso else puntajes
+        info_inv = np.linalg.inv(info)
+        v = info_inv @ varianza_conglomerados(puntajes, b[estrato], b[upm]) @ info_inv
+        ee = np.sqrt(np.diag(v))
+
+        t = pd.DataFrame({'respuesta': nombre,
+                          'termino': nombres,
+                          'coeficiente': beta,
+                          'error_std': ee})
+        t['z'] = t['coeficiente'] / t['error_std']
+        t['p_valor'] = [2 * (1 - NormalDist().cdf(abs(x))) for x in t['z']]
+        t['ic_inf'] = t['coeficiente'] - z_alp * t['error_std']
+        t['ic_sup'] = t['coeficiente'] + z_alp * t['error_std']
+        t['razon_momios'] = np.exp(t['coeficiente'])
+        t['num_encuestas'] = int(validos.sum())
+        res.append(t)
+
+    return pd.concat(res, ignore_index=True)
+
+# ------------------ Función para estimar una regresión logística ------------------ #
+def regresion_logistica(b, respuesta, covariables, dicc = None, alp = 0.95, categoricas = None, referencias = None, disperso = False, ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima una regresión logística para muestras complejas (ver "regresiones_logisticas").
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    respuesta : str o list
+        Variable indicadora (0 o 1), o lista de variables que se reclasifican con "dicc".
+    covariables : list
+        Lista con los nombres de las covariables.
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+        El valor predeterminado es None, "respuesta" ya es una variable indicadora.
+
+    El resto de los parámetros son los mismos que en "regresiones_logisticas".
+
+    Salida
+    ------
+    DataFrame
+        Tabla con los coeficientes del modelo.
+    """
+    if dicc is None:
+        r = respuesta
+    else:
+        r = (respuesta if isinstance(respuesta, list) else [respuesta], dicc)
+    nombre = respuesta if isinstance(respuesta, str) else '+'.join(respuesta)
+
+    return regresiones_logisticas(b, {nombre: r}, covariables, alp, categoricas, referencias, disperso, ponderador=ponderador, estrato=estrato, upm=upm)
+
+# - # - # - # - # - # ----------------- ESTIMACIÓN CON AGREGADOS POR UNIDAD PRIMARIA ----------------- # - # - # - # - # - # 
+
+# ------------------ Función para escribir una clave de respuesta en SQL ------------------ #
+def _literal_sql(valor):
+    """
+    Escribe una clave de respuesta como literal de SQL.
+    """
+    if isinstance(valor, (int, np.integer)) and not isinstance(valor, bool):
+        return str(int(valor))
+    if isinstance(valor, (float, np.floating)):
+        return repr(float(valor))
+    return "'" + str(valor).replace("'", "''") + "'"
+
+# ------------------ Función para escribir la variable indicadora en SQL ------------------ #
+def indicador_sql(lista_vars, dicc):
+    """
+    Escribe en SQL la variable indicadora de ocurrencia de "lista_vars" (ver "indicador_prevalencia"): 
+    vale 1 si alguna de las variables tiene una clave que "dicc" reclasifica como 1 y 0 en otro caso (incluidos los nulos).
+
+    Parámetros
+    ----------
+    lista_vars : lista
+        Lista con los nombres de las variables.
+    dicc : diccionario
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+
+    Salida
+    ------
+    str
+        Expresión de SQL de tipo entero.
+    """
+    unos = [k for k, v in dicc.items() if v == 1] + ([1] if 1 not in dicc else [])
+    if not unos:
+        return '0'
+    claves = ', '.join(_literal_sql(k) for k in unos)
+    condiciones = ' OR '.join(f'COALESCE("{v}" IN ({claves}), FALSE)' for v in lista_vars)
+    return f'CAST(({condiciones}) AS INTEGER)'
+
+# ------------------ Función para obtener los totales por unidad primaria ------------------ #
+def agregados_upm(b, indicadores, var_des = [], motor = 'pandas', ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Calcula, para cada combinación de estrato, unidad primaria y subconjunto de "var_des", la suma del ponderador 
+    y la suma ponderada de cada variable indicadora.
+
+    Con motor = 'duckdb' la reclasificación y la agregación se hacen en una sola consulta de SQL 
+    (GROUP BY estrato, upm, var_des) en DuckDB, que utiliza todos los núcleos y, si "b" es la ruta de un archivo 
+    Parquet, sólo lee las columnas necesarias. A Python sólo regresa la tabla de agregados.
+    Si DuckDB no está instalado se utiliza pandas.
+
+    Parámetros
+    ----------
+    b : DataFrame o str
+        Conjunto de datos o ruta de un archivo Parquet con la base limpia.
+    indicadores : diccionario
+        Diccionario {nombre: (lista_vars, dicc)} con las variables y el diccionario de reclasificación de cada indicador.
+    var_des: list
+        Lista con las variable(s) en las que se desea desagregar la base b. El valor predeterminado es [], sin desagregar.
+    motor : str
+        'pandas' o 'duckdb'. El valor predeterminado es 'pandas'.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con las columnas estrato, upm, var_des, "w" (suma del ponderador), "wy_0", "wy_1", ... (suma ponderada 
+        de cada indicador, en el orden de "indicadores") y "n" (número de registros).
+    """
+    if motor not in ['pandas', 'duckdb']:
+        raise AssertionError("El motor debe ser 'pandas' o 'duckdb'")
+
+    if motor == 'duckdb':
+        try:
+            import duckdb
+        except ImportError:
+            print("DuckDB no está instalado, los agregados se calculan con pandas")
+            motor = 'pandas'
+
+    llaves = list(dict.fromkeys([estrato, upm] + var_des))
+    variables = list(dict.fromkeys(v for lista_vars, _ in indicadores.values() for v in lista_vars))
+
+    if motor == 'pandas':
+        if isinstance(b, str):
+            b = pd.read_parquet(b, columns=list(dict.fromkeys(llaves + [ponderador] + variables)))
+
+        w = b[ponderador].to_numpy(dtype=np.float64)
+        a = b[llaves].copy()
+        a['w'] = w
+        for i, (lista_vars, dicc) in enumerate(indicadores.values()):
+            a[f'wy_{i}'] = w * indicador_prevalencia(b, lista_vars, dicc)
+        a['n'] = 1
+        return a.groupby(llaves, sort=False).sum().reset_index()
+
+    con = duckdb.connect()
+    if isinstance(b, str):
+        fuente = "read_parquet('" + b.replace("'", "''") + "')"
+    else:
+        con.register('base', b[list(dict.fromkeys(llaves + [ponderador] + variables))])
+        fuente = 'base'
+
+    # revisión de los diccionarios con las claves observadas en cada variable
+    for lista_vars, dicc in indicadores.values():
+        if isinstance(b, str):
+            rv = [set(x[0] for x in con.execute(f'SELECT DISTINCT "{v}" FROM {fuente} WHERE "{v}" IS NOT NULL').fetchall()) for v in lista_vars]
+        else:
+            rv = [codigos_observados(b, v) for v in lista_vars]
+        revisar_codigos(rv, dicc)
+
+    columnas = ', '.join(f'"{c}"' for c in llaves)
+    sumas = ', '.join(f'SUM(CAST("{ponderador}" AS DOUBLE) * {indicador_sql(lista_vars, dicc)}) AS wy_{i}'
+                      for i, (lista_vars, dicc) in enumerate(indicadores.values()))
+    # como en el groupby de pandas, se descartan los registros con llaves nulas (estrato, upm o var_des)
+    filtro = ' AND '.join(f'"{c}" IS NOT NULL' for c in llaves)
+    consulta = (f'SELECT {columnas}, SUM(CAST("{ponderador}" AS DOUBLE)) AS w, {sumas}, COUNT(*) AS n '
+                f'FROM {fuente} WHERE {filtro} GROUP BY {columnas}')
+
+    a = con.execute(consulta).df()
+    con.close()
+
+    return a
+
+# ------------------ Función para estimar prevalencias a partir de los totales por unidad primaria ------------------ #
+def prevalencias_agregadas(b, indicadores, var_des = [], alp = 0.95, motor = 'pandas', ponderador = 'factor_exp', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima en una sola pasada las prevalencias de varios indicadores, totales o desagregadas por "var_des", 
+    a partir de los totales por unidad primaria (ver "agregados_upm").
+
+    Para la proporción p = Y/W de cada subconjunto, la variable linealizada de cada unidad primaria es 
+    z_hj = (Y_hj - p W_hj)/W y la varianza se calcula como en "varianza_conglomerados", sólo con las unidades 
+    primarias del subconjunto (igual que al estimar sobre la base reducida en "prevalencias_des"); 
+    los estratos con una sola upm no aportan a la varianza.
+
+    Parámetros
+    ----------
+    b : DataFrame o str
+        Conjunto de datos o ruta de un archivo Parquet con la base limpia.
+    indicadores : diccionario
+        Diccionario {nombre: (lista_vars, dicc)} con las variables y el diccionario de reclasificación de cada indicador.
+    var_des: list
+        Lista con las variable(s) en las que se desea desagregar la base b. El valor predeterminado es [], sin desagregar.
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    motor : str
+        'pandas' o 'duckdb'. El valor predeterminado es 'pandas'.
+    ponderador : str
+        Nombre de la variable que contiene el ponderador.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con la columna "indicador", las variables de "var_des" y la estimación puntual para la ocurrencia, 
+        su intervalo de confianza, la población, el error estándar y el coeficiente de variación (como en "prevalencias_des").
+    """
+    a = agregados_upm(b, indicadores, var_des, motor, ponderador, estrato, upm)
+    num = len(indicadores)
+    w = a['w'].to_numpy(dtype=np.float64)
+    wy = a[[f'wy_{i}' for i in range(num)]].to_numpy(dtype=np.float64)
+
+    # subconjuntos y estratos dentro de cada subconjunto
+    cod_dom = a.groupby(var_des, sort=False).ngroup().to_numpy() if var_des else np.zeros(len(a), dtype=np.intp)
+    cod_est = a.groupby([cod_dom, a[estrato].to_numpy()], sort=False).ngroup().to_numpy()
+    num_dom = cod_dom.max() + 1
+
+    # proporción de cada subconjunto y variables linealizadas de cada upm
+    W = np.bincount(cod_dom, weights=w, minlength=num_dom)
+    Y = np.column_stack([np.bincount(cod_dom, weights=wy[:, k], minlength=num_dom) for k in range(num)])
+    p = Y / W[:, None]
+    z = (wy - p[cod_dom] * w[:, None]) / W[cod_dom][:, None]
+
+    # varianza: desviaciones con respecto al promedio del estrato con el factor n_h/(n_h-1)
+    n_h = np.bincount(cod_est)
+    medias = np.column_stack([np.bincount(cod_est, weights=z[:, k]) for k in range(num)]) / n_h[:, None]
+    f = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0.0)
+    dev2 = (z - medias[cod_est]) ** 2 * f[cod_est][:, None]
+    se = np.sqrt(np.column_stack([np.bincount(cod_dom, weights=dev2[:, k], minlength=num_dom) for k in range(num)]))
+
+    # intervalos (como en "proporciones", sólo se recorta el límite inferior) y coeficiente de variación
+    zq = NormalDist().inv_cdf((1 + alp) / 2)
+    ic_inf = np.maximum(p - zq * se, 0)
+    ic_sup = p + zq * se
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cv = np.where(p > 0, se / p, 0.0)
+
+    # subconjuntos en los que no ocurrió el evento (corrección de "prevalencia_indicador")
+    sin_evento = Y == 0
+    se = np.where(sin_evento, 0.0, se)
+    ic_inf = np.where(sin_evento, 0.0, ic_inf)
+    ic_sup = np.where(sin_evento, 0.0, ic_sup)
+
+    # estructuración del dataframe de salida
+    dominios = a[var_des].groupby(cod_dom).first().reset_index(drop=True) if var_des else pd.DataFrame(index=[0])
+    orden = dominios.sort_values(var_des, kind='stable').index.to_numpy() if var_des else np.arange(1)
+    dominios = dominios.loc[orden].reset_index(drop=True)
+    p, ic_inf, ic_sup, Y, se, cv = [x[orden] for x in [p, ic_inf, ic_sup, Y, se, cv]]
+    enteros = not isinstance(b, str) and pd.api.types.is_integer_dtype(b[ponderador])
+    res = []
+    for k, nombre in enumerate(indicadores):
+        r = dominios.copy()
+        r.insert(0, 'indicador', nombre)
+        r['estimacion'] = p[:, k] * 100
+        r['ic_inf'] = ic_inf[:, k] * 100
+        r['ic_sup'] = ic_sup[:, k] * 100
+        r['poblacion'] = np.round(Y[:, k]).astype(np.int64) if enteros else Y[:, k]
+        r['error_std'] = se[:, k] * 100
+        r['cv'] = cv[:, k] * 100
+        res.append(r)
+
+    return pd.concat(res, ignore_index=True)
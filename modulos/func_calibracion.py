@@ -0,0 +1,393 @@
+'''
+Este archivo contiene las funciones para calibrar los factores de expansión a totales de población conocidos
+(por ejemplo, proyecciones de población por entidad, sexo y grupo de edad) y para estimar prevalencias cuya
+varianza considera la calibración.
+
+Los márgenes de control se codifican como matrices indicadoras dispersas, de modo que se pueden usar miles
+de celdas de control. Los factores calibrados se guardan como una columna de la base y se usan como
+ponderador en "proporciones", "prevalencias" o "tabulados_prevalencias" (ponderador='factor_cal').
+'''
+import numpy as np
+import pandas as pd
+
+from statistics import NormalDist
+
+from modulos.func_analisis import indicador_prevalencia
+
+# - # - # - # - # - # ----------------- MÁRGENES DE CONTROL ----------------- # - # - # - # - # - #
+
+# ------------------ Función para obtener los totales de control a partir de las proyecciones ------------------ #
+def totales_control(proyecciones, margenes, var_total = 'poblacion'):
+    """
+    Suma las proyecciones de población en cada uno de los márgenes de control.
+
+    Parámetros
+    ----------
+    proyecciones : DataFrame
+        Tabla con las variables de los márgenes y la población de cada celda
+        (por ejemplo: cve_ent, sexo, grupo_etario, poblacion).
+    margenes : list
+        Lista con los márgenes de control. Cada margen es el nombre de una variable o una tupla de variables
+        cuyas combinaciones son las celdas de control. Por ejemplo: ['cve_ent', ('sexo', 'grupo_etario')].
+    var_total : str
+        Nombre de la columna con la población. El valor predeterminado es 'poblacion'.
+
+    Salida
+    ------
+    dict
+        Diccionario {margen: Series} con el total de población de cada categoría (o combinación) del margen.
+    """
+    totales = {}
+    for m in margenes:
+        totales[m] = proyecciones.groupby(list(m) if isinstance(m, tuple) else m)[var_total].sum()
+    return totales
+
+# ------------------ Función para construir la matriz de calibración ------------------ #
+def matriz_calibracion(b, totales, referencias = True):
+    """
+    Construye la matriz indicadora dispersa de las celdas de control de cada registro.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    totales : dict
+        Diccionario {margen: Series} con los totales de control (ver "totales_control").
+    referencias : bool
+        Si es True se omite la primera celda de cada margen después del primero, para que las columnas de la
+        matriz sean linealmente independientes (necesario en la calibración lineal). El valor predeterminado es True.
+
+    Salida
+    ------
+    tuple
+        La matriz dispersa X (scipy.sparse.csr_matrix de n x celdas), el arreglo con los totales de sus columnas,
+        la lista con los nombres de las columnas y la lista con los códigos de celda de cada registro en cada margen.
+    """
+    from scipy import sparse
+
+    n = len(b)
+    filas, cols, objetivo, nombres, codigos = [], [], [], [], []
+    for k, (m, t) in enumerate(totales.items()):
+        variables = list(m) if isinstance(m, tuple) else [m]
+        t = pd.Series(t)
+        if len(variables) > 1:
+            celdas = pd.MultiIndex.from_tuples(t.index, names=variables) if not isinstance(t.index, pd.MultiIndex) else t.index
+            cod = celdas.get_indexer(pd.MultiIndex.from_frame(b[variables]))
+        else:
+            cod = pd.Index(t.index).get_indexer(b[variables[0]])
+
+        if (cod < 0).any():
+            ejemplos = b.loc[cod < 0, variables].drop_duplicates().head(5).to_dict('records')
+            raise AssertionError("Hay "+str(int((cod < 0).sum()))+" registros cuya celda del margen "+str(m)+" no tiene total de control, por ejemplo: "+str(ejemplos))
+        vacias = np.bincount(cod, minlength=len(t)) == 0
+        if vacias.any():
+            raise AssertionError("Las celdas "+str(list(t.index[vacias][:5]))+" del margen "+str(m)+" no tienen registros en la muestra, es necesario agruparlas")
+
+        codigos.append(cod)
+        inicio = 1 if referencias and k > 0 else 0
+        sel = np.flatnonzero(cod >= inicio)
+        filas.append(sel)
+        cols.append(len(nombres) + cod[sel] - inicio)
+        objetivo.append(t.to_numpy(dtype=np.float64)[inicio:])
+        nombres += [f'{m}[{x}]' for x in t.index[inicio:]]
+
+    filas, cols = np.concatenate(filas), np.concatenate(cols)
+    X = sparse.csr_matrix((np.ones(len(filas)), (filas, cols)), shape=(n, len(nombres)))
+
+    return X, np.concatenate(objetivo), nombres, codigos
+
+def _revisar_totales(totales, tol = 1e-6):
+    """
+    Avisa si los márgenes de control no suman la misma población total.
+    """
+    sumas = [float(pd.Series(t).sum()) for t in totales.values()]
+    if max(sumas) - min(sumas) > tol * max(sumas):
+        print("Los márgenes de control no suman la misma población: "+str(dict(zip(map(str, totales), sumas)))+". El raking no podrá cumplir todos los márgenes.")
+
+# - # - # - # - # - # ----------------- CALIBRACIÓN ----------------- # - # - # - # - # - #
+
+# ------------------ Función para calibrar con raking ------------------ #
+def raking(b, totales, ponderador = 'factor_exp', max_iter = 100, tol = 1e-6, limites = None):
+    """
+    Calibra los factores de expansión a los totales de control mediante ajuste proporcional iterativo (raking).
+
+    En cada iteración los factores se multiplican, margen por margen, por el cociente entre el total de control
+    y el total estimado de cada celda. Los totales de cada celda se obtienen con np.bincount sobre los códigos
+    de celda, por lo que cada iteración es lineal en el número de registros.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    totales : dict
+        Diccionario {margen: Series} con los totales de control (ver "totales_control").
+    ponderador : str
+        Nombre de la variable que contiene el factor de expansión original.
+    max_iter : int
+        Número máximo de iteraciones. El valor predeterminado es 100.
+    tol : float
+        Tolerancia para la convergencia: máxima diferencia relativa entre los totales estimados y los de control.
+        El valor predeterminado es 1e-6.
+    limites : tuple
+        Límites (inferior, superior) para el cociente entre el factor calibrado y el original, por ejemplo (0.3, 3).
+        El valor predeterminado es None, sin límites.
+
+    Salida
+    ------
+    tuple
+        El arreglo con los factores calibrados y un DataFrame con el diagnóstico de cada iteración
+        (error relativo máximo, margen con el error máximo y cambio relativo máximo de los factores).
+    """
+    _revisar_totales(totales)
+    _, _, _, codigos = matriz_calibracion(b, totales, referencias=False)
+    objetivos = [pd.Series(t).to_numpy(dtype=np.float64) for t in totales.values()]
+    margenes = list(totales)
+
+    d = b[ponderador].to_numpy(dtype=np.float64)
+    w = d.copy()
+    diagnostico = []
+    for i in range(1, max_iter + 1):
+        anterior = w.copy()
+        for cod, t in zip(codigos, objetivos):
+            w *= (t / np.bincount(cod, weights=w, minlength=len(t)))[cod]
+        if limites is not None:
+            w = d * np.clip(w / d, limites[0], limites[1])
+
+        errores = [np.max(np.abs(np.bincount(cod, weights=w, minlength=len(t)) / t - 1)) for cod, t in zip(codigos, objetivos)]
+        diagnostico.append({'iteracion': i,
+                            'error_max': max(errores),
+                            'margen_max': str(margenes[int(np.argmax(errores))]),
+                            'cambio_max': np.max(np.abs(w / anterior - 1))})
+        if max(errores) < tol:
+            break
+    else:
+        print("El raking no convergió en "+str(max_iter)+" iteraciones (error relativo máximo "+format(diagnostico[-1]['error_max'], '.2e')+").")
+
+    return w, pd.DataFrame(diagnostico)
+
+# ------------------ Función para calibrar con el estimador de regresión generalizado ------------------ #
+def calibracion_lineal(b, totales, ponderador = 'factor_exp', max_iter = 20, limites = None):
+    """
+    Calibra los factores de expansión a los totales de control con la distancia ji cuadrada (estimador GREG):
+        w = d (1 + X lambda),   (X'DX) lambda = T - X'd
+    El sistema se resuelve con la factorización LU dispersa de X'DX, que tiene una fila por celda de control.
+
+    Con "limites" se usa el método lineal truncado: los factores que salen de los límites se fijan en ellos y
+    el sistema se resuelve de nuevo con los demás registros, hasta que ninguno sale de los límites.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    totales : dict
+        Diccionario {margen: Series} con los totales de control (ver "totales_control").
+    ponderador : str
+        Nombre de la variable que contiene el factor de expansión original.
+    max_iter : int
+        Número máximo de iteraciones del método truncado. El valor predeterminado es 20.
+    limites : tuple
+        Límites (inferior, superior) para el cociente entre el factor calibrado y el original.
+        El valor predeterminado es None, sin límites (los factores pueden resultar negativos).
+
+    Salida
+    ------
+    tuple
+        El arreglo con los factores calibrados y un DataFrame con el diagnóstico de cada iteración
+        (error relativo máximo, número de registros en los límites y cociente mínimo y máximo).
+    """
+    from scipy.sparse.linalg import splu
+
+    X, T, _, _ = matriz_calibracion(b, totales)
+    d = b[ponderador].to_numpy(dtype=np.float64)
+    g = np.ones(len(d))
+    fijos = np.zeros(len(d), dtype=bool)
+    diagnostico = []
+    for i in range(1, max_iter + 1):
+        # los registros en los límites aportan su total fijo y no participan en el ajuste
+        libres = np.where(fijos, 0.0, d)
+        A = (X.T @ X.multiply(libres[:, None])).tocsc()
+        try:
+            factor = splu(A)
+        except RuntimeError:
+            raise AssertionError("Hay celdas de control en las que todos los registros quedaron en los límites "+str(limites)+", es necesario ampliarlos")
+        lam = factor.solve(T - X.T @ (d * g * fijos) - X.T @ libres)
+        g = np.where(fijos, g, 1 + X @ lam)
+
+        fuera = np.zeros(len(d), dtype=bool)
+        if limites is not None:
+            fuera = ~fijos & ((g < limites[0]) | (g > limites[1]))
+            g = np.where(fuera, np.clip(g, limites[0], limites[1]), g)
+            fijos |= fuera
+
+        w = d * g
+        diagnostico.append({'iteracion': i,
+                            'error_max': np.max(np.abs((X.T @ w) / T - 1)),
+                            'en_limites': int(fijos.sum()),
+                            'g_min': g.min(),
+                            'g_max': g.max()})
+        if not fuera.any():
+            break
+    else:
+        print("La calibración lineal no convergió en "+str(max_iter)+" iteraciones (error relativo máximo "+format(diagnostico[-1]['error_max'], '.2e')+").")
+
+    if limites is None and (g < 0).any():
+        print("La calibración produjo "+str(int((g < 0).sum()))+" factores negativos, se recomienda indicar límites o usar raking.")
+
+    return w, pd.DataFrame(diagnostico)
+
+# ------------------ Función para resumir los factores calibrados ------------------ #
+def resumen_ponderadores(w, d):
+    """
+    Resume el cambio de los factores de expansión por la calibración.
+
+    Parámetros
+    ----------
+    w : array
+        Factores calibrados.
+    d : array
+        Factores originales.
+
+    Salida
+    ------
+    Series
+        Cuantiles del cociente g = w/d y el efecto de diseño por ponderación (1 + cv^2 de los factores, de Kish)
+        antes y después de calibrar.
+    """
+    w, d = np.asarray(w, dtype=np.float64), np.asarray(d, dtype=np.float64)
+    g = w / d
+    r = pd.Series(np.quantile(g, [0, 0.01, 0.25, 0.5, 0.75, 0.99, 1]), index=['g_min', 'g_p01', 'g_p25', 'g_mediana', 'g_p75', 'g_p99', 'g_max'])
+    r['efecto_diseno_original'] = len(d) * np.sum(d ** 2) / np.sum(d) ** 2
+    r['efecto_diseno_calibrado'] = len(w) * np.sum(w ** 2) / np.sum(w) ** 2
+    return r
+
+# ------------------ Función para calibrar y agregar el ponderador a la base ------------------ #
+def calibrar(b, totales, metodo = 'raking', ponderador = 'factor_exp', var_salida = 'factor_cal', **opciones):
+    """
+    Calibra los factores de expansión y los agrega a la base "b" en la columna "var_salida".
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos.
+    totales : dict
+        Diccionario {margen: Series} con los totales de control (ver "totales_control").
+    metodo : str
+        'raking' o 'lineal' (ver "raking" y "calibracion_lineal"). El valor predeterminado es 'raking'.
+    ponderador : str
+        Nombre de la variable que contiene el factor de expansión original.
+    var_salida : str
+        Nombre de la columna con los factores calibrados. El valor predeterminado es 'factor_cal'.
+    **opciones
+        Opciones de la función de calibración (max_iter, tol, limites).
+
+    Salida
+    ------
+    DataFrame
+        Diagnóstico de las iteraciones.
+    Series
+        Resumen de los factores calibrados (ver "resumen_ponderadores").
+    """
+    if metodo not in ('raking', 'lineal'):
+        raise AssertionError("El método debe ser 'raking' o 'lineal'")
+    calibrador = raking if metodo == 'raking' else calibracion_lineal
+    w, diagnostico = calibrador(b, totales, ponderador, **opciones)
+
+    b[var_salida] = w
+    return diagnostico, resumen_ponderadores(w, b[ponderador])
+
+# - # - # - # - # - # ----------------- ESTIMACIÓN ----------------- # - # - # - # - # - #
+
+# ------------------ Función para estimar prevalencias con factores calibrados ------------------ #
+def prevalencias_calibradas(b, indicadores, totales, var_des = [], alp = 0.95, ponderador = 'factor_cal', estrato = 'estrato', upm = 'upm'):
+    """
+    Estima prevalencias con factores calibrados y una varianza que considera la calibración.
+
+    Para la proporción p = Y/W de cada subconjunto, la variable linealizada de cada registro es u_i = (y_i - p)/W
+    dentro del subconjunto y 0 fuera de él. La calibración elimina la parte de u explicada por las celdas de control,
+    por lo que la varianza se calcula con los residuos e = u - X B, con B = (X'WX)^-1 X'Wu (Deville y Särndal),
+    sumados por unidad primaria como en "varianza_conglomerados". Los residuos de un subconjunto no son nulos
+    fuera de él, por lo que se usa el diseño completo.
+
+    Parámetros
+    ----------
+    b : DataFrame
+        Conjunto de datos con los factores calibrados (ver "calibrar").
+    indicadores : diccionario
+        Diccionario {nombre: (lista_vars, dicc)} con las variables y el diccionario de reclasificación de cada indicador.
+    totales : dict
+        Diccionario {margen: Series} con los totales de control con los que se calibró.
+    var_des: list
+        Lista con las variable(s) en las que se desea desagregar la base b. El valor predeterminado es [], sin desagregar.
+    alp: float
+        Valor entre 0 y 1 para definir el nivel de significancia del intervalo.
+        El valor predeterminado es 0.95, para tener intervalos con un 95% de significancia.
+    ponderador : str
+        Nombre de la variable que contiene el factor calibrado. El valor predeterminado es 'factor_cal'.
+    estrato : str
+        Nombre de la columna con los estratos de la encuesta.
+    upm : str
+        Nombre de la columna con las unidades primarias de la encuesta.
+
+    Salida
+    ------
+    DataFrame
+        Tabla con la columna "indicador", las variables de "var_des" y la estimación puntual para la ocurrencia,
+        su intervalo de confianza, la población, el error estándar y el coeficiente de variación (como en "prevalencias_agregadas").
+    """
+    from scipy import sparse
+    from scipy.sparse.linalg import splu
+
+    n = len(b)
+    X, _, _, _ = matriz_calibracion(b, totales)
+    w = b[ponderador].to_numpy(dtype=np.float64)
+    factor = splu((X.T @ X.multiply(w[:, None])).tocsc())
+
+    # subconjuntos, unidades primarias y estratos de cada unidad primaria
+    cod_dom = b.groupby(var_des, sort=False).ngroup().to_numpy() if var_des else np.zeros(n, dtype=np.intp)
+    num_dom = cod_dom.max() + 1
+    cod_upm, upms = pd.factorize(pd.MultiIndex.from_arrays([b[estrato], b[upm]]))
+    cod_est = pd.factorize(upms.get_level_values(0))[0]
+    G = sparse.csr_matrix((w, (cod_upm, np.arange(n))), shape=(len(upms), n))
+    GX = G @ X
+    n_h = np.bincount(cod_est)
+    f = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0.0)
+
+    W = np.bincount(cod_dom, weights=w, minlength=num_dom)
+    zq = NormalDist().inv_cdf((1 + alp) / 2)
+
+    # estructuración de los subconjuntos (en el orden de "prevalencias_agregadas")
+    dominios = b[var_des].groupby(cod_dom).first().reset_index(drop=True) if var_des else pd.DataFrame(index=[0])
+    orden = dominios.sort_values(var_des, kind='stable').index.to_numpy() if var_des else np.arange(1)
+    dominios = dominios.loc[orden].reset_index(drop=True)
+
+    res = []
+    for nombre, (lista_vars, dicc) in indicadores.items():
+        y = indicador_prevalencia(b, lista_vars, dicc).astype(np.float64)
+        Y = np.bincount(cod_dom, weights=w * y, minlength=num_dom)
+        p = Y / W
+
+        # variable linealizada (una columna por subconjunto) y sus residuos totalizados por upm: G(u - XB) = Gu - (GX)B
+        u = sparse.csr_matrix(((y - p[cod_dom]) / W[cod_dom], (np.arange(n), cod_dom)), shape=(n, num_dom))
+        B = factor.solve(np.asarray((X.T @ u.multiply(w[:, None])).todense()))
+        tot = np.asarray((G @ u).todense()) - GX @ B
+
+        # desviaciones con respecto al promedio del estrato con el factor n_h/(n_h-1)
+        medias = np.column_stack([np.bincount(cod_est, weights=tot[:, k]) for k in range(num_dom)]) / n_h[:, None]
+        se = np.sqrt(np.sum((tot - medias[cod_est]) ** 2 * f[cod_est][:, None], axis=0))
+
+        ic_inf = np.maximum(p - zq * se, 0)
+        ic_sup = p + zq * se
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cv = np.where(p > 0, se / p, 0.0)
+
+        r = dominios.copy()
+        r.insert(0, 'indicador', nombre)
+        r['estimacion'] = p[orden] * 100
+        r['ic_inf'] = ic_inf[orden] * 100
+        r['ic_sup'] = ic_sup[orden] * 100
+        r['poblacion'] = Y[orden]
+        r['error_std'] = se[orden] * 100
+        r['cv'] = cv[orden] * 100
+        res.append(r)
+
+    return pd.concat(res, ignore_index=True)
@@ -0,0 +1,237 @@
+'''
+Este archivo contiene las funciones para definir, calcular y guardar variables derivadas, es decir,
+indicadores que se obtienen al reclasificar las respuestas de una o más preguntas (por ejemplo,
+consumo de alcohol en el último año a partir de "al4").
+
+Cada variable derivada se calcula una sola vez y se guarda como una columna compacta (uint8) junto a los
+datos limpios, de modo que las estimaciones en lote sólo leen la columna ya calculada.
+'''
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from modulos.func_analisis import indicador_prevalencia, indice_bits, mascara_bits, indicador_subconjunto
+
+# ------------------ Clase para definir una variable derivada ------------------ #
+class VariableDerivada:
+    """
+    Definición de una variable derivada: vale 1 si ocurrieron al menos "k" de los eventos en "lista_vars"
+    reclasificados con "dicc" y 0 en otro caso.
+
+    Parámetros:
+    ------------
+    nombre: str
+        Nombre de la variable derivada.
+    lista_vars: list
+        Lista con los nombres de las variables de origen.
+    dicc: dict
+        Diccionario con las claves de las preguntas renombradas respectivamente como 0 y 1.
+    k: int
+        Número mínimo de eventos para que la variable valga 1. El valor predeterminado es 1 ("al menos uno de").
+    descripcion: str
+        Descripción de la variable derivada.
+    """
+    def __init__(self, nombre, lista_vars, dicc, k=1, descripcion=''):
+        self.nombre = nombre
+        self.lista_vars = list(lista_vars)
+        self.dicc = dict(dicc)
+        self.k = k
+        self.descripcion = descripcion
+
+    def definicion(self):
+        """
+        Regresa la definición de la variable en un diccionario que se puede guardar como json.
+        """
+        return {'nombre': self.nombre,
+                'lista_vars': self.lista_vars,
+                'dicc': {str(c): int(v) for c, v in sorted(self.dicc.items(), key=lambda x: str(x[0]))},
+                'k': self.k,
+                'descripcion': self.descripcion}
+
+    def huella(self):
+        """
+        Regresa la huella (hash) de la definición. La descripción no forma parte de la huella.
+        """
+        d = self.definicion()
+        d.pop('descripcion')
+        return hashlib.sha1(json.dumps(d, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    def calcular(self, b):
+        """
+        Calcula la variable derivada sobre el conjunto de datos "b".
+
+        Regresa:
+        ------------
+        ndarray
+            Arreglo de tipo uint8 con la variable derivada.
+        """
+        if self.k == 1:
+            return indicador_prevalencia(b, self.lista_vars, self.dicc)
+
+        bits = indice_bits(b, self.lista_vars, self.dicc)
+        return indicador_subconjunto(bits, mascara_bits(self.lista_vars, self.lista_vars), self.k)
+
+# ------------------ Clase para registrar y guardar variables derivadas ------------------ #
+class RegistroDerivadas:
+    """
+    Registro de variables derivadas que se guardan junto a los datos limpios.
+
+    Cada variable se guarda en el archivo "<nombre>__<huella>.npy" dentro de "ruta", de modo que al cambiar
+    la definición cambia el archivo. El archivo "registro.json" guarda las definiciones, el número de
+    registros y la huella de la base con la que se calcularon: los identificadores y los valores de las
+    variables de origen, de modo que al volver a limpiar, imputar o recodificar esas variables se calcula de nuevo.
+
+    Parámetros:
+    ------------
+    ruta: str
+        Carpeta donde se guardan las variables derivadas.
+        El valor predeterminado es "datos/limpios/derivadas".
+    var_id: str
+        Nombre de la variable que identifica a cada registro, se usa (junto con las variables de origen)
+        para comprobar que las variables guardadas corresponden a la base. El valor predeterminado es "id_pers".
+    """
+    def __init__(self, ruta=os.path.join('datos', 'limpios', 'derivadas'), var_id='id_pers'):
+        self.ruta = ruta
+        self.var_id = var_id
+        self.variables = {}
+        self.archivo_registro = os.path.join(ruta, 'registro.json')
+        self.registro = {}
+        if os.path.exists(self.archivo_registro):
+            with open(self.archivo_registro) as fp:
+                self.registro = json.load(fp)
+
+    def registrar(self, nombre, lista_vars, dicc, k=1, descripcion=''):
+        """
+        Agrega la definición de una variable derivada al registro (todavía no la calcula).
+        """
+        self.variables[nombre] = VariableDerivada(nombre, lista_vars, dicc, k, descripcion)
+        return self
+
+    def archivo(self, nombre):
+        """
+        Regresa la ruta del archivo donde se guarda la versión vigente de la variable "nombre".
+        """
+        return os.path.join(self.ruta, nombre + '__' + self.variables[nombre].huella() + '.npy')
+
+    def huellas_base(self, b, nombres):
+        """
+        Regresa las huellas de la base "b" para las variables "nombres" ({nombre: huella}): sus identificadores 
+        "var_id" (o su número de registros si no los tiene) y los valores de las variables de origen de cada una.
+        Los identificadores se recorren una sola vez para todas las variables.
+        """
+        ids = hashlib.sha1()
+        if self.var_id in b.columns:
+            ids.update(pd.util.hash_pandas_object(b[self.var_id], index=False).to_numpy().tobytes())
+        else:
+            ids.update(str(len(b)).encode())
+
+        huellas = {}
+        for nombre in nombres:
+            h = ids.copy()
+            h.update(pd.util.hash_pandas_object(b[self.variables[nombre].lista_vars], index=False).to_numpy().tobytes())
+            huellas[nombre] = h.hexdigest()[:12]
+        return huellas
+
+    def huella_base(self, b, nombre):
+        """
+        Regresa la huella de la base "b" para la variable "nombre" (ver "huellas_base").
+        """
+        return self.huellas_base(b, [nombre])[nombre]
+
+    def vigente(self, nombre, huella_base=None):
+        """
+        Indica si la variable "nombre" ya está guardada con su definición actual (y para la base con huella "huella_base").
+        """
+        info = self.registro.get(nombre)
+        if info is None or info['huella'] != self.variables[nombre].huella() or not os.path.exists(self.archivo(nombre)):
+            return False
+        return huella_base is None or info['huella_base'] == huella_base
+
+    def materializar(self, b, nombres=None, forzar=False, huellas=None):
+        """
+        Calcula y guarda las variables derivadas que no están guardadas con su definición actual.
+
+        Parámetros:
+        ------------
+        b: DataFrame
+            Conjunto de datos limpios.
+        nombres: list
+            Lista con los nombres de las variables. El valor predeterminado es None, todas las registradas.
+        forzar: bool
+            Si es True se vuelven a calcular aunque ya estén guardadas. El valor predeterminado es False.
+        huellas: dict
+            Huellas de la base ya calculadas con "huellas_base". El valor predeterminado es None, se calculan aquí.
+
+        Regresa:
+        ------------
+        list
+            Lista con los nombres de las variables que se calcularon.
+        """
+        nombres = list(self.variables) if nombres is None else nombres
+        huellas = self.huellas_base(b, nombres) if huellas is None else huellas
+        os.makedirs(self.ruta, exist_ok=True)
+
+        calculadas = []
+        for nombre in nombres:
+            huella_base = huellas[nombre]
+            if not forzar and self.vigente(nombre, huella_base):
+                continue
+
+            var = self.variables[nombre]
+
+            # eliminado de las versiones anteriores de la variable
+            for a in os.listdir(self.ruta):
+                if a.startswith(nombre + '__') and a.endswith('.npy'):
+                    os.remove(os.path.join(self.ruta, a))
+
+            np.save(self.archivo(nombre), var.calcular(b))
+            self.registro[nombre] = dict(var.definicion(), huella=var.huella(), huella_base=huella_base, num_registros=len(b))
+            calculadas.append(nombre)
+
+        if calculadas:
+            with open(self.archivo_registro, 'w') as fp:
+                json.dump(self.registro, fp, indent=4, ensure_ascii=False)
+
+        return calculadas
+
+    def cargar(self, nombre, b=None, huella_base=None):
+        """
+        Lee la variable derivada guardada. Si se indica la base "b", se comprueba que la variable corresponde a ella.
+
+        Regresa:
+        ------------
+        ndarray
+            Arreglo de tipo uint8 con la variable derivada.
+        """
+        if not self.vigente(nombre):
+            raise AssertionError("La variable '"+nombre+"' no está guardada con su definición actual, es necesario materializarla")
+
+        if b is not None and self.registro[nombre]['huella_base'] != (huella_base or self.huella_base(b, nombre)):
+            raise AssertionError("La variable '"+nombre+"' se calculó con una base distinta, es necesario materializarla de nuevo")
+
+        return np.load(self.archivo(nombre))
+
+    def agregar(self, b, nombres=None):
+        """
+        Agrega a la base "b" las variables derivadas como columnas, calculando sólo las que falten.
+
+        Las columnas agregadas se pueden usar por su nombre en "proporciones" o en "prevalencias"
+        (por ejemplo: prevalencias(b, ['al_anual'], {})).
+
+        Regresa:
+        ------------
+        DataFrame
+            Conjunto de datos "b" con las variables derivadas.
+        """
+        nombres = list(self.variables) if nombres is None else nombres
+
+        # las huellas se calculan una sola vez para materializar y comprobar las variables
+        huellas = self.huellas_base(b, nombres)
+        self.materializar(b, nombres, huellas=huellas)
+
+        for nombre in nombres:
+            b[nombre] = self.cargar(nombre, b, huella_base=huellas[nombre])
+
+        return b
@@ -4,15 +4,24 @@ Este archivo de python agrupa funciones para generar tabulados, gráficas y cual
 
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
-from openpyxl.styles import Border, Side, Font, Color, PatternFill
-from openpyxl.worksheet.hyperlink import Hyperlink
 import os
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import warnings
 warnings.filterwarnings("ignore")
 
 FUENTE_GLOBAL = 'Montserrat'
 
+# agrupaciones predeterminadas del índice (módulo: palabras clave en el subtítulo de las tablas)
+AGRUPACIONES = {
+    "Módulo Drogas": ["drogas", "ilícitas", 'médicas'],
+    "Módulo Alcohol": ["alcohol"],
+    "Módulo Tabaco": ["tabaco"],
+    "Módulo Salud Mental": ["salud mental", "depresión", "ansiedad", "suicidio"],
+    "Módulo de Actividad física": ["actividad física", "ejercicio", "deporte"]}
+
 # función para establecer la fuente global
 def establecer_fuente_global(fuente):
     global FUENTE_GLOBAL
@@ -22,6 +31,18 @@ def establecer_fuente_global(fuente):
 def obtener_fuente_global():
     return FUENTE_GLOBAL
 
+# metadatos de los tabulados y sus valores predeterminados
+ATRIBUTOS_TABULADO = {
+    'titulo': 'CONASAMA. Encuesta Nacional de Salud Mental y Adicciones 2024 (ENASAMA).',
+    'subtitulo': '',
+    'nota_a': '',
+    'nota_b': '(2) Error estándar: calcula cuánto se aparta el valor obtenido  (estimación puntual) con respecto a la media (estimación puntual promedio) de la población.',
+    'nota_c': '(3) Límite inferior del intervalo de confianza (IC inferior) al 95%.',
+    'nota_d': '(4) Límite superior del intervalo de confianza (IC superior) al 95%.',
+    'nota_e': '(5) Coeficiente de variación: es la proporción entre la desviación estándar y la media poblacional multiplicado por 100.',
+    'fuente': 'Fuente: CONASAMA, Conahcyt. Encuesta Nacional de Salud Mental y Adicciones, 2024.',
+    'modulo': ''}
+
 # --------------------------- # Clase DataFrameAnid # --------------------------- #
 class DataFrameAnid(pd.DataFrame):
     """
@@ -47,6 +68,8 @@ class DataFrameAnid(pd.DataFrame):
             Notas adicionales (a-e) para información sobre los datos.
         - fuente : str
             La fuente de los datos.
+        - modulo : str
+            Módulo (agrupación del índice) al que pertenece la tabla.
 
     Atributos
     ----------
@@ -68,6 +91,9 @@ class DataFrameAnid(pd.DataFrame):
         Nota explicativa 'e', (por defecto) relacionada con el coeficiente de variación.
     fuente : str
         La fuente de los datos del DataFrame.
+    modulo : str
+        Módulo al que pertenece la tabla. Si se indica, define la agrupación del índice en lugar 
+        de las palabras clave del subtítulo.
 
     Métodos
     -------
@@ -75,19 +101,16 @@ class DataFrameAnid(pd.DataFrame):
         Método para propagar los metadatos personalizados cuando se realizan operaciones
         que devuelven un nuevo DataFrame.
     """
-    _metadata = ['titulo', 'subtitulo', 'nota_a', 'nota_b', 'nota_c', 'nota_d', 'nota_e', 'fuente']
+    _metadata = list(ATRIBUTOS_TABULADO)
 
     def __init__(self, *args, **kwargs):
-        self.titulo = kwargs.pop('titulo', 'CONASAMA. Encuesta Nacional de Salud Mental y Adicciones 2024 (ENASAMA).')
-        self.subtitulo = kwargs.pop('subtitulo', '')
-        self.nota_a = kwargs.pop('nota_a', '')
-        self.nota_b = kwargs.pop('nota_b', '(2) Error estándar: calcula cuánto se aparta el valor obtenido  (estimación puntual) con respecto a la media (estimación puntual promedio) de la población.')
-        self.nota_c = kwargs.pop('nota_c', '(3) Límite inferior del intervalo de confianza (IC inferior) al 95%.')
-        self.nota_d = kwargs.pop('nota_d', '(4) Límite superior del intervalo de confianza (IC superior) al 95%.')
-        self.nota_e = kwargs.pop('nota_e', '(5) Coeficiente de variación: es la proporción entre la desviación estándar y la media poblacional multiplicado por 100.')
-        self.fuente = kwargs.pop('fuente', 'Fuente: CONASAMA, Conahcyt. Encuesta Nacional de Salud Mental y Adicciones, 2024.')
+        atributos = {nombre: kwargs.pop(nombre, valor) for nombre, valor in ATRIBUTOS_TABULADO.items()}
 
+        # primero se construye el DataFrame y después se asignan los metadatos directamente,
+        # sin pasar por el manejo de atributos de pandas
         super().__init__(*args, **kwargs)
+        for nombre, valor in atributos.items():
+            object.__setattr__(self, nombre, valor)
 
     def __finalize__(self, other, method=None, **kwargs):
         """
@@ -130,16 +153,109 @@ class DataFrameAnid(pd.DataFrame):
             object.__setattr__(self, name, getattr(other, name, ''))
         return self
 
+# --------------------------- # Clase Tabulado # --------------------------- #
+class Tabulado:
+    """
+    Contenedor ligero de un tabulado: un DataFrame sin modificar y sus metadatos (título, subtítulo, notas, 
+    fuente y módulo). 
+
+    A diferencia de DataFrameAnid, no extiende `pd.DataFrame`, por lo que las operaciones de pandas sobre 
+    los datos no copian metadatos. Los metadatos no se pueden modificar; para cambiarlos se usa "reemplazar", 
+    que regresa un tabulado nuevo que comparte los datos. Se puede usar en lugar de un DataFrameAnid en 
+    "generar_diccionario_maestro" y en los generadores de reportes, y se puede guardar en un archivo Arrow 
+    ("guardar_arrow" y "leer_arrow") para pasar los tabulados entre la estimación, los reportes y las gráficas.
+
+    Parámetros
+    ----------
+    datos : DataFrame
+        Datos del tabulado.
+    **atributos : dict
+        Metadatos del tabulado (ver ATRIBUTOS_TABULADO). Los que no se indiquen toman el valor predeterminado.
+
+    Ejemplo
+    -------
+    t = Tabulado(prevalencias(b, ['al4'], {1:1, 2:0}), subtitulo='Consumo de alcohol en el último año', modulo='Módulo Alcohol')
+    """
+    __slots__ = ('datos',) + tuple(ATRIBUTOS_TABULADO)
+
+    def __init__(self, datos, **atributos):
+        desconocidos = set(atributos) - set(ATRIBUTOS_TABULADO)
+        if desconocidos:
+            raise AssertionError("Los atributos "+str(sorted(desconocidos))+" no son metadatos de un tabulado")
+
+        object.__setattr__(self, 'datos', datos)
+        for nombre, valor in ATRIBUTOS_TABULADO.items():
+            object.__setattr__(self, nombre, atributos.get(nombre, valor))
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("Los tabulados no se pueden modificar, es necesario usar 'reemplazar'")
+
+    def __repr__(self):
+        return f"Tabulado({self.subtitulo!r}, {self.datos.shape[0]} filas x {self.datos.shape[1]} columnas)"
+
+    @classmethod
+    def desde_dataframe(cls, df, **atributos):
+        """
+        Crea un tabulado a partir de un DataFrameAnid (con sus metadatos) o de un DataFrame.
+        """
+        metadatos = {nombre: getattr(df, nombre) for nombre in ATRIBUTOS_TABULADO if nombre in getattr(df, '_metadata', [])}
+        metadatos.update(atributos)
+        return cls(pd.DataFrame(df, copy=False), **metadatos)
+
+    def atributos(self):
+        """
+        Regresa los metadatos del tabulado en un diccionario.
+        """
+        return {nombre: getattr(self, nombre) for nombre in ATRIBUTOS_TABULADO}
+
+    def reemplazar(self, **cambios):
+        """
+        Regresa un tabulado nuevo con los datos o metadatos indicados en "cambios".
+        """
+        datos = cambios.pop('datos', self.datos)
+        return Tabulado(datos, **dict(self.atributos(), **cambios))
+
+    def guardar_arrow(self, ruta):
+        """
+        Guarda el tabulado en un archivo Arrow IPC; los metadatos se guardan en el esquema del archivo.
+        """
+        import pyarrow as pa
+
+        tabla = pa.Table.from_pandas(self.datos, preserve_index=True)
+        metadatos = dict(tabla.schema.metadata or {})
+        metadatos[b'tabulado'] = json.dumps(self.atributos(), ensure_ascii=False).encode('utf-8')
+        tabla = tabla.replace_schema_metadata(metadatos)
+
+        with pa.OSFile(ruta, 'wb') as sink:
+            with pa.ipc.new_file(sink, tabla.schema) as writer:
+                writer.write_table(tabla)
+
+        return None
+
+    @classmethod
+    def leer_arrow(cls, ruta):
+        """
+        Lee un tabulado guardado con "guardar_arrow". Sólo la lectura del archivo IPC usa mapeo de memoria; 
+        la conversión a DataFrame (tabla.to_pandas()) copia los datos.
+        """
+        import pyarrow as pa
+
+        with pa.memory_map(ruta, 'r') as fuente:
+            tabla = pa.ipc.open_file(fuente).read_all()
+
+        atributos = json.loads(tabla.schema.metadata[b'tabulado'].decode('utf-8'))
+        return cls(tabla.to_pandas(), **atributos)
+
 # --------------------------- # Funciones para generar el reporte # --------------------------- #
 
 def extraer_datos_y_atributos(df_anid):
     """
-    Guarda los datos y atributos de un DataFrameAnid en un diccionario.
+    Guarda los datos y atributos de un DataFrameAnid (o de un Tabulado) en un diccionario.
 
     Parámetros:
     -----------
-    df_anid: DataFrameAnid
-        DataFrameAnid con los datos y atributos a extraer.
+    df_anid: DataFrameAnid o Tabulado
+        DataFrameAnid o Tabulado con los datos y atributos a extraer.
     
     Regresa:
     --------
@@ -150,6 +266,9 @@ def extraer_datos_y_atributos(df_anid):
     -----
     Los atributos deben coincidir con los establecidos en la clase DataFrameAnid.
     """
+    if isinstance(df_anid, Tabulado):
+        return {'datos': df_anid.datos, **df_anid.atributos()}
+
     datos_y_atributos = {
         'datos': df_anid,
         'titulo': df_anid.titulo,
@@ -159,7 +278,8 @@ def extraer_datos_y_atributos(df_anid):
         'nota_c': df_anid.nota_c,
         'nota_d': df_anid.nota_d,
         'nota_e': df_anid.nota_e,
-        'fuente': df_anid.fuente       
+        'fuente': df_anid.fuente,
+        'modulo': df_anid.modulo
     }
     return datos_y_atributos
 
@@ -170,7 +290,7 @@ def generar_diccionario_maestro(list_df):
     Parámetros:
     -----------
     list_df: list
-        Lista que contiene cada uno de los DataFramesAnid que interese integrar en el archivo de salida.
+        Lista que contiene cada uno de los DataFramesAnid (o Tabulados) que interese integrar en el archivo de salida.
     
     Regresa:
     --------
@@ -228,6 +348,8 @@ def generar_reporte(dicc, titulo_salida):
             ws.cell(row=u_fila + 4, column=1, value=value['nota_e'])
             ws.cell(row=u_fila + 5, column=1, value=value['fuente'])
 
+    guardar_manifiesto(ruta_completa, {f"Tabla {num_tabla}": entrada_manifiesto(value) for num_tabla, value in enumerate(dicc.values(), start=1)})
+
     return None
 
 # --------------------------- # Clases de estilos tabulados # --------------------------- #
@@ -249,6 +371,8 @@ class Fuente:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
         
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -281,6 +405,8 @@ class Titulos:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
         
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -293,24 +419,25 @@ class Titulos:
             if hoja.title == "Indice":
                 continue
 
-            for hoja in wb:
-                for row in hoja.iter_rows():
-                    for cell in row:
-                        if cell.row == 1:
-                            cell.font = fuente_titulo
-                        elif cell.row == 2:
-                            cell.font = fuente_subtitulo
+            for row in hoja.iter_rows(max_row=2):
+                for cell in row:
+                    if cell.row == 1:
+                        cell.font = fuente_titulo
+                    elif cell.row == 2:
+                        cell.font = fuente_subtitulo
     
         wb.save(os.path.join(ruta, archivo))
 
         return None
     
 class Bordes:
-    def __init__(self, no_border=Border(left=Side(style=None), 
-                    right=Side(style=None),
-                    top=Side(style=None),
-                    bottom=Side(style=None))):
-        self.no_border = no_border
+    def __init__(self, no_border=None):
+        from openpyxl.styles import Border, Side
+
+        self.no_border = no_border if no_border else Border(left=Side(style=None), 
+                                                            right=Side(style=None),
+                                                            top=Side(style=None),
+                                                            bottom=Side(style=None))
 
     def modificar_bordes(self, archivo):
         """ 
@@ -325,6 +452,7 @@ class Bordes:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
         
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -334,10 +462,9 @@ class Bordes:
                 continue
 
             else:
-                for hoja in wb:
-                    for row in hoja.iter_rows():
-                        for cell in row:
-                            cell.border = self.no_border
+                for row in hoja.iter_rows():
+                    for cell in row:
+                        cell.border = self.no_border
     
         wb.save(os.path.join(ruta, archivo))
 
@@ -360,6 +487,8 @@ class NegritasHeaders:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
         
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -372,9 +501,8 @@ class NegritasHeaders:
                 continue
 
             else:
-                for hoja in wb:
-                    for celda in hoja[4]:
-                        celda.font = negritas_headers
+                for celda in hoja[4]:
+                    celda.font = negritas_headers
     
         wb.save(os.path.join(ruta, archivo))
 
@@ -398,6 +526,9 @@ class NegritasIndex:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
+
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
 
@@ -436,6 +567,8 @@ class Notas:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
 
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -471,6 +604,7 @@ class AnchoCelda:
         ------------
         Archivo excel
         """
+        from openpyxl import load_workbook
 
         ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         wb = load_workbook(os.path.join(ruta, archivo))
@@ -479,20 +613,109 @@ class AnchoCelda:
             if hoja.title == "Indice":
                 continue
 
-            for col in hoja.iter_cols(min_row=4, max_row=4):
-                column = col[0].column_letter
-
-                if column == 'A' or column == 'B':
-                    hoja.column_dimensions[column].width = self.ancho_fijo_AB
-                else:
-                    max_long = max(len(str(cell.value)) for cell in col if cell.value is not None)
-                    ancho_ajustado = (max_long + 2) * 1.2
-                    hoja.column_dimensions[column].width = ancho_ajustado
+            ajustar_anchos(hoja, self.ancho_fijo_AB)
 
         wb.save(os.path.join(ruta, archivo))
 
         return None
 
+def compilar_agrupaciones(agrupaciones):
+    """
+    Compila las palabras clave de cada agrupación del índice en una sola expresión regular.
+
+    Parámetros:
+    ------------
+    agrupaciones: dict
+        diccionario que contiene las agrupaciones y las palabras clave que se utilizarán para identificar los módulos.
+
+    Regresa:
+    ------------
+    list
+        lista de tuplas (agrupación, expresión regular compilada o None si la agrupación no tiene palabras clave).
+    """
+    return [(grupo, re.compile('|'.join(re.escape(palabra.lower()) for palabra in palabras_clave)) if palabras_clave else None)
+            for grupo, palabras_clave in agrupaciones.items()]
+
+def disponer_indice(subtitulos, agrupaciones):
+    """
+    Calcula la posición de las entradas del índice por agrupaciones a partir de los metadatos de las tablas.
+
+    Una tabla pertenece a una agrupación si alguna de sus palabras clave aparece en el subtítulo (sin distinguir 
+    mayúsculas y minúsculas). Si la tabla tiene módulo (ver DataFrameAnid), se coloca sólo en esa agrupación; 
+    los módulos que no están en "agrupaciones" se agregan al final del índice.
+
+    Parámetros:
+    ------------
+    subtitulos: list
+        lista de tuplas (nombre de la hoja, subtítulo de la tabla) o (nombre de la hoja, subtítulo, módulo) 
+        en el orden de las hojas.
+    agrupaciones: dict
+        diccionario que contiene las agrupaciones y las palabras clave que se utilizarán para identificar los módulos.
+
+    Regresa:
+    ------------
+    list
+        lista de tuplas (fila, columna, valor, nombre de la hoja) con las celdas del índice. El nombre de 
+        la hoja es None en las celdas de agrupación y se usa para el hipervínculo en las celdas de subtítulo.
+    """
+    patrones = compilar_agrupaciones(agrupaciones)
+    entradas = {grupo: [] for grupo in agrupaciones}
+
+    for nombre_hoja, subtítulo, *modulo in subtitulos:
+        subtítulo = subtítulo if subtítulo is not None else ""
+        modulo = modulo[0] if modulo else None
+
+        if modulo:
+            entradas.setdefault(modulo, []).append((nombre_hoja, subtítulo))
+            continue
+
+        subtítulo_min = subtítulo.lower()
+        for grupo, patron in patrones:
+            if patron is not None and patron.search(subtítulo_min):
+                entradas[grupo].append((nombre_hoja, subtítulo))
+
+    celdas = []
+    fila_actual = 5
+    for grupo, tablas in entradas.items():
+        if not tablas:
+            continue
+
+        celdas.append((fila_actual, 3, grupo, None))
+        fila_actual += 1
+        for nombre_hoja, subtítulo in tablas:
+            celdas.append((fila_actual, 4, subtítulo, nombre_hoja))
+            fila_actual += 1
+
+        fila_actual += 1
+
+    return celdas
+
+def aplicar_fondo_blanco(hoja, max_columna=62):
+    """
+    Aplica un fondo blanco a la hoja con un solo estilo de columnas (A hasta la columna "max_columna") y sin 
+    líneas de cuadrícula, en lugar de rellenar celda por celda. Funciona también en hojas de escritura continua.
+
+    Parámetros:
+    ------------
+    hoja: Worksheet
+        hoja de excel.
+    max_columna: int
+        número de columnas con fondo blanco.
+
+    Regresa:
+    ------------
+    None
+    """
+    from openpyxl.styles import PatternFill
+    from openpyxl.worksheet.dimensions import ColumnDimension
+
+    columnas = ColumnDimension(hoja, index='A', min=1, max=max_columna, width=0)
+    columnas.fill = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
+    hoja.column_dimensions['A'] = columnas
+    hoja.sheet_view.showGridLines = False
+
+    return None
+
 class IndiceAgrupaciones:
     """
     Clase para generar el índice por agrupaciones de acuerdo el módulo al que pertenecen los resultados de cada tabla.
@@ -503,18 +726,23 @@ class IndiceAgrupaciones:
         nombre del archivo excel que se tomará como referencia para generar el índice.
     agrupaciones: dict
         diccionario que contiene las agrupaciones y las palabras clave que se utilizarán para identificar los módulos.
+    wb: Workbook, opcional
+        libro de excel ya abierto en el que se generará el índice. Por defecto es None, el libro se lee de "archivo".
     
     Regresa:
     ------------
     Archivo excel
     """
 
-    def __init__(self, archivo, agrupaciones):
+    def __init__(self, archivo, agrupaciones, wb=None):
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
+
         self.archivo = archivo
         self.agrupaciones = agrupaciones
         self.ruta = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
         self.archivo_completo = os.path.join(self.ruta, archivo)
-        self.wb = load_workbook(self.archivo_completo)
+        self.wb = wb if wb is not None else load_workbook(self.archivo_completo)
         self.indice_hoja = self.wb["Indice"]
 
         fuente_global = obtener_fuente_global()
@@ -523,106 +751,737 @@ class IndiceAgrupaciones:
         self.fuente_contenido = Font(name=fuente_global, size=11, bold=True)
 
     def aplicar_relleno_blanco(self):
-        relleno_blanco = PatternFill(start_color='FFFFFF', end_color='FFFFFF', fill_type='solid')
-        max_fila = 500
-        max_columna = 62
+        aplicar_fondo_blanco(self.indice_hoja)
 
-        for fila in range(1, max_fila + 1):
-            for columna in range(1, max_columna + 1):
-                celda = self.indice_hoja.cell(row=fila, column=columna)
-                celda.fill = relleno_blanco
+    def generar_indice(self, guardar=True, subtitulos=None, titulo=None):
+        """
+        Genera el índice. Si se indican "subtitulos" (ver "disponer_indice") y "titulo", se usan los metadatos 
+        de las tablas en lugar de leer las celdas A1 y A2 de cada hoja.
+        """
+        from openpyxl.worksheet.hyperlink import Hyperlink
 
-    def generar_indice(self):
         self.aplicar_relleno_blanco()
 
-        for nombre_hoja in self.wb.sheetnames:
-            if nombre_hoja != "Indice":
-                titulo_hoja = self.wb[nombre_hoja]["A1"].value
-                celda_titulo_indice = self.indice_hoja.cell(row=1, column=1, value=titulo_hoja)
-                celda_titulo_indice.font = self.fuente_titulo
-                break
+        if subtitulos is None:
+            subtitulos = [(nombre_hoja, self.wb[nombre_hoja]["A2"].value) for nombre_hoja in self.wb.sheetnames if nombre_hoja != "Indice"]
+            titulo = self.wb[subtitulos[0][0]]["A1"].value if subtitulos else None
+
+        if subtitulos:
+            celda_titulo_indice = self.indice_hoja.cell(row=1, column=1, value=titulo)
+            celda_titulo_indice.font = self.fuente_titulo
 
         celda_contenido = self.indice_hoja.cell(row=3, column=2, value="Contenido")
         celda_contenido.font = self.fuente_contenido
 
-        fila_actual = 5
-        for grupo, palabras_clave in self.agrupaciones.items():
-            filas_agregadas = 0
+        for fila, columna, valor, nombre_hoja in disponer_indice(subtitulos, self.agrupaciones):
+            celda = self.indice_hoja.cell(row=fila, column=columna, value=valor)
+            if nombre_hoja is not None:
+                celda.hyperlink = Hyperlink(ref="", location=f"'{nombre_hoja}'!A1", tooltip=f"Ir a {nombre_hoja}")
+                celda.style = "Hyperlink"
+            celda.font = self.fuente
 
-            for nombre_hoja in self.wb.sheetnames:
-                if nombre_hoja == "Indice":
-                    continue
+        if guardar:
+            self.wb.save(self.archivo_completo)
 
-                hoja = self.wb[nombre_hoja]
-                subtítulo = hoja["A2"].value if hoja["A2"].value is not None else ""
+# --------------------------- # Funciones de estilo sobre hojas abiertas # --------------------------- #
+def fuentes_tabulado():
+    """ 
+    Regresa las fuentes de los tabulados ({nombre del estilo: Font}) y el borde vacío que comparten sus celdas.
+    """
+    from openpyxl.styles import Border, Side, Font
+
+    fuente_global = obtener_fuente_global()
+    fuentes = {
+        'tab_base': Font(name=fuente_global, size=10),
+        'tab_titulo': Font(name=fuente_global, size=14, bold=True),
+        'tab_subtitulo': Font(name=fuente_global, size=11, bold=False),
+        'tab_negritas': Font(name=fuente_global, size=10, bold=True),
+        'tab_nota': Font(name=fuente_global, size=8, bold=False)
+    }
+    sin_bordes = Border(left=Side(style=None), right=Side(style=None), top=Side(style=None), bottom=Side(style=None))
 
-                if any(palabra.lower() in subtítulo.lower() for palabra in palabras_clave):
-                    if filas_agregadas == 0:
-                        celda_grupo = self.indice_hoja.cell(row=fila_actual, column=3, value=grupo)
-                        celda_grupo.font = self.fuente
-                        fila_actual += 1
+    return fuentes, sin_bordes
 
-                    celda_subtítulo = self.indice_hoja.cell(row=fila_actual, column=4, value=subtítulo)
-                    celda_subtítulo.hyperlink = Hyperlink(ref="", location=f"'{nombre_hoja}'!A1", tooltip=f"Ir a {nombre_hoja}")
-                    celda_subtítulo.style = "Hyperlink"
-                    celda_subtítulo.font = self.fuente
-                    
-                    fila_actual += 1
-                    filas_agregadas += 1
+def registrar_estilos(wb):
+    """ 
+    Registra en el libro los estilos con nombre que se usan en los tabulados escritos en modo continuo
+    (ver "escribir_tabla_continua"), cuyas celdas se crean sin formato previo.
 
-            if filas_agregadas > 0:
-                fila_actual += 1
+    Cada celda hace referencia a un estilo compartido en lugar de crear su propia fuente y borde.
 
-        self.wb.save(self.archivo_completo)
+    Parámetros:
+    ------------
+    wb: Workbook
+        libro de excel en el que se registrarán los estilos.
+
+    Regresa:
+    ------------
+    None
+    """
+    from openpyxl.styles import NamedStyle
+
+    estilos, sin_bordes = fuentes_tabulado()
+    for nombre, fuente in estilos.items():
+        if nombre not in wb.named_styles:
+            wb.add_named_style(NamedStyle(name=nombre, font=fuente, border=sin_bordes))
+
+    return None
+
+def estilizar_tabla(hoja, num_notas=7):
+    """ 
+    Aplica en una sola pasada los estilos de un tabulado: fuente, títulos, bordes, encabezados en negritas, 
+    negritas del índice y notas.
+
+    Sólo se cambian la fuente y el borde de cada celda (ver "fuentes_tabulado"): la alineación y el formato numérico 
+    que escribe pandas (por ejemplo, en las celdas combinadas de un índice múltiple) se conservan. openpyxl guarda 
+    una sola vez cada fuente distinta, por lo que las celdas la comparten.
+
+    Parámetros:
+    ------------
+    hoja: Worksheet
+        hoja de excel con el tabulado.
+    num_notas: int, default=7
+        Número de notas al final de la hoja.
+
+    Regresa:
+    ------------
+    None
+    """
+    fuentes, sin_bordes = fuentes_tabulado()
+    max_fila = hoja.max_row
+    estilos_fila = {1: 'tab_titulo', 2: 'tab_subtitulo', 4: 'tab_negritas'}
+
+    # fuente, bordes, títulos y encabezados
+    for fila in hoja.iter_rows(min_row=1, max_row=max_fila, max_col=hoja.max_column):
+        fuente = fuentes[estilos_fila.get(fila[0].row, 'tab_base')]
+        for celda in fila:
+            celda.font = fuente
+            celda.border = sin_bordes
+
+    # negritas del índice
+    for i in range(4, max_fila):
+        if (i+1) % 3 == 0:
+            hoja[f'A{i}'].font = fuentes['tab_negritas']
+
+    # notas
+    for i in range(max_fila, max(max_fila-num_notas, 0), -1):
+        hoja[f'A{i}'].font = fuentes['tab_nota']
+
+    return None
+
+def calcular_anchos(longitudes, ancho_fijo_AB=20.57, ancho_max=50, anchos=None):
+    """ 
+    Calcula el ancho de las columnas de un tabulado a partir de la longitud máxima del texto de cada columna.
+
+    Parámetros:
+    ------------
+    longitudes: list
+        longitud máxima (en caracteres) del encabezado y los valores de cada columna, en el orden de la hoja.
+    ancho_fijo_AB: float
+        ancho de las columnas A y B. Si es None, se calculan como las demás.
+    ancho_max: float
+        ancho máximo de una columna.
+    anchos: dict, opcional
+        anchos fijos por columna, por ejemplo {'C': 12}. Tienen prioridad sobre el resto.
+
+    Regresa:
+    ------------
+    dict
+        diccionario {letra de la columna: ancho}.
+    """
+    from openpyxl.utils import get_column_letter
+
+    resultado = {}
+    for j, longitud in enumerate(longitudes, start=1):
+        letra = get_column_letter(j)
+        if ancho_fijo_AB is not None and (letra == 'A' or letra == 'B'):
+            resultado[letra] = ancho_fijo_AB
+        else:
+            resultado[letra] = min((longitud + 2) * 1.2, ancho_max)
+
+    resultado.update(anchos if anchos else {})
+
+    return resultado
+
+def anchos_tabulado(df, ancho_fijo_AB=20.57, ancho_max=50, anchos=None):
+    """ 
+    Calcula el ancho de las columnas de la hoja de un tabulado directamente del DataFrame, con la longitud del 
+    texto de los nombres, las etiquetas del índice y los valores (sin leer las celdas del libro).
+
+    Parámetros:
+    ------------
+    df: DataFrame
+        DataFrame con los datos del tabulado (se escribe con el índice, ver "generar_reporte").
+    ancho_fijo_AB: float
+        ancho de las columnas A y B. Si es None, se calculan como las demás.
+    ancho_max: float
+        ancho máximo de una columna.
+    anchos: dict, opcional
+        anchos fijos por columna, por ejemplo {'C': 12}.
+
+    Regresa:
+    ------------
+    dict
+        diccionario {letra de la columna: ancho}.
+    """
+    encabezados = pd.Series(list(df.index.names) + list(df.columns), dtype=object)
+    long_encabezados = encabezados.where(encabezados.notna(), '').astype(str).str.len().to_numpy()
+
+    long_indice = [df.index.get_level_values(i).astype(str).str.len().max() for i in range(df.index.nlevels)]
+    long_datos = df.where(df.notna(), '').astype(str).apply(lambda c: c.str.len().max()).tolist() if len(df.columns) else []
+    long_valores = np.nan_to_num(np.array(long_indice + long_datos, dtype=float))
+
+    return calcular_anchos(np.maximum(long_encabezados, long_valores), ancho_fijo_AB, ancho_max, anchos)
+
+def aplicar_anchos(hoja, anchos):
+    """ 
+    Fija en la hoja los anchos de columna calculados con "anchos_tabulado" o "calcular_anchos".
+    """
+    for letra, ancho in anchos.items():
+        hoja.column_dimensions[letra].width = ancho
+
+    return None
+
+def ajustar_anchos(hoja, ancho_fijo_AB=20.57, ancho_max=50, anchos=None, num_notas=7):
+    """ 
+    Fija el ancho de las columnas de un tabulado ya escrito de acuerdo con la longitud del encabezado (fila 4) 
+    y de los valores de cada columna. 
+
+    Se usa cuando sólo se tiene el libro (ver "aplicar_estilo"); al generar el reporte es preferible 
+    "anchos_tabulado", que calcula los anchos del DataFrame.
+
+    Parámetros:
+    ------------
+    hoja: Worksheet
+        hoja de excel con el tabulado.
+    ancho_fijo_AB: float
+        ancho de las columnas A y B. Si es None, se calculan como las demás.
+    ancho_max: float
+        ancho máximo de una columna.
+    anchos: dict, opcional
+        anchos fijos por columna, por ejemplo {'C': 12}.
+    num_notas: int, default=7
+        Número de notas al final de la hoja (no se toman en cuenta).
+
+    Regresa:
+    ------------
+    None
+    """
+    longitudes = [max((len(str(cell.value)) for cell in col if cell.value is not None), default=0)
+                  for col in hoja.iter_cols(min_row=4, max_row=max(hoja.max_row - num_notas, 4))]
+
+    aplicar_anchos(hoja, calcular_anchos(longitudes, ancho_fijo_AB, ancho_max, anchos))
+
+    return None
 
 # --------------------------- # Función para integrar todo el estilo al archivo xlsx  # --------------------------- #
-def aplicar_estilo(nombre_archivo):
+def aplicar_estilo(nombre_archivo, agrupaciones=None):
     """ 
     Aplica los estilos predetermindos a un archivo excel.
 
+    El archivo se lee y se guarda una sola vez. Para generar un reporte nuevo es preferible utilizar 
+    "generar_reporte_estilizado", que aplica los estilos al mismo tiempo que escribe las tablas.
+
     Parámetros:
     ------------
     nombre_archivo: str
         nombre del archivo excel que se tomará como referencia para aplicar los estilos predeterminados.
+    agrupaciones: dict, opcional
+        diccionario con las agrupaciones del índice. Por defecto se usa AGRUPACIONES.
 
     Regresa:
     ------------
     Archivo excel
     """
+    from openpyxl import load_workbook
 
     ruta_completa = os.path.join('..', 'datos', 'procesados', 'tab_consultas')
     archivo = os.path.join(ruta_completa, nombre_archivo)
 
-    # crear una instancia de la clase
-    fuente_predeterminada = Fuente()
-    titulos_predeterminados = Titulos()
-    bordes_predeterminados = Bordes()
-    negritas_headers = NegritasHeaders()
-    negritas_index = NegritasIndex()
-    notas = Notas()
-    ancho_celda = AnchoCelda()
-
-    # llamar al método para modificar el archivo
-    fuente_predeterminada.modificar_fuente(nombre_archivo)
-    titulos_predeterminados.modificar_titulos(nombre_archivo)
-    bordes_predeterminados.modificar_bordes(nombre_archivo)
-    negritas_headers.modificar_negritas(nombre_archivo)
-    negritas_index.iterar_negritas(nombre_archivo)
-    notas.modificar_notas(nombre_archivo)
-    ancho_celda.fijar_ancho_celda(nombre_archivo)
-
-    agrupaciones = {
-    "Módulo Drogas": ["drogas", "ilícitas", 'médicas'],
-    "Módulo Alcohol": ["alcohol"],
-    "Módulo Tabaco": ["tabaco"],
-    "Módulo Salud Mental": ["salud mental", "depresión", "ansiedad", "suicidio"],
-    "Módulo de Actividad física": ["actividad física", "ejercicio", "deporte"]}
+    wb = load_workbook(archivo)
+
+    for hoja in wb:
+        if hoja.title == "Indice":
+            continue
+        estilizar_tabla(hoja)
+        ajustar_anchos(hoja)
+
+    # si el reporte tiene manifiesto, el índice se genera con los metadatos de las tablas
+    manifiesto = leer_manifiesto(archivo)
+    subtitulos, titulo = None, None
+    if manifiesto and list(manifiesto['hojas']) == [h for h in wb.sheetnames if h != "Indice"]:
+        subtitulos, titulo = subtitulos_manifiesto(manifiesto['hojas'])
+
+    indice = IndiceAgrupaciones(nombre_archivo, agrupaciones if agrupaciones else AGRUPACIONES, wb=wb)
+    indice.generar_indice(guardar=False, subtitulos=subtitulos, titulo=titulo)
+
+    wb.save(archivo)
+
+    return None
+
+# --------------------------- # Funciones del manifiesto de los reportes # --------------------------- #
+def huella_tabulado(value):
+    """
+    Calcula la huella (hash) del contenido de un tabulado: datos, índice, nombres de columnas y atributos.
+
+    Parámetros:
+    ------------
+    value: dict
+        datos y atributos del DataFrameAnid (ver "extraer_datos_y_atributos").
+
+    Regresa:
+    ------------
+    str
+        huella del tabulado.
+    """
+    df = value['datos']
+    h = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    atributos = [value[k] for k in ['titulo', 'subtitulo', 'nota_a', 'nota_b', 'nota_c', 'nota_d', 'nota_e', 'fuente']] + [value.get('modulo', '')]
+    estructura = [list(map(str, df.columns)), list(map(str, df.index.names)), list(map(str, df.dtypes)), atributos]
+    h.update(json.dumps(estructura, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def huella_agrupaciones(agrupaciones):
+    """
+    Calcula la huella (hash) de las agrupaciones del índice.
+    """
+    return hashlib.sha1(json.dumps(agrupaciones, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+def archivo_manifiesto(ruta_xlsx):
+    """
+    Regresa la ruta del manifiesto de un reporte: "<reporte>.manifiesto.json" junto al archivo de Excel.
+    """
+    return os.path.splitext(ruta_xlsx)[0] + '.manifiesto.json'
+
+def leer_manifiesto(ruta_xlsx):
+    """
+    Lee el manifiesto de un reporte. Regresa None si el reporte no tiene manifiesto.
+    """
+    archivo = archivo_manifiesto(ruta_xlsx)
+    if not os.path.exists(archivo):
+        return None
+    with open(archivo, encoding='utf-8') as fp:
+        return json.load(fp)
+
+def guardar_manifiesto(ruta_xlsx, hojas, agrupaciones=None):
+    """
+    Guarda el manifiesto de un reporte.
 
-    indice = IndiceAgrupaciones(nombre_archivo, agrupaciones)
-    indice.generar_indice()    
+    El manifiesto registra, por cada hoja y en el orden del libro, la huella del contenido del tabulado, 
+    su título, su subtítulo y su módulo; con ello es posible actualizar sólo las hojas que cambian y rehacer el índice 
+    sin leer las celdas del libro (ver "actualizar_reporte").
+
+    Parámetros:
+    ------------
+    ruta_xlsx: str
+        ruta del archivo de Excel.
+    hojas: dict
+        diccionario {nombre de la hoja: {'huella', 'titulo', 'subtitulo', 'modulo'}}.
+    agrupaciones: dict, opcional
+        agrupaciones con las que se generó el índice. Por defecto se usa AGRUPACIONES.
+
+    Regresa:
+    ------------
+    None
+    """
+    manifiesto = {'agrupaciones': huella_agrupaciones(agrupaciones if agrupaciones else AGRUPACIONES),
+                  'hojas': hojas}
+    with open(archivo_manifiesto(ruta_xlsx), 'w', encoding='utf-8') as fp:
+        json.dump(manifiesto, fp, indent=4, ensure_ascii=False)
 
     return None
 
+def entrada_manifiesto(value):
+    """
+    Regresa la entrada del manifiesto de un tabulado.
+    """
+    return {'huella': huella_tabulado(value), 'titulo': value['titulo'], 'subtitulo': value['subtitulo'], 'modulo': value.get('modulo', '')}
+
+def subtitulos_manifiesto(hojas):
+    """
+    Regresa las entradas del índice (ver "disponer_indice") y el título a partir de las hojas del manifiesto.
+    """
+    subtitulos = [(nombre_hoja, e['subtitulo'], e.get('modulo', '')) for nombre_hoja, e in hojas.items()]
+    titulo = next(iter(hojas.values()))['titulo'] if hojas else None
+    return subtitulos, titulo
+
+# --------------------------- # Función para generar el reporte con estilos en una sola pasada # --------------------------- #
+def escribir_tabla(writer, nombre_hoja, value):
+    """
+    Escribe un tabulado con sus estilos en la hoja "nombre_hoja" de un ExcelWriter (motor openpyxl).
+
+    Parámetros:
+    -----------
+    writer: ExcelWriter
+        ExcelWriter abierto con el motor openpyxl.
+    nombre_hoja: str
+        nombre de la hoja.
+    value: dict
+        datos y atributos del DataFrameAnid (ver "extraer_datos_y_atributos").
+
+    Regresa:
+    --------
+    None
+    """
+    value['datos'].to_excel(writer, sheet_name=nombre_hoja, startrow=3, index=True)
+
+    ws = writer.sheets[nombre_hoja]
+
+    # añade el título y subtítulo
+    ws.cell(row=1, column=1, value=value['titulo'])
+    ws.cell(row=2, column=1, value=value['subtitulo'])
+
+    # añade las notas al final del df
+    u_fila = len(value['datos'].index) + 6
+    for i, nota in enumerate(['nota_a', 'nota_b', 'nota_c', 'nota_d', 'nota_e', 'fuente']):
+        ws.cell(row=u_fila + i, column=1, value=value[nota])
+
+    estilizar_tabla(ws)
+    aplicar_anchos(ws, anchos_tabulado(value['datos']))
+
+    return None
+
+def generar_reporte_estilizado(dicc, titulo_salida, agrupaciones=None, ruta=None):
+    """
+    Genera el archivo de Excel con las tablas de los DataFramesAnid y aplica los estilos mientras se escribe.
+
+    Es equivalente a "generar_reporte" seguido de "aplicar_estilo", pero el libro se guarda una sola vez:
+    títulos, fuentes, bordes, encabezados, notas, ancho de columnas e índice se aplican sobre el libro en 
+    memoria y las fuentes se comparten entre celdas (ver "estilizar_tabla").
+
+    Parámetros:
+    -----------
+    dicc: dict
+        Diccionario que contiene todos los DataFramesAnid y sus atributos anidados.
+    titulo_salida: str
+        Nombre del archivo de salida.
+    agrupaciones: dict, opcional
+        Diccionario con las agrupaciones del índice. Por defecto se usa AGRUPACIONES.
+    ruta: str, opcional
+        Carpeta de salida. Por defecto es la carpeta de datos procesados "tab_consultas".
+    
+    Regresa:
+    --------
+    None
+        El archivo de Excel se guarda en la carpeta de salida.
+    """
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados', 'tab_consultas')
+    ruta_completa = os.path.join(ruta, titulo_salida + '.xlsx')
+
+    hojas = {}
+    with pd.ExcelWriter(ruta_completa, engine='openpyxl') as writer:
+
+        wb = writer.book
+        wb.create_sheet(title="Indice", index=0)
+
+        for num_tabla, (key, value) in enumerate(dicc.items(), start=1):
+            escribir_tabla(writer, f"Tabla {num_tabla}", value)
+            hojas[f"Tabla {num_tabla}"] = entrada_manifiesto(value)
+
+        # el índice se genera con los metadatos de las tablas
+        subtitulos, titulo = subtitulos_manifiesto(hojas)
+        indice = IndiceAgrupaciones(titulo_salida + '.xlsx', agrupaciones if agrupaciones else AGRUPACIONES, wb=wb)
+        indice.generar_indice(guardar=False, subtitulos=subtitulos, titulo=titulo)
+
+    guardar_manifiesto(ruta_completa, hojas, agrupaciones)
+
+    return None
+
+# --------------------------- # Funciones para exportar reportes grandes en modo de escritura continua # --------------------------- #
+def filas_tabulado(df):
+    """
+    Genera, una por una, las filas de un DataFrame con la misma disposición que `DataFrame.to_excel(index=True)`.
+
+    La primera fila es el encabezado (nombres de los niveles del índice y de las columnas). En los niveles 
+    externos de un índice múltiple las etiquetas repetidas se dejan vacías, lo que equivale visualmente a 
+    las celdas combinadas que genera pandas.
+
+    Parámetros:
+    -----------
+    df: DataFrame
+        DataFrame con los datos del tabulado (columnas de un solo nivel).
+
+    Regresa:
+    --------
+    generator
+        Generador de listas con los valores de cada fila.
+    """
+    num_niveles = df.index.nlevels
+    yield list(df.index.names) + list(df.columns)
+
+    anterior = None
+    for etiquetas, fila in zip(df.index, df.to_numpy(dtype=object)):
+        etiquetas = tuple(etiquetas) if num_niveles > 1 else (etiquetas,)
+        visibles = list(etiquetas)
+        if anterior is not None:
+            for nivel in range(num_niveles - 1):
+                if etiquetas[:nivel + 1] == anterior[:nivel + 1]:
+                    visibles[nivel] = None
+        anterior = etiquetas
+
+        yield visibles + [None if pd.isna(v) else v for v in fila]
+
+def escribir_tabla_continua(wb, nombre_hoja, value, ancho_fijo_AB=20.57, num_notas=7):
+    """
+    Escribe un tabulado con estilos en una hoja nueva de un libro en modo de escritura continua (write_only).
+
+    Las filas se escriben en orden y ya con su estilo, de modo que la hoja no se conserva en memoria.
+    La disposición y los estilos son los mismos que en "generar_reporte_estilizado".
+
+    Parámetros:
+    -----------
+    wb: Workbook
+        libro de excel creado con `Workbook(write_only=True)` y con los estilos registrados.
+    nombre_hoja: str
+        nombre de la hoja.
+    value: dict
+        datos y atributos del DataFrameAnid (ver "extraer_datos_y_atributos").
+    ancho_fijo_AB: float
+        ancho de las columnas A y B.
+    num_notas: int, default=7
+        Número de notas al final de la hoja.
+
+    Regresa:
+    --------
+    None
+    """
+    from openpyxl.cell import WriteOnlyCell
+
+    ws = wb.create_sheet(title=nombre_hoja)
+    filas = filas_tabulado(value['datos'])
+    encabezado = next(filas)
+    num_columnas = len(encabezado)
+    num_datos = len(value['datos'].index)
+    max_fila = num_datos + 11
+    estilos_fila = {1: 'tab_titulo', 2: 'tab_subtitulo', 4: 'tab_negritas'}
+
+    # ancho de las columnas (se fija antes de escribir las filas)
+    aplicar_anchos(ws, anchos_tabulado(value['datos'], ancho_fijo_AB))
+
+    def escribir_fila(num_fila, valores):
+        celdas = []
+        for j in range(max(num_columnas, len(valores))):
+            celda = WriteOnlyCell(ws, value=valores[j] if j < len(valores) else None)
+            celda.style = estilos_fila.get(num_fila, 'tab_base')
+            celdas.append(celda)
+
+        # negritas del índice y notas en la columna A
+        if 4 <= num_fila < max_fila and (num_fila+1) % 3 == 0:
+            celdas[0].style = 'tab_negritas'
+        if num_fila > max_fila - num_notas:
+            celdas[0].style = 'tab_nota'
+
+        ws.append(celdas)
+
+    escribir_fila(1, [value['titulo']])
+    escribir_fila(2, [value['subtitulo']])
+    escribir_fila(3, [])
+    escribir_fila(4, encabezado)
+    for k, valores in enumerate(filas):
+        escribir_fila(5 + k, valores)
+    escribir_fila(num_datos + 5, [])
+    for k, nota in enumerate(['nota_a', 'nota_b', 'nota_c', 'nota_d', 'nota_e', 'fuente']):
+        escribir_fila(num_datos + 6 + k, [value[nota]])
+
+    return None
+
+def escribir_indice_continuo(ws, titulo, celdas_indice):
+    """
+    Escribe el índice por agrupaciones en una hoja de un libro en modo de escritura continua (write_only).
+
+    Parámetros:
+    -----------
+    ws: WriteOnlyWorksheet
+        hoja del índice.
+    titulo: str
+        título del índice (el título de la primera tabla).
+    celdas_indice: list
+        celdas del índice calculadas con "disponer_indice".
+
+    Regresa:
+    --------
+    None
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.worksheet.hyperlink import Hyperlink
+
+    fuente_global = obtener_fuente_global()
+    fuente = Font(name=fuente_global, size=11, bold=False)
+    fuente_titulo = Font(name=fuente_global, size=10, bold=True, color="1F497D")
+    fuente_contenido = Font(name=fuente_global, size=11, bold=True)
+
+    aplicar_fondo_blanco(ws)
+
+    contenido = {1: {1: (titulo, None, fuente_titulo)}, 3: {2: ("Contenido", None, fuente_contenido)}}
+    for fila, columna, valor, nombre_hoja in celdas_indice:
+        contenido.setdefault(fila, {})[columna] = (valor, nombre_hoja, fuente)
+
+    for fila in range(1, max(contenido) + 1):
+        celdas = []
+        columnas = contenido.get(fila, {})
+        for columna in range(1, max(columnas, default=0) + 1):
+            valor, nombre_hoja, fuente_celda = columnas.get(columna, (None, None, None))
+            celda = WriteOnlyCell(ws, value=valor)
+            if nombre_hoja is not None:
+                celda.hyperlink = Hyperlink(ref="", location=f"'{nombre_hoja}'!A1", tooltip=f"Ir a {nombre_hoja}")
+                celda.style = "Hyperlink"
+            if fuente_celda is not None:
+                celda.font = fuente_celda
+            celdas.append(celda)
+        ws.append(celdas)
+
+    return None
+
+def generar_reporte_continuo(tabulados, titulo_salida, agrupaciones=None, ruta=None):
+    """
+    Genera el archivo de Excel con estilos en modo de escritura continua, con memoria constante.
+
+    A diferencia de "generar_reporte_estilizado", las hojas no se conservan en memoria: cada tabla se 
+    escribe fila por fila (con sus estilos) conforme llega y se descarta. Es útil para libros con cientos 
+    de tablas (por ejemplo, desagregaciones municipales o el cuestionario completo).
+    Las tablas con índice múltiple se escriben sin combinar celdas (las etiquetas repetidas se dejan vacías).
+
+    Parámetros:
+    -----------
+    tabulados: dict o iterable
+        Diccionario generado con "generar_diccionario_maestro", o cualquier iterable (lista o generador) de DataFramesAnid.
+    titulo_salida: str
+        Nombre del archivo de salida.
+    agrupaciones: dict, opcional
+        Diccionario con las agrupaciones del índice. Por defecto se usa AGRUPACIONES.
+    ruta: str, opcional
+        Carpeta de salida. Por defecto es la carpeta de datos procesados "tab_consultas".
+    
+    Regresa:
+    --------
+    None
+        El archivo de Excel se guarda en la carpeta de salida.
+    """
+    from openpyxl import Workbook
+
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados', 'tab_consultas')
+    agrupaciones = agrupaciones if agrupaciones else AGRUPACIONES
+
+    wb = Workbook(write_only=True)
+    registrar_estilos(wb)
+    indice_hoja = wb.create_sheet(title="Indice")
+
+    if isinstance(tabulados, dict):
+        valores = tabulados.values()
+    else:
+        valores = (extraer_datos_y_atributos(df) for df in tabulados)
+
+    titulo_indice = None
+    subtitulos = []
+    hojas = {}
+    for num_tabla, value in enumerate(valores, start=1):
+        nombre_hoja = f"Tabla {num_tabla}"
+        escribir_tabla_continua(wb, nombre_hoja, value)
+        subtitulos.append((nombre_hoja, value['subtitulo'], value.get('modulo', '')))
+        hojas[nombre_hoja] = entrada_manifiesto(value)
+        if titulo_indice is None:
+            titulo_indice = value['titulo']
+
+    # el índice se escribe al final, aunque la hoja es la primera del libro
+    escribir_indice_continuo(indice_hoja, titulo_indice, disponer_indice(subtitulos, agrupaciones))
+
+    ruta_completa = os.path.join(ruta, titulo_salida + '.xlsx')
+    wb.save(ruta_completa)
+    guardar_manifiesto(ruta_completa, hojas, agrupaciones)
+
+    return None
+
+# --------------------------- # Función para actualizar un reporte existente # --------------------------- #
+def actualizar_reporte(tabulados, titulo_salida, agrupaciones=None, ruta=None):
+    """
+    Reemplaza o agrega hojas "Tabla N" en un reporte ya generado, sin volver a escribir ni estilizar las demás.
+
+    Con el manifiesto del reporte (ver "guardar_manifiesto") se omiten los tabulados cuyo contenido no cambió. 
+    El índice se vuelve a generar, a partir del manifiesto y sin leer las hojas, sólo si se agregaron hojas o 
+    cambió algún subtítulo, el título o las agrupaciones. Si el reporte no tiene manifiesto (reportes anteriores), 
+    se escriben todos los tabulados indicados y el manifiesto se crea a partir de los títulos de las hojas.
+
+    Parámetros:
+    -----------
+    tabulados: dict
+        Diccionario {hoja: DataFrameAnid}, donde la hoja es el número de la tabla (por ejemplo 3 para "Tabla 3")
+        o el nombre de la hoja. También se aceptan los valores de "generar_diccionario_maestro".
+    titulo_salida: str
+        Nombre del archivo a actualizar (sin extensión).
+    agrupaciones: dict, opcional
+        Diccionario con las agrupaciones del índice. Por defecto se usa AGRUPACIONES.
+    ruta: str, opcional
+        Carpeta del reporte. Por defecto es la carpeta de datos procesados "tab_consultas".
+    
+    Regresa:
+    --------
+    list
+        Lista con los nombres de las hojas que se escribieron.
+    """
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados', 'tab_consultas')
+    agrupaciones = agrupaciones if agrupaciones else AGRUPACIONES
+    ruta_completa = os.path.join(ruta, titulo_salida + '.xlsx')
+
+    if not os.path.exists(ruta_completa):
+        raise AssertionError("No existe el reporte '"+ruta_completa+"', es necesario generarlo con 'generar_reporte_estilizado'")
+
+    manifiesto = leer_manifiesto(ruta_completa)
+    hojas_previas = manifiesto['hojas'] if manifiesto else {}
+
+    # tabulados que cambiaron
+    pendientes = {}
+    for hoja, df in tabulados.items():
+        nombre_hoja = f"Tabla {hoja}" if isinstance(hoja, (int, np.integer)) else hoja
+        value = df if isinstance(df, dict) else extraer_datos_y_atributos(df)
+        entrada = entrada_manifiesto(value)
+        if hojas_previas.get(nombre_hoja, {}).get('huella') != entrada['huella']:
+            pendientes[nombre_hoja] = (value, entrada)
+
+    if not pendientes:
+        print("El reporte '"+titulo_salida+"' no tiene cambios")
+        return []
+
+    with pd.ExcelWriter(ruta_completa, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
+
+        wb = writer.book
+
+        # entrada de una hoja a partir de sus títulos (hojas que no están en el manifiesto)
+        entrada_hoja = lambda nombre_hoja: {'huella': None, 'titulo': wb[nombre_hoja]["A1"].value, 'subtitulo': wb[nombre_hoja]["A2"].value, 'modulo': ''}
+
+        # reportes sin manifiesto: se toman los títulos de las hojas una sola vez
+        if manifiesto is None:
+            hojas_previas = {nombre_hoja: entrada_hoja(nombre_hoja) for nombre_hoja in wb.sheetnames if nombre_hoja != "Indice"}
+
+        for nombre_hoja, (value, entrada) in pendientes.items():
+            escribir_tabla(writer, nombre_hoja, value)
+
+        # las hojas agregadas sin actualizar el manifiesto (a mano o con "generar_reporte") se leen de sus títulos
+        hojas = {}
+        for nombre_hoja in wb.sheetnames:
+            if nombre_hoja in pendientes:
+                hojas[nombre_hoja] = pendientes[nombre_hoja][1]
+            elif nombre_hoja in hojas_previas:
+                hojas[nombre_hoja] = hojas_previas[nombre_hoja]
+            elif nombre_hoja != "Indice":
+                hojas[nombre_hoja] = entrada_hoja(nombre_hoja)
+
+        # el índice sólo se rehace si cambia su contenido
+        contenido = lambda h: [(n, e['titulo'], e['subtitulo'], e.get('modulo', '')) for n, e in h.items()]
+        if (manifiesto is None or contenido(hojas) != contenido(hojas_previas) 
+                or manifiesto['agrupaciones'] != huella_agrupaciones(agrupaciones)):
+            if "Indice" in wb.sheetnames:
+                del wb["Indice"]
+            wb.create_sheet(title="Indice", index=0)
+
+            subtitulos, titulo = subtitulos_manifiesto(hojas)
+            indice = IndiceAgrupaciones(titulo_salida + '.xlsx', agrupaciones, wb=wb)
+            indice.generar_indice(guardar=False, subtitulos=subtitulos, titulo=titulo)
+
+    guardar_manifiesto(ruta_completa, hojas, agrupaciones)
+
+    return list(pendientes)
+
 # --------------------------- # Función para dar formato de la salida csv a xlsx (Consulta) # --------------------------- #
 def esquema_xlsx_consulta(d, cols_idx, cols_datos, i_sin_nombre=0, nombres_nuevos=None, redondeo=2):
     """
@@ -678,7 +1537,97 @@ def esquema_xlsx_consulta(d, cols_idx, cols_datos, i_sin_nombre=0, nombres_nuevo
 
 # --------------------------- # Función para dar formato de la salida csv a csv/xlsx (Gema) # --------------------------- #
 
-def esquema_csv_xlsx_gema(d):
+# claves de las columnas de las capas de Gema
+MAPEO_SEXO_GEMA = {
+    'Mujeres y hombres': 't',
+    'Hombres': 'h',
+    'Mujeres': 'm'
+}
+
+MAPEO_GRUPO_ETARIO_GEMA = {
+    'Población de 12-75 años': '12_75',
+    '12-17 años': '12_17',
+    '18-75 años': '18_75',
+}
+
+# columnas que identifican cada nivel de desagregación (en orden de prioridad); sin ellas la capa es nacional
+NIVELES_GEMA = [['clave_entidad_dai', 'entidad'], ['nom_region'], ['estrato_tx']]
+
+def llaves_gema(d):
+    """
+    Regresa las columnas que identifican el nivel de desagregación de los datos (ver NIVELES_GEMA).
+    Regresa una lista vacía para la desagregación nacional.
+    """
+    for llaves in NIVELES_GEMA:
+        if llaves[0] in d.columns:
+            return llaves
+    return []
+
+def claves_columnas_gema(d):
+    """
+    Construye la clave de columna "{sexo}_{grupo_etario}" de cada fila (por ejemplo "h_12_17").
+
+    Las etiquetas se convierten una sola vez por valor distinto. El sexo que no está en MAPEO_SEXO_GEMA 
+    toma su primera letra en minúscula; el grupo de edad que no está en MAPEO_GRUPO_ETARIO_GEMA genera un KeyError.
+
+    Parámetros:
+    -----------
+    d: DataFrame
+        DataFrame con las columnas "sexo" y "grupo_etario".
+
+    Regresa:
+    --------
+    ndarray
+        Arreglo con la clave de columna de cada fila.
+    """
+    cod_sexo, sexos = pd.factorize(d['sexo'], use_na_sentinel=False)
+    cod_grupo, grupos = pd.factorize(d['grupo_etario'], use_na_sentinel=False)
+
+    claves_sexo = np.array([MAPEO_SEXO_GEMA.get(sexo, sexo[0].lower()) + '_' for sexo in sexos], dtype=object)
+    claves_grupo = np.array([MAPEO_GRUPO_ETARIO_GEMA[grupo] for grupo in grupos], dtype=object)
+
+    return claves_sexo[cod_sexo] + claves_grupo[cod_grupo]
+
+def capa_gema(d, llaves, columnas, var_valor='estimacion'):
+    """
+    Construye una capa de Gema en formato ancho con un solo pivote.
+
+    Parámetros:
+    -----------
+    d: DataFrame
+        DataFrame con los datos a transformar.
+    llaves: list
+        columnas que identifican cada fila de la capa (vacía para la desagregación nacional).
+    columnas: array
+        clave de la columna de cada fila de "d".
+    var_valor: str
+        columna con el valor de cada celda.
+
+    Regresa:
+    --------
+    DataFrame
+        Capa con una fila por combinación de "llaves" (ordenadas) y el identificador "g_id".
+    """
+    largo = d[llaves + [var_valor]].assign(columna=columnas).dropna(subset=llaves)
+
+    # las filas se ordenan por las llaves (de forma estable) y las columnas conservan el orden de aparición
+    if llaves:
+        largo = largo.sort_values(llaves, kind='stable')
+    orden_columnas = pd.unique(largo['columna'])
+
+    largo = largo.drop_duplicates(llaves + ['columna'], keep='last')
+    if llaves:
+        ancho = largo.pivot(index=llaves, columns='columna', values=var_valor).reindex(columns=orden_columnas)
+        ancho.columns.name = None
+        ancho = ancho.reset_index()
+    else:
+        ancho = pd.DataFrame([largo.set_index('columna')[var_valor].rename_axis(None).reindex(orden_columnas)]).reset_index(drop=True)
+
+    ancho.insert(0, 'g_id', np.arange(1, len(ancho) + 1))
+
+    return ancho
+
+def esquema_csv_xlsx_gema(d, llaves=None, var_valor='estimacion'):
     """
     Genera la estructura necesaria para generar capas en Gema.
 
@@ -686,79 +1635,293 @@ def esquema_csv_xlsx_gema(d):
     -----------
     d: DataFrame
         DataFrame con los datos a transformar.
+    llaves: list, opcional
+        columnas que identifican la desagregación. Por defecto se detectan con NIVELES_GEMA 
+        (estatal, regional, por estrato o nacional).
+    var_valor: str
+        columna con el valor de cada celda. Por defecto es "estimacion".
     
     Regresa:
     --------
     DataFrame
         DataFrame con los datos transformados.
     """
+    llaves = llaves_gema(d) if llaves is None else list(llaves)
+    capa = capa_gema(d, llaves, claves_columnas_gema(d), var_valor)
 
-    mapeo_sexo = {
-        'Mujeres y hombres': 't',
-        'Hombres': 'h',
-        'Mujeres': 'm'
-    }
+    # la capa nacional conserva "g_id" como columna
+    return capa.set_index(['g_id'] + llaves) if llaves else capa
 
-    mapeo_grupo_etario = {
-        'Población de 12-75 años': '12_75',
-        '12-17 años': '12_17',
-        '18-75 años': '18_75',
-    }
+def esquema_gema_lote(indicadores, llaves=None, var_valor='estimacion'):
+    """
+    Genera una sola capa de Gema con varios indicadores, con un solo pivote para todos.
+
+    Las columnas de cada indicador se nombran "{indicador}_{sexo}_{grupo_etario}".
+
+    Parámetros:
+    -----------
+    indicadores: dict
+        diccionario {nombre del indicador: DataFrame con los datos}; todos con la misma desagregación.
+    llaves: list, opcional
+        columnas que identifican la desagregación. Por defecto se detectan en el primer indicador.
+    var_valor: str
+        columna con el valor de cada celda. Por defecto es "estimacion".
+
+    Regresa:
+    --------
+    DataFrame
+        Capa con los indicadores en formato ancho.
+    """
+    primero = next(iter(indicadores.values()))
+    llaves = llaves_gema(primero) if llaves is None else list(llaves)
 
-    datos_transformados = []
+    for nombre, d in indicadores.items():
+        faltantes = [llave for llave in llaves if llave not in d.columns]
+        if faltantes:
+            raise AssertionError("Al indicador '"+str(nombre)+"' le faltan las columnas de desagregación "+str(faltantes))
 
-    # para casos de desagregación "estatal"
-    if 'clave_entidad_dai' in d.columns:
-        g_id = 1
+    datos = pd.concat([d[llaves + ['sexo', 'grupo_etario', var_valor]] for d in indicadores.values()], ignore_index=True)
+    prefijos = np.repeat(np.array([str(nombre) + '_' for nombre in indicadores], dtype=object),
+                         [len(d) for d in indicadores.values()])
+    capa = capa_gema(datos, llaves, prefijos + claves_columnas_gema(datos), var_valor)
 
-        for (cve, nom), grupo in d.groupby(['clave_entidad_dai', 'entidad']):
-            fila = {'g_id': g_id, 'clave_entidad_dai': cve, 'entidad': nom}
-            for _, row in grupo.iterrows():
-                encabezado = f"{mapeo_sexo.get(row['sexo'], row['sexo'][0].lower())}_{mapeo_grupo_etario[row['grupo_etario']]}"
-                fila[encabezado] = row['estimacion']
-            datos_transformados.append(fila)
-            g_id += 1
+    return capa.set_index(['g_id'] + llaves) if llaves else capa
 
-        datos_transformados_df = pd.DataFrame(datos_transformados).set_index(['g_id','clave_entidad_dai', 'entidad'])
+def exportar_gema(indicadores, titulo_salida, formato='csv', llaves=None, var_valor='estimacion', ruta=None):
+    """
+    Exporta varios indicadores a un solo archivo de capa de Gema (ver "esquema_gema_lote").
 
-    # para casos de desagregación "regional"
+    Parámetros:
+    -----------
+    indicadores: dict
+        diccionario {nombre del indicador: DataFrame con los datos}; todos con la misma desagregación.
+    titulo_salida: str
+        Nombre del archivo de salida (sin extensión).
+    formato: str
+        'csv' o 'xlsx'. Por defecto es 'csv'.
+    llaves: list, opcional
+        columnas que identifican la desagregación. Por defecto se detectan en el primer indicador.
+    var_valor: str
+        columna con el valor de cada celda. Por defecto es "estimacion".
+    ruta: str, opcional
+        Carpeta de salida. Por defecto es la carpeta de datos procesados.
 
-    elif 'nom_region' in d.columns:
-        g_id = 1
+    Regresa:
+    --------
+    DataFrame
+        Capa exportada.
+    """
+    if formato not in ['csv', 'xlsx']:
+        raise AssertionError("El formato debe ser 'csv' o 'xlsx'")
 
-        for reg, grupo in d.groupby('nom_region'):
-            fila = {'g_id': g_id, 'nom_region': reg}
-            for _, row in grupo.iterrows():
-                encabezado = f"{mapeo_sexo.get(row['sexo'], row['sexo'][0].lower())}_{mapeo_grupo_etario[row['grupo_etario']]}"
-                fila[encabezado] = row['estimacion']
-            datos_transformados.append(fila)
-            g_id += 1
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados')
+    capa = esquema_gema_lote(indicadores, llaves, var_valor)
+    archivo = os.path.join(ruta, titulo_salida + '.' + formato)
+    con_indice = capa.index.nlevels > 1
 
-        datos_transformados_df = pd.DataFrame(datos_transformados).set_index(['g_id','nom_region'])
+    if formato == 'csv':
+        capa.to_csv(archivo, index=con_indice)
+    else:
+        capa.to_excel(archivo, index=con_indice)
 
-    # para casos de desagregación por "estrato"
+    return capa
 
-    elif 'estrato_tx' in d.columns:
-        g_id = 1
+# --------------------------- # Funciones para guardar los tabulados en formato columnar (Parquet) # --------------------------- #
 
-        for sto, grupo in d.groupby('estrato_tx'):
-            fila = {'g_id': g_id, 'estrato_tx': sto}
-            for _, row in grupo.iterrows():
-                encabezado = f"{mapeo_sexo.get(row['sexo'], row['sexo'][0].lower())}_{mapeo_grupo_etario[row['grupo_etario']]}"
-                fila[encabezado] = row['estimacion']
-            datos_transformados.append(fila)
-            g_id += 1
+# columnas que identifican cada nivel de desagregación de los tabulados; sin ellas el nivel es nacional
+NIVELES_TABULADOS = {
+    'estatal': ['cve_ent', 'nom_ent', 'clave_entidad_dai', 'entidad'],
+    'regional': ['nom_region'],
+    'estrato': ['estrato_tx']
+}
 
-        datos_transformados_df = pd.DataFrame(datos_transformados).set_index(['g_id','estrato_tx'])
+def nivel_desagregacion(d):
+    """
+    Regresa el nivel de desagregación de un tabulado ('nacional', 'estatal', 'regional' o 'estrato') 
+    de acuerdo con sus columnas (ver NIVELES_TABULADOS).
+    """
+    for nivel, columnas in NIVELES_TABULADOS.items():
+        if any(columna in d.columns for columna in columnas):
+            return nivel
+    return 'nacional'
 
-    # para casos de desagregación "nacional"
-    else:
-        datos_transformados = {'g_id': 1}
-        
-        for idx, row in d.iterrows():
-            encabezado = f"{mapeo_sexo.get(row['sexo'], row['sexo'][0].lower())}_{mapeo_grupo_etario[row['grupo_etario']]}"
-            datos_transformados[encabezado] = row['estimacion']
+def tabla_arrow(d):
+    """
+    Convierte un tabulado en una tabla de Arrow con tipos explícitos: las columnas numéricas conservan 
+    su tipo y las demás (etiquetas) se guardan como texto.
+    """
+    import pyarrow as pa
+
+    d = d.reset_index(drop=True)
+    campos = []
+    for columna, tipo in d.dtypes.items():
+        if pd.api.types.is_bool_dtype(tipo) or pd.api.types.is_numeric_dtype(tipo):
+            # los tipos de extensión de pandas (Int64, Float64, boolean) no son tipos de numpy, su tipo lo infiere Arrow
+            tipo_arrow = pa.from_numpy_dtype(tipo) if isinstance(tipo, np.dtype) else pa.Array.from_pandas(d[columna]).type
+            campos.append(pa.field(str(columna), tipo_arrow))
+        else:
+            d[columna] = d[columna].astype('string')
+            campos.append(pa.field(str(columna), pa.string()))
+
+    return pa.Table.from_pandas(d, schema=pa.schema(campos), preserve_index=False)
+
+def guardar_tabulados_parquet(tabulados, edicion, ruta=None, max_hilos=4):
+    """
+    Guarda los tabulados en un conjunto de datos Parquet particionado por indicador, nivel de desagregación 
+    y edición ("indicador=.../nivel=.../edicion=.../parte-0.parquet"). 
+
+    Cada partición se escribe en un hilo de "max_hilos"; al guardar de nuevo un indicador se reemplaza 
+    sólo su partición. Los tabulados se leen con "leer_tabulados_parquet".
+
+    Parámetros:
+    -----------
+    tabulados: dict
+        diccionario {indicador: DataFrame} o {(indicador, nivel): DataFrame}, por ejemplo la salida de 
+        "tabulados_prevalencias". Si no se indica el nivel, se obtiene con "nivel_desagregacion".
+    edicion: str
+        edición de la encuesta, por ejemplo '2016-2017'.
+    ruta: str, opcional
+        Carpeta del conjunto de datos. Por defecto es "tabulados" en la carpeta de datos procesados.
+    max_hilos: int
+        número máximo de hilos de escritura.
+
+    Regresa:
+    --------
+    list
+        Lista con las rutas de los archivos escritos.
+    """
+    import pyarrow.parquet as pq
+
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados', 'tabulados')
+
+    particiones = []
+    for llave, d in tabulados.items():
+        indicador, nivel = llave if isinstance(llave, tuple) else (llave, nivel_desagregacion(d))
+        for valor in [indicador, nivel, edicion]:
+            if '/' in str(valor) or '=' in str(valor) or os.sep in str(valor):
+                raise AssertionError("El valor de partición '"+str(valor)+"' no puede contener '/' ni '='")
+        carpeta = os.path.join(ruta, f"indicador={indicador}", f"nivel={nivel}", f"edicion={edicion}")
+        particiones.append((carpeta, d))
+
+    def escribir(particion):
+        carpeta, d = particion
+        os.makedirs(carpeta, exist_ok=True)
+        for a in os.listdir(carpeta):
+            if a.endswith('.parquet'):
+                os.remove(os.path.join(carpeta, a))
+        archivo = os.path.join(carpeta, 'parte-0.parquet')
+        pq.write_table(tabla_arrow(d), archivo)
+        return archivo
+
+    with ThreadPoolExecutor(max_workers=max_hilos) as ejecutor:
+        archivos = list(ejecutor.map(escribir, particiones))
+
+    return archivos
+
+def esquema_comun(esquemas):
+    """
+    Une los esquemas de los archivos de varios tabulados. Una columna con tipos numéricos distintos en los 
+    archivos (por ejemplo, int64 y double) toma el tipo más amplio; si alguno de sus tipos no es numérico 
+    (por ejemplo, "cve_ent" como número en un tabulado y como texto en otro que incluye 'NAC') se lee como texto.
+    """
+    import pyarrow as pa
+
+    numerico = lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_null(t)
+
+    tipos = {}
+    for esquema in esquemas:
+        for campo in esquema:
+            tipos.setdefault(campo.name, set()).add(campo.type)
+    texto = {nombre for nombre, t in tipos.items() if len(t) > 1 and not all(numerico(x) for x in t)}
+
+    esquemas = [pa.schema([pa.field(c.name, pa.string()) if c.name in texto else c for c in esquema]) for esquema in esquemas]
+    return pa.unify_schemas(esquemas, promote_options='permissive')
+
+def leer_tabulados_parquet(ruta=None, indicador=None, nivel=None, edicion=None, filtros=None, columnas=None):
+    """
+    Lee los tabulados guardados con "guardar_tabulados_parquet". 
+
+    Los filtros de partición (indicador, nivel y edición) sólo abren los archivos necesarios y "filtros" se aplica 
+    al leer (por ejemplo, sólo una entidad). Las columnas se limitan a las de los archivos seleccionados y
+    sus tipos se unen con "esquema_comun".
 
-        datos_transformados_df = pd.DataFrame([datos_transformados])
+    Parámetros:
+    -----------
+    ruta: str, opcional
+        Carpeta del conjunto de datos. Por defecto es "tabulados" en la carpeta de datos procesados.
+    indicador, nivel, edicion: str o list, opcional
+        valor o lista de valores de cada partición.
+    filtros: list, opcional
+        filtros adicionales en formato de pyarrow, por ejemplo [('cve_ent', '==', 9)].
+    columnas: list, opcional
+        columnas a leer. Por defecto todas.
+
+    Regresa:
+    --------
+    DataFrame
+        Tabulados con las columnas "indicador", "nivel" y "edicion".
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    ruta = ruta if ruta else os.path.join('..', 'datos', 'procesados', 'tabulados')
+    particion = ds.partitioning(pa.schema([('indicador', pa.string()), ('nivel', pa.string()), ('edicion', pa.string())]), flavor='hive')
+    datos = ds.dataset(ruta, format='parquet', partitioning=particion)
+
+    expresion = None
+    for campo, valor in [('indicador', indicador), ('nivel', nivel), ('edicion', edicion)]:
+        if valor is None:
+            continue
+        condicion = ds.field(campo).isin(valor) if isinstance(valor, (list, tuple)) else ds.field(campo) == valor
+        expresion = condicion if expresion is None else expresion & condicion
+
+    # esquema común de los archivos seleccionados (cada nivel tiene sus propias columnas)
+    fragmentos = list(datos.get_fragments(filter=expresion))
+    if not fragmentos:
+        return pd.DataFrame(columns=['indicador', 'nivel', 'edicion'])
+    esquema = esquema_comun([f.physical_schema for f in fragmentos] + [particion.schema])
+    datos = ds.dataset([f.path for f in fragmentos], schema=esquema, format='parquet', partitioning=particion, 
+                       partition_base_dir=ruta)
+
+    if filtros:
+        condicion = pq.filters_to_expression(filtros)
+        expresion = condicion if expresion is None else expresion & condicion
+
+    return datos.to_table(columns=columnas, filter=expresion).to_pandas()
+
+def exportar_tabulados_parquet(titulo_salida, formato='csv', ruta=None, ruta_salida=None, **seleccion):
+    """
+    Exporta a csv o xlsx una selección del conjunto de datos Parquet (ver "leer_tabulados_parquet").
+
+    Parámetros:
+    -----------
+    titulo_salida: str
+        Nombre del archivo de salida (sin extensión).
+    formato: str
+        'csv' o 'xlsx'. Por defecto es 'csv'.
+    ruta: str, opcional
+        Carpeta del conjunto de datos Parquet.
+    ruta_salida: str, opcional
+        Carpeta de salida. Por defecto es la carpeta de datos procesados.
+    **seleccion: dict
+        argumentos de "leer_tabulados_parquet" (indicador, nivel, edicion, filtros, columnas).
+
+    Regresa:
+    --------
+    DataFrame
+        Tabulados exportados.
+    """
+    if formato not in ['csv', 'xlsx']:
+        raise AssertionError("El formato debe ser 'csv' o 'xlsx'")
+
+    ruta_salida = ruta_salida if ruta_salida else os.path.join('..', 'datos', 'procesados')
+    d = leer_tabulados_parquet(ruta, **seleccion)
+    archivo = os.path.join(ruta_salida, titulo_salida + '.' + formato)
+
+    if formato == 'csv':
+        d.to_csv(archivo, index=False)
+    else:
+        d.to_excel(archivo, index=False)
 
-    return datos_transformados_df
\ No newline at end of file
+    return d
\ No newline at end of file
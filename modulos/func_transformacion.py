@@ -9,6 +9,7 @@ import numpy as np
 import pandas as pd
 import warnings
 import json
+import zlib
 warnings.filterwarnings('ignore')
 
 # ---- # ---- #  FUNCIONES PARA LIMPIEZA Y ESTRUCTURACIÓN DE DATOS  # ---- # ---- #   
@@ -175,4 +176,363 @@ def grupo_etario(b, var_edad, gps=['12-17', '18-34', '35-59', '60-75'], nom_ge='
     etiquetas=[g+' años' for g in gps]
     # dataframe de salida
     b.insert(len(b.columns),nom_ge,pd.cut(list(b['ci1']), bins=divisiones, labels=etiquetas))
-    return b
\ No newline at end of file
+    return b
+
+# ------------------ Función para generar claves ordenables a partir de identificadores ------------------ #
+def claves_enteras(*series):
+    """
+    Convierte una o más series de identificadores de texto en arreglos de NumPy ordenables.
+
+    Si todos los identificadores están formados sólo por dígitos, tienen el mismo número de caracteres 
+    y caben en un entero de 64 bits (hasta 18 dígitos) se convierten a enteros; al tener el mismo ancho, 
+    los ceros a la izquierda no hacen que dos identificadores distintos (por ejemplo '012' y '12') 
+    compartan clave. En otro caso se convierten a cadenas de bytes de ancho fijo, que NumPy también 
+    puede ordenar y buscar de forma vectorizada. Los identificadores de la ENCODAT ("id_pers" e 
+    "id_hogar", de 20 caracteres) siempre usan las cadenas de bytes.
+    Todas las series se convierten con el mismo formato para que sus claves sean comparables.
+
+    Parámetros:
+    -----------
+    *series : Series
+        Series con los identificadores (por ejemplo "id_pers" o "id_hogar").
+
+    Regresa:
+    --------
+    list
+        Lista de arreglos de NumPy, uno por cada serie de entrada y en el mismo orden.
+    """
+    textos = [pd.Series(s).astype(str) for s in series]
+    ancho = max([int(s.str.len().max()) for s in textos if len(s)] + [1])
+
+    anchos = set().union(*[set(s.str.len().unique()) for s in textos])
+    if ancho <= 18 and len(anchos) <= 1 and all(s.str.isdigit().all() for s in textos):
+        return [s.astype(np.int64).to_numpy() for s in textos]
+
+    return [s.to_numpy(dtype=f'S{ancho}') for s in textos]
+
+# ------------------ Función para vincular el cuestionario individual con el de hogares ------------------ #
+def vincular_hogares(bb, h, cols_hogar, var_pers='id_pers', var_hogar='id_hogar', long_hogar=20, permitir_huerfanos=True):
+    """
+    Agrega a cada persona las variables de su hogar (estrato, upm, etc.) mediante un índice ordenado de hogares.
+
+    El identificador del hogar de cada persona son los primeros "long_hogar" caracteres de "var_pers".
+    Los identificadores se convierten una sola vez a claves ordenables (ver "claves_enteras"), se ordena 
+    el índice de hogares y la posición del hogar de cada persona se obtiene con una búsqueda binaria 
+    vectorizada. Las variables del hogar se copian a las personas por posición, sin hacer un "merge" 
+    sobre cadenas de caracteres.
+
+    El resultado es equivalente a:
+        bb.insert(0, var_hogar, bb[var_pers].str[:long_hogar])
+        bb.merge(h[[var_hogar] + cols_hogar], on=var_hogar, how='left')
+
+    Parámetros:
+    -----------
+    bb : DataFrame
+        Conjunto de datos del cuestionario individual.
+    h : DataFrame
+        Conjunto de datos del cuestionario de hogares.
+    cols_hogar : list
+        Lista con las variables del hogar que se agregarán a cada persona.
+    var_pers : str
+        Nombre de la variable con el identificador de la persona.
+        El valor predeterminado es "id_pers".
+    var_hogar : str
+        Nombre de la variable con el identificador del hogar.
+        El valor predeterminado es "id_hogar".
+    long_hogar : int
+        Número de caracteres de "var_pers" que identifican al hogar.
+        El valor predeterminado es 20.
+    permitir_huerfanos : bool
+        Si es True, las personas sin hogar en "h" se conservan con valores nulos en "cols_hogar".
+        Si es False, se genera un error cuando existen personas sin hogar.
+        El valor predeterminado es True.
+
+    Regresa:
+    --------
+    DataFrame
+        Conjunto de datos "bb" con la variable "var_hogar" al inicio y las variables "cols_hogar" al final,
+        con un índice nuevo (0, 1, ..., n-1) como el que regresa el "merge".
+    """
+    # criterio para revisar que no se dupliquen variables al unir las bases
+    repetidas = set(cols_hogar).intersection(set(bb.columns).union({var_hogar}))
+    if repetidas != set({}):
+        raise AssertionError("Las variables ya existen en el cuestionario individual: "+str(repetidas).replace('{','').replace('}',''))
+
+    # criterio para revisar que no haya personas duplicadas
+    if bb[var_pers].duplicated().any():
+        raise AssertionError("Existen "+str(bb[var_pers].duplicated().sum())+" identificadores de persona duplicados en '"+var_pers+"'")
+
+    id_hogar_pers = bb[var_pers].astype(str).str[:long_hogar]
+    k_pers, k_hog = claves_enteras(id_hogar_pers, h[var_hogar])
+
+    # índice ordenado de hogares
+    orden = np.argsort(k_hog, kind='stable')
+    k_ord = k_hog[orden]
+
+    # criterio para revisar que no haya hogares duplicados (duplicarían a las personas al unir)
+    duplicados = k_ord[1:] == k_ord[:-1]
+    if duplicados.any():
+        raise AssertionError("Existen "+str(int(duplicados.sum()))+" identificadores de hogar duplicados en '"+var_hogar+"'")
+
+    # posición del hogar de cada persona
+    if len(k_ord) > 0:
+        pos = np.minimum(np.searchsorted(k_ord, k_pers), len(k_ord) - 1)
+        encontrados = k_ord[pos] == k_pers
+    else:
+        pos = np.zeros(len(k_pers), dtype=np.int64)
+        encontrados = np.zeros(len(k_pers), dtype=bool)
+    filas = orden[pos]
+
+    # criterio para revisar las personas sin hogar
+    num_huerfanos = int((~encontrados).sum())
+    if num_huerfanos > 0:
+        if not permitir_huerfanos:
+            raise AssertionError("Existen "+str(num_huerfanos)+" personas sin hogar en el cuestionario de hogares")
+        print(str(num_huerfanos)+" personas no tienen hogar en el cuestionario de hogares, sus variables de hogar quedan vacías.")
+
+    # dataframe de salida
+    b = bb.copy()
+    b.insert(0, var_hogar, id_hogar_pers)
+    for c in cols_hogar:
+        if len(k_ord) > 0:
+            v = h[c].iloc[filas].set_axis(b.index)
+        else:
+            v = pd.Series(np.nan, index=b.index)
+        b[c] = v if num_huerfanos == 0 else v.where(encontrados)
+
+    # como en el "merge", el resultado tiene un índice nuevo
+    return b.reset_index(drop=True)
+
+# ---- # ---- #  FUNCIONES PARA IMPUTACIÓN DE DATOS FALTANTES  # ---- # ---- #
+
+# ------------------ Clase para imputar respuestas faltantes con hot-deck ponderado ------------------ #
+class ImputacionHotDeck:
+    """
+    Imputación de las respuestas faltantes mediante hot-deck aleatorio ponderado dentro de clases de imputación.
+
+    A cada registro con respuesta faltante (receptor) se le asigna la respuesta de un donante de su misma clase,
+    elegido con probabilidad proporcional a su factor de expansión. Si la clase del receptor tiene menos de
+    "min_donantes" donantes, se usa la clase formada sin la última variable de "var_clases" (por ejemplo,
+    estrato y sexo en lugar de estrato, sexo y grupo etario), hasta llegar a toda la muestra.
+
+    Los donantes se eligen de forma vectorizada: los registros se ordenan una sola vez por clase, el factor
+    acumulado de los donantes de cada clase se busca con np.searchsorted y todas las imputaciones se obtienen
+    en una sola búsqueda. Cada imputación se guarda como un arreglo compacto con la posición del donante de cada
+    receptor, de modo que las imputaciones múltiples no repiten la base.
+
+    Parámetros:
+    ------------
+    var_clases: list
+        Variables que definen las clases de imputación, de la más a la menos importante.
+        El valor predeterminado es ['estrato', 'sexo', 'grupo_etario'].
+    ponderador: str
+        Nombre de la variable con el factor de expansión. El valor predeterminado es 'factor_exp'.
+    nulos: list
+        Valores que indican una respuesta faltante (además de los nulos). El valor predeterminado es [' '].
+    min_donantes: int
+        Número mínimo de donantes de una clase para usarla. El valor predeterminado es 5.
+    num_imputaciones: int
+        Número de imputaciones (imputación múltiple). El valor predeterminado es 1.
+    semilla: int
+        Semilla de los números aleatorios. Cada variable usa una semilla derivada de ésta y de su nombre, por lo
+        que su imputación no depende de las demás variables. El valor predeterminado es 0.
+    """
+    def __init__(self, var_clases=['estrato', 'sexo', 'grupo_etario'], ponderador='factor_exp', nulos=[' '], min_donantes=5, num_imputaciones=1, semilla=0):
+        self.var_clases = list(var_clases)
+        self.ponderador = ponderador
+        self.nulos = list(nulos)
+        self.min_donantes = min_donantes
+        self.num_imputaciones = num_imputaciones
+        self.semilla = semilla
+        self.num_registros = None
+        self.imputaciones = {}
+
+    def niveles(self, b):
+        """
+        Regresa los códigos de clase de cada nivel (de la clase más fina a toda la muestra) y el orden de los registros por clase.
+        """
+        niveles = []
+        for k in range(len(self.var_clases), -1, -1):
+            if k > 0:
+                cod = b.groupby(self.var_clases[:k], sort=False, dropna=False).ngroup().to_numpy()
+            else:
+                cod = np.zeros(len(b), dtype=np.int64)
+            niveles.append((cod, np.argsort(cod, kind='stable')))
+        return niveles
+
+    def faltantes(self, b, v):
+        """
+        Regresa el arreglo booleano con los registros en los que falta la respuesta a "v".
+        """
+        return (b[v].isna() | b[v].isin(self.nulos)).to_numpy()
+
+    def ajustar(self, b, variables, elegibles={}):
+        """
+        Elige los donantes de cada receptor para las variables de "variables".
+
+        Parámetros:
+        ------------
+        b: DataFrame
+            Conjunto de datos.
+        variables: list
+            Lista con las variables que se imputan.
+        elegibles: dict
+            Diccionario {variable: arreglo booleano} con los registros que debían responder cada variable. Las respuestas
+            faltantes fuera de ellos (por ejemplo, preguntas que no aplican por un pase) no se imputan y esos registros
+            no son donantes. El valor predeterminado es {}, todos los registros son elegibles.
+
+        Regresa:
+        ------------
+        ImputacionHotDeck
+            El mismo objeto, con las imputaciones en el atributo "imputaciones".
+        """
+        w = b[self.ponderador].to_numpy(dtype=np.float64)
+        niveles = self.niveles(b)
+        self.num_registros = len(b)
+
+        for v in variables:
+            falta = self.faltantes(b, v)
+            elegible = np.ones(len(b), dtype=bool) if v not in elegibles else np.asarray(elegibles[v], dtype=bool)
+            receptores = np.flatnonzero(falta & elegible)
+            donante = ~falta & elegible
+            rng = np.random.default_rng([self.semilla, zlib.crc32(str(v).encode('utf-8'))])
+            u = rng.random((self.num_imputaciones, len(receptores)))
+
+            donantes = np.full((self.num_imputaciones, len(receptores)), -1, dtype=np.int32)
+            nivel = np.full(len(receptores), -1, dtype=np.int8)
+            pendientes = np.ones(len(receptores), dtype=bool)
+            for j, (cod, orden) in enumerate(niveles):
+                if not pendientes.any():
+                    break
+
+                # donantes ordenados por clase y su factor acumulado
+                pos = orden[donante[orden]]
+                cod_don = cod[pos]
+                num_clases = cod.max() + 1
+                n_c = np.bincount(cod_don, minlength=num_clases)
+                w_c = np.bincount(cod_don, weights=w[pos], minlength=num_clases)
+                fin = np.cumsum(n_c)
+                acumulado = np.cumsum(w[pos])
+                base = np.cumsum(w_c) - w_c
+
+                # receptores pendientes cuya clase tiene suficientes donantes (en el último nivel basta uno)
+                minimo = self.min_donantes if j < len(niveles) - 1 else 1
+                c = cod[receptores]
+                sel = pendientes & (n_c[c] >= minimo) & (w_c[c] > 0)
+                if not sel.any():
+                    continue
+                c = c[sel]
+
+                # búsqueda del donante de cada receptor en todas las imputaciones a la vez
+                objetivo = base[c] + u[:, sel] * w_c[c]
+                k = np.clip(np.searchsorted(acumulado, objetivo, side='right'), fin[c] - n_c[c], fin[c] - 1)
+                donantes[:, sel] = pos[k]
+                nivel[sel] = j
+                pendientes &= ~sel
+
+            if pendientes.any():
+                print("La variable '"+str(v)+"' no tiene donantes, "+str(int(pendientes.sum()))+" respuestas faltantes se quedan sin imputar.")
+            self.imputaciones[v] = {'receptores': receptores[~pendientes].astype(np.int32),
+                                    'donantes': donantes[:, ~pendientes],
+                                    'nivel': nivel[~pendientes]}
+
+        return self
+
+    def aplicar(self, b, m=0, indicadoras=False):
+        """
+        Regresa una copia de "b" con las respuestas de la imputación "m".
+
+        Parámetros:
+        ------------
+        b: DataFrame
+            Conjunto de datos con el que se ajustó la imputación.
+        m: int
+            Número de la imputación (de 0 a num_imputaciones-1). El valor predeterminado es 0.
+        indicadoras: bool
+            Si es True se agrega la variable "<variable>_imp" que vale 1 en las respuestas imputadas.
+            El valor predeterminado es False.
+
+        Regresa:
+        ------------
+        DataFrame
+            Conjunto de datos con las respuestas imputadas.
+        """
+        if len(b) != self.num_registros:
+            raise AssertionError("La base tiene "+str(len(b))+" registros y la imputación se ajustó con "+str(self.num_registros))
+        if not 0 <= m < self.num_imputaciones:
+            raise AssertionError("La imputación debe estar entre 0 y "+str(self.num_imputaciones - 1))
+
+        b = b.copy()
+        for v, imp in self.imputaciones.items():
+            valores = b[v].to_numpy(copy=True)
+            valores[imp['receptores']] = valores[imp['donantes'][m]]
+            b[v] = valores
+            if b[v].dtype == object and not b[v].isin(self.nulos).any():
+                b[v] = pd.to_numeric(b[v], errors='ignore')
+            if indicadoras:
+                ind = np.zeros(len(b), dtype=np.uint8)
+                ind[imp['receptores']] = 1
+                b[v + '_imp'] = ind
+
+        return b
+
+    def resumen(self):
+        """
+        Regresa una tabla con el número de respuestas imputadas de cada variable y el nivel de clase con el que se imputaron
+        (nivel 0 es la clase completa y el último nivel es toda la muestra).
+        """
+        filas = []
+        for v, imp in self.imputaciones.items():
+            fila = {'variable': v, 'imputadas': len(imp['receptores'])}
+            for j, n in enumerate(np.bincount(imp['nivel'], minlength=len(self.var_clases) + 1)):
+                fila['nivel_' + str(j)] = int(n)
+            filas.append(fila)
+        return pd.DataFrame(filas)
+
+    def guardar(self, ruta):
+        """
+        Guarda las imputaciones en un archivo .npz comprimido y los parámetros en un archivo .json con el mismo nombre.
+        """
+        arreglos = {}
+        for k, (v, imp) in enumerate(self.imputaciones.items()):
+            for nombre, a in imp.items():
+                arreglos[f'{k}__{nombre}'] = a
+        np.savez_compressed(ruta, **arreglos)
+
+        parametros = {'var_clases': self.var_clases, 'ponderador': self.ponderador, 'nulos': self.nulos,
+                      'min_donantes': self.min_donantes, 'num_imputaciones': self.num_imputaciones,
+                      'semilla': self.semilla, 'num_registros': self.num_registros, 'variables': list(self.imputaciones)}
+        with open(os.path.splitext(ruta)[0] + '.json', 'w') as fp:
+            json.dump(parametros, fp, indent=4, ensure_ascii=False)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """
+        Lee las imputaciones guardadas con "guardar".
+        """
+        with open(os.path.splitext(ruta)[0] + '.json') as fp:
+            parametros = json.load(fp)
+        variables = parametros.pop('variables')
+        num_registros = parametros.pop('num_registros')
+
+        imp = cls(**parametros)
+        imp.num_registros = num_registros
+        with np.load(os.path.splitext(ruta)[0] + '.npz') as a:
+            for k, v in enumerate(variables):
+                imp.imputaciones[v] = {nombre: a[f'{k}__{nombre}'] for nombre in ['receptores', 'donantes', 'nivel']}
+        return imp
+
+# ------------------ Función para imputar respuestas faltantes ------------------ #
+def imputar_hot_deck(b, variables, var_clases=['estrato', 'sexo', 'grupo_etario'], ponderador='factor_exp', nulos=[' '], elegibles={}, min_donantes=5, semilla=0, indicadoras=False):
+    """
+    Imputa las respuestas faltantes de "variables" con hot-deck aleatorio ponderado dentro de las clases de
+    "var_clases" (ver "ImputacionHotDeck"). Reemplaza a asignar un código fijo a las respuestas vacías
+    (por ejemplo b[v].replace(' ', 0)), que sesga las prevalencias.
+
+    Regresa:
+    --------
+    DataFrame
+        Copia del conjunto de datos "b" con las respuestas imputadas.
+    """
+    imp = ImputacionHotDeck(var_clases, ponderador, nulos, min_donantes, 1, semilla)
+    return imp.ajustar(b, variables, elegibles).aplicar(b, 0, indicadoras)
@@ -0,0 +1,477 @@
+'''
+Este archivo contiene las funciones para validar los datos de la encuesta antes de la estimación: claves de
+respuesta fuera del catálogo, respuestas vacías y respuestas que no respetan los pases del cuestionario
+(por ejemplo, preguntas "di" respondidas por personas que no debían contestarlas).
+
+Las reglas se leen de un libro de códigos (las claves permitidas de cada variable) y de un archivo de pases.
+Cada variable se recorre una sola vez (sus claves se revisan sobre sus valores distintos) y las variables
+se revisan en paralelo.
+
+También contiene el índice de claves de respuesta observadas, que se guarda junto a los datos limpios y con el
+que se revisan los diccionarios de reclasificación y las etiquetas sin recorrer los datos.
+'''
+import os
+import re
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+from modulos.func_analisis import revisar_codigos
+
+# valores que indican una respuesta vacía en los archivos originales
+NULOS = [' ', '']
+
+# - # - # - # - # - # ----------------- LIBRO DE CÓDIGOS Y PASES ----------------- # - # - # - # - # - #
+
+# ------------------ Clase con las claves permitidas de cada variable ------------------ #
+class LibroCodigos:
+    """
+    Libro de códigos: claves de respuesta permitidas y sus etiquetas para cada variable.
+
+    Se lee de un archivo (csv, xlsx o json) con una fila por clave y las columnas:
+        variable: nombre de la variable.
+        codigo: clave de respuesta, un intervalo "mínimo-máximo" (por ejemplo "12-65" para la edad)
+                o vacío si la respuesta vacía es válida (preguntas sin pase definido que se pueden omitir).
+        etiqueta: descripción de la clave (opcional).
+
+    Parámetros:
+    ------------
+    codigos: dict
+        Diccionario {variable: lista de claves permitidas}.
+    rangos: dict
+        Diccionario {variable: lista de intervalos (mínimo, máximo)}.
+    etiquetas: dict
+        Diccionario {variable: {clave: etiqueta}}.
+    blancos: set
+        Variables en las que la respuesta vacía es válida.
+    """
+    def __init__(self, codigos={}, rangos={}, etiquetas={}, blancos=set()):
+        self.codigos = {v: list(c) for v, c in codigos.items()}
+        self.rangos = {v: [tuple(r) for r in rr] for v, rr in rangos.items()}
+        self.etiquetas = {v: dict(e) for v, e in etiquetas.items()}
+        self.blancos = set(blancos)
+
+    @classmethod
+    def leer(cls, ruta=os.path.join('datos', 'auxiliares', 'libro_codigos.csv'), var_variable='variable', var_codigo='codigo', var_etiqueta='etiqueta', **opciones):
+        """
+        Lee el libro de códigos de "ruta". Las opciones adicionales se pasan a pd.read_csv o pd.read_excel
+        (por ejemplo sep=';' o sheet_name='Individual').
+        """
+        extension = os.path.splitext(ruta)[1].lower()
+        if extension in ('.xlsx', '.xls'):
+            t = pd.read_excel(ruta, dtype=str, **opciones)
+        elif extension == '.json':
+            t = pd.read_json(ruta, dtype=str, **opciones)
+        else:
+            t = pd.read_csv(ruta, dtype=str, keep_default_na=False, **opciones)
+
+        faltan = {var_variable, var_codigo}.difference(t.columns)
+        if faltan:
+            raise AssertionError("Al libro de códigos le faltan las columnas: "+str(faltan).replace('{','').replace('}',''))
+        if var_etiqueta not in t.columns:
+            t[var_etiqueta] = ''
+
+        codigos, rangos, etiquetas, blancos = {}, {}, {}, set()
+        for v, c, e in zip(t[var_variable].str.strip(), t[var_codigo].fillna('').str.strip(), t[var_etiqueta].fillna('')):
+            intervalo = re.fullmatch(r'(-?\d+(?:\.\d+)?)\s*-\s*(-?\d+(?:\.\d+)?)', c)
+            if c == '':
+                blancos.add(v)
+            elif intervalo:
+                rangos.setdefault(v, []).append((float(intervalo.group(1)), float(intervalo.group(2))))
+            else:
+                clave = clave_numerica(c)
+                codigos.setdefault(v, []).append(clave)
+                if e != '':
+                    etiquetas.setdefault(v, {})[clave] = e
+            codigos.setdefault(v, [])
+
+        return cls(codigos, rangos, etiquetas, blancos)
+
+    @property
+    def variables(self):
+        return list(self.codigos)
+
+    def etiqueta(self, var, clave):
+        """
+        Regresa la etiqueta de la clave de respuesta "clave" de la variable "var" (o la clave como texto si no tiene etiqueta).
+        """
+        return self.etiquetas.get(var, {}).get(clave, str(clave))
+
+    def permitidos(self, var, valores):
+        """
+        Indica cuáles de los "valores" (arreglo sin respuestas vacías) son claves permitidas de "var".
+        """
+        valores = pd.Series(valores)
+        numeros = pd.to_numeric(valores, errors='coerce').to_numpy(dtype=np.float64)
+        claves = self.codigos.get(var, [])
+        claves_num = np.array([c for c in claves if not isinstance(c, str)], dtype=np.float64)
+
+        validos = np.isin(numeros, claves_num)
+        for minimo, maximo in self.rangos.get(var, []):
+            validos |= (numeros >= minimo) & (numeros <= maximo)
+
+        # las claves de texto (por ejemplo "Sí") sólo se revisan en los valores que no son numéricos
+        claves_str = [c for c in claves if isinstance(c, str)]
+        texto = np.isnan(numeros)
+        if claves_str and texto.any():
+            validos[texto] = valores[texto].astype(str).str.strip().isin(claves_str).to_numpy()
+
+        return validos
+
+def clave_numerica(c):
+    """
+    Convierte la clave de texto "c" en entero (o flotante) cuando es numérica.
+    """
+    try:
+        x = float(c)
+    except ValueError:
+        return c
+    return int(x) if x.is_integer() else x
+
+# ------------------ Clase para definir un pase del cuestionario ------------------ #
+class ReglaPase:
+    """
+    Pase del cuestionario: las variables de "variables" sólo se responden si la variable "filtro" tiene alguna
+    de las claves de "codigos" (por ejemplo, las preguntas di1a a di1i sólo si di0 vale 1). Fuera del pase,
+    las respuestas deben estar vacías.
+
+    Parámetros:
+    ------------
+    variables: list o str
+        Lista con las variables que dependen del pase, o expresión regular con la que se eligen (por ejemplo '^di1[a-i]$').
+    filtro: str
+        Variable de la que depende el pase.
+    codigos: list
+        Claves de "filtro" con las que se deben responder las variables.
+    nombre: str
+        Nombre del pase. El valor predeterminado es None, se usa el nombre del filtro.
+    """
+    def __init__(self, variables, filtro, codigos, nombre=None):
+        self.variables = variables
+        self.filtro = filtro
+        self.codigos = list(codigos)
+        self.nombre = nombre or filtro
+
+    def seleccionar(self, columnas):
+        """
+        Regresa la lista de variables de "columnas" que dependen del pase.
+        """
+        if isinstance(self.variables, str):
+            return [c for c in columnas if re.search(self.variables, c)]
+        return [c for c in self.variables if c in columnas]
+
+    def aplica(self, b):
+        """
+        Regresa el arreglo booleano con los registros que deben responder las variables del pase.
+        """
+        x = b[self.filtro]
+        numeros = pd.to_numeric(x, errors='coerce')
+        return (numeros.isin([c for c in self.codigos if not isinstance(c, str)]) | x.isin([c for c in self.codigos if isinstance(c, str)])).to_numpy()
+
+def leer_pases(ruta=os.path.join('datos', 'auxiliares', 'pases.json')):
+    """
+    Lee los pases del cuestionario de un archivo json con una lista de objetos {"nombre", "variables", "filtro", "codigos"}.
+
+    Regresa:
+    ------------
+    list
+        Lista de objetos ReglaPase.
+    """
+    with open(ruta) as fp:
+        return [ReglaPase(**r) for r in json.load(fp)]
+
+# - # - # - # - # - # ----------------- VALIDACIÓN ----------------- # - # - # - # - # - #
+
+# ------------------ Función para validar una variable ------------------ #
+def validar_variable(b, var, libro, aplica=None, nulos=NULOS, var_id='id_pers', n_ejemplos=5):
+    """
+    Revisa una variable: claves fuera del libro de códigos, respuestas vacías que debían responderse
+    y respuestas fuera del pase.
+
+    Parámetros:
+    ------------
+    b: DataFrame
+        Conjunto de datos.
+    var: str
+        Nombre de la variable.
+    libro: LibroCodigos
+        Libro de códigos.
+    aplica: ndarray
+        Arreglo booleano con los registros que deben responder la variable. El valor predeterminado es None,
+        la variable no depende de un pase.
+    nulos: list
+        Valores que indican una respuesta vacía (además de los nulos). El valor predeterminado es [' ', ''].
+    var_id: str
+        Variable con el identificador de cada registro, con el que se reportan los ejemplos.
+    n_ejemplos: int
+        Número de identificadores de ejemplo que se reportan por error. El valor predeterminado es 5.
+
+    Regresa:
+    ------------
+    list
+        Lista de diccionarios {variable, error, num_registros, ejemplos}, uno por tipo de error encontrado.
+    """
+    # cada variable se recorre una sola vez: las revisiones se hacen sobre sus valores distintos
+    cod, unicos = pd.factorize(b[var])
+    unicos = pd.Series(unicos)
+    vacio_u = np.append(unicos.isin(nulos).to_numpy(), True)
+    vacio = vacio_u[cod]
+
+    errores = {}
+    if var in libro.codigos:
+        invalido_u = np.append(~libro.permitidos(var, unicos.to_numpy()) & ~vacio_u[:-1], False)
+        errores['clave_invalida'] = invalido_u[cod]
+
+    if aplica is not None:
+        errores['vacia_en_pase'] = vacio & aplica
+        errores['fuera_de_pase'] = ~vacio & ~aplica
+    elif var in libro.codigos and var not in libro.blancos:
+        errores['vacia'] = vacio
+
+    ids = b[var_id].to_numpy() if var_id in b.columns else b.index.to_numpy()
+    res = []
+    for error, m in errores.items():
+        num = int(m.sum())
+        if num > 0:
+            res.append({'variable': var, 'error': error, 'num_registros': num,
+                        'ejemplos': ids[np.flatnonzero(m)[:n_ejemplos]].tolist()})
+    return res
+
+# ------------------ Función para validar la base completa ------------------ #
+def validar_base(b, libro, pases=[], variables=None, nulos=NULOS, var_id='id_pers', n_ejemplos=5, hilos=None, estricto=False):
+    """
+    Valida todas las variables de la base con el libro de códigos y los pases del cuestionario.
+
+    Los pases se evalúan una sola vez y las variables se revisan en paralelo (en hilos, sin copiar la base).
+
+    Parámetros:
+    ------------
+    b: DataFrame
+        Conjunto de datos.
+    libro: LibroCodigos
+        Libro de códigos (ver "LibroCodigos.leer").
+    pases: list
+        Lista de objetos ReglaPase (ver "leer_pases"). El valor predeterminado es [], sin pases.
+    variables: list
+        Variables que se revisan. El valor predeterminado es None, las variables de "b" que están en el libro o en algún pase.
+    nulos: list
+        Valores que indican una respuesta vacía. El valor predeterminado es [' ', ''].
+    var_id: str
+        Variable con el identificador de cada registro. El valor predeterminado es 'id_pers'.
+    n_ejemplos: int
+        Número de identificadores de ejemplo por error. El valor predeterminado es 5.
+    hilos: int
+        Número de hilos. El valor predeterminado es None (el de ThreadPoolExecutor).
+    estricto: bool
+        Si es True se genera un AssertionError cuando hay errores, para detener el proceso antes de estimar.
+        El valor predeterminado es False.
+
+    Regresa:
+    ------------
+    DataFrame
+        Tabla con una fila por variable y tipo de error: número de registros, porcentaje e identificadores de ejemplo.
+    """
+    # registros que deben responder cada variable según su pase
+    aplica = {}
+    for p in pases:
+        if p.filtro not in b.columns:
+            raise AssertionError("La variable filtro '"+p.filtro+"' del pase '"+p.nombre+"' no está en la base")
+        m = p.aplica(b)
+        for v in p.seleccionar(b.columns):
+            aplica[v] = m if v not in aplica else aplica[v] & m
+
+    if variables is None:
+        variables = [v for v in b.columns if v in libro.codigos or v in aplica]
+    faltan = [v for v in libro.variables if v not in b.columns]
+    if faltan:
+        print(str(len(faltan))+" variables del libro de códigos no están en la base, por ejemplo: "+', '.join(faltan[:5]))
+
+    with ThreadPoolExecutor(hilos) as ex:
+        resultados = ex.map(lambda v: validar_variable(b, v, libro, aplica.get(v), nulos, var_id, n_ejemplos), variables)
+        reporte = pd.DataFrame([r for res in resultados for r in res], columns=['variable', 'error', 'num_registros', 'ejemplos'])
+
+    reporte.insert(3, 'porcentaje', reporte['num_registros'] / max(len(b), 1) * 100)
+    print("Se revisaron "+str(len(variables))+" variables: "+str(len(reporte))+" errores en "+str(reporte['variable'].nunique())+" variables.")
+
+    if estricto and len(reporte) > 0:
+        raise AssertionError("La base tiene errores de validación:\n"+reporte.to_string(max_rows=20))
+
+    return reporte
+
+# - # - # - # - # - # ----------------- ÍNDICE DE CLAVES DE RESPUESTA ----------------- # - # - # - # - # - #
+
+# ------------------ Clase con las claves observadas de cada variable ------------------ #
+class IndiceCodigos:
+    """
+    Índice con las claves de respuesta observadas en cada variable de la base limpia y, opcionalmente,
+    las claves del libro de códigos.
+
+    Las claves se calculan una sola vez y se guardan en un archivo json junto a los datos limpios, de modo que los
+    diccionarios de "prevalencias", las etiquetas y los reemplazos se revisan en tiempo proporcional al número de claves.
+    El índice describe el archivo de datos limpios con el que se construyó (ver "huella_base" y "corresponde"): sólo 
+    sirve para revisar diccionarios, no se guarda en la base ni lo consultan "codigos_observados" o "recodificar", 
+    que siempre usan los datos que reciben.
+
+    Parámetros:
+    ------------
+    observados: dict
+        Diccionario {variable: claves observadas}.
+    libro: LibroCodigos
+        Libro de códigos. El valor predeterminado es None.
+    huella: str
+        Huella del archivo de datos limpios con el que se calcularon las claves (ver "huella_base").
+    """
+    def __init__(self, observados, libro=None, huella=None):
+        self.observados = {v: frozenset(c) for v, c in observados.items()}
+        self.libro = libro
+        self.huella = huella
+
+    @staticmethod
+    def huella_base(ruta_base):
+        """
+        Regresa la huella del archivo de datos limpios "ruta_base" a partir de su nombre, tamaño y fecha de 
+        modificación, sin leer los datos. Un archivo que se vuelve a escribir (por ejemplo, al limpiar de nuevo la base)
+        tiene otra huella.
+        """
+        info = os.stat(ruta_base)
+        datos = [os.path.basename(ruta_base), info.st_size, info.st_mtime_ns]
+        return hashlib.sha1(json.dumps(datos).encode('utf-8')).hexdigest()[:12]
+
+    @classmethod
+    def construir(cls, b, libro=None, variables=None, max_codigos=1000, huella=None):
+        """
+        Calcula las claves observadas (sin nulos) de las variables de "b" con una pasada por columna.
+        Las variables con más de "max_codigos" claves distintas (identificadores, factores de expansión, etc.) no se guardan.
+        "huella" es la huella del archivo del que se leyó "b" (ver "huella_base").
+        """
+        variables = list(b.columns) if variables is None else variables
+        observados = {}
+        for v in variables:
+            claves = pd.unique(b[v].dropna())
+            if len(claves) <= max_codigos:
+                observados[v] = claves.tolist()
+        return cls(observados, libro, huella)
+
+    def guardar(self, ruta):
+        """
+        Guarda las claves observadas en el archivo json "ruta".
+        """
+        def ordenar(c):
+            return sorted(c, key=lambda x: (isinstance(x, str), x if not isinstance(x, str) else 0, str(x)))
+
+        with open(ruta, 'w') as fp:
+            json.dump({'huella': self.huella, 'observados': {v: ordenar(c) for v, c in self.observados.items()}},
+                      fp, indent=1, ensure_ascii=False, default=lambda x: x.item() if hasattr(x, 'item') else str(x))
+
+    @classmethod
+    def cargar(cls, ruta, libro=None):
+        """
+        Lee las claves observadas guardadas con "guardar".
+        """
+        with open(ruta) as fp:
+            d = json.load(fp)
+        return cls(d['observados'], libro, d['huella'])
+
+    @classmethod
+    def para_base(cls, b, ruta_base, ruta=os.path.join('datos', 'limpios', 'codigos_observados.json'), libro=None, max_codigos=1000, forzar=False):
+        """
+        Lee el índice guardado en "ruta" si corresponde al archivo "ruta_base" del que se leyó la base "b" (misma huella); 
+        en otro caso lo calcula con "b" y lo guarda. La huella se calcula con los metadatos del archivo, por lo que 
+        leer el índice guardado no recorre los datos. Con forzar=True se calcula de nuevo aunque la huella coincida.
+
+        Regresa:
+        ------------
+        IndiceCodigos
+            Índice de las claves observadas de "b".
+        """
+        huella = cls.huella_base(ruta_base)
+        if not forzar and os.path.exists(ruta):
+            indice = cls.cargar(ruta, libro)
+            if indice.huella == huella:
+                return indice
+
+        indice = cls.construir(b, libro, max_codigos=max_codigos, huella=huella)
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        indice.guardar(ruta)
+        return indice
+
+    def corresponde(self, ruta_base):
+        """
+        Regresa True si el índice se calculó con el archivo de datos limpios "ruta_base" en su versión actual (misma huella).
+        """
+        return self.huella == self.huella_base(ruta_base)
+
+    def codigos(self, var):
+        """
+        Regresa el conjunto de claves observadas en la variable "var".
+        """
+        if var not in self.observados:
+            raise AssertionError("La variable '"+str(var)+"' no está en el índice de claves de respuesta")
+        return self.observados[var]
+
+    def _desconocidas(self, var, claves):
+        """
+        Regresa las claves que no están en el libro de códigos de "var" (vacío si no hay libro o la variable no está en él).
+        """
+        if self.libro is None or var not in self.libro.codigos:
+            return set()
+        claves = list(claves)
+        validos = self.libro.permitidos(var, np.array(claves, dtype=object)) if claves else []
+        return {c for c, ok in zip(claves, validos) if not ok}
+
+    def validar_dicc(self, lista_vars, dicc):
+        """
+        Revisa el diccionario de reclasificación "dicc" de "lista_vars" (como "validar_dicc") con las claves del índice.
+        Además avisa de las claves del diccionario que no están en el libro de códigos (posibles errores de captura).
+        """
+        revisar_codigos([self.codigos(v) for v in lista_vars], dicc)
+        desconocidas = set().union(*[self._desconocidas(v, dicc) for v in lista_vars])
+        if desconocidas:
+            print("Las claves "+str(desconocidas).replace('{','').replace('}','')+" del diccionario no están en el libro de códigos de "+', '.join(lista_vars))
+
+    def validar_etiquetas(self, var, etiquetas):
+        """
+        Revisa el diccionario {clave: etiqueta} de la variable "var" (por ejemplo, para las claves de respuesta de "proporciones").
+
+        Regresa:
+        ------------
+        dict
+            Diccionario con las claves observadas sin etiqueta ('sin_etiqueta'), las etiquetas de claves que no se
+            observan ('no_observadas') y las que no están en el libro de códigos ('fuera_del_libro').
+        """
+        observadas = self.codigos(var)
+        return {'sin_etiqueta': set(observadas - set(etiquetas)),
+                'no_observadas': set(etiquetas) - observadas,
+                'fuera_del_libro': self._desconocidas(var, etiquetas)}
+
+    def validar_reemplazo(self, mapeo, estricto=True):
+        """
+        Revisa un reemplazo por variable como los de los cuadernos, por ejemplo b.replace({'ds9': {1: 'Primaria incompleta', ...}}).
+
+        Parámetros:
+        ------------
+        mapeo: dict
+            Diccionario {variable: {clave: valor}}.
+        estricto: bool
+            Si es True se genera un AssertionError cuando hay claves observadas sin reemplazo. Si es False sólo se avisa.
+            El valor predeterminado es True.
+
+        Regresa:
+        ------------
+        DataFrame
+            Tabla con una fila por variable y el resultado de "validar_etiquetas".
+        """
+        filas = [dict(variable=v, **self.validar_etiquetas(v, m)) for v, m in mapeo.items()]
+        r = pd.DataFrame(filas, columns=['variable', 'sin_etiqueta', 'no_observadas', 'fuera_del_libro'])
+
+        faltan = r[r['sin_etiqueta'].map(len) > 0]
+        if len(faltan) > 0:
+            mensaje = "Al reemplazo le faltan claves observadas: " + '; '.join(v+': '+str(sorted(map(str, c))) for v, c in zip(faltan['variable'], faltan['sin_etiqueta']))
+            if estricto:
+                raise AssertionError(mensaje)
+            print(mensaje)
+
+        return r
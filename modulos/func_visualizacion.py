@@ -3,24 +3,165 @@ Este archivo contiene las funciones necesarias para desarrollar gráficos y visu
 los cuales facilitan la comunicación visual de los hallazgos obtenidos a partir de los datos analizados.
 '''
 import os
+import re
+import json
+import time
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import plotly.express as px
+import plotly
 import plotly.io as pio
 import plotly.graph_objs as go
-from plotly.subplots import make_subplots
 
 # - # - # - # - # - # ----------------- VISUALIZACIÓN DE DATOS ----------------- # - # - # - # - # - # 
 
-# ------------------ Función que genera gráfico de dispersión con tabla ------------------ #
-def grafico_dispersion(tabulado, ruta, extension = '.csv', ruta_salida = ('..','..','informe-preliminar','salidas-graficas')):
-    p = os.path.join( *(ruta + (tabulado+extension,)))
-    if extension == '.csv':
-        b0 = pd.read_csv(p)
-    elif extension == '.xlsx':
-        b0 = pd.read_excel(p)
-    else:
-        print('solo se aceptan archivos en csv o xlsx')
+# ------------------ Plantilla y esqueletos de las figuras ------------------ #
+COLORES_SEXO = {'Mujeres':'#714859', 'Hombres': '#b38e5d'}
+COLORES_TEMPORALIDAD = ['#285c4d','#d4c19c']
+
+# plantilla de los gráficos de barras: "simple_white" con el fondo, la fuente y el tipo de barras de la encuesta
+PLANTILLA = 'encuesta'
+
+def registrar_plantilla():
+    """ 
+    Registra la plantilla PLANTILLA en plotly (sólo la primera vez, no al importar el módulo) y regresa su nombre.
+    """
+    if PLANTILLA not in pio.templates:
+        plantilla = go.layout.Template(pio.templates['simple_white'])
+        plantilla.layout.update(height=500,
+                                width=1000,
+                                paper_bgcolor ='rgba(0, 0, 0, 0)',
+                                font = dict(family = 'Montserrat'),
+                                barmode='group',
+                                legend_tracegroupgap=0)
+        plantilla.data.bar[0].update(orientation='h', textposition='outside')
+        pio.templates[PLANTILLA] = plantilla
+    return PLANTILLA
+
+def anotacion_eje(tamano_fuente):
+    """ 
+    Regresa la anotación que nombra el eje de los porcentajes.
+    """
+    return dict(text='Porcentaje de las personas encuestadas',
+                xref="paper", 
+                yref="paper",
+                x=0.5, y=-0.15, 
+                showarrow=False,
+                font=dict(size=tamano_fuente))
+
+@lru_cache(maxsize=64)
+def _esqueleto_subgraficos(nr, nc, titulos):
+    """ 
+    Regresa (en json) el diseño de una retícula de nr x nc gráficos con eje y compartido, 
+    se calcula con "make_subplots" una sola vez por retícula.
+    """
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=nr, cols=nc, subplot_titles=list(titulos), shared_yaxes=True, shared_xaxes=False)
+    return json.dumps(fig.layout.to_plotly_json())
+
+def esqueleto(tamano_fuente, nr=1, nc=1, titulos=(), **diseno):
+    """ 
+    Regresa el diseño (layout) base de un gráfico de barras: plantilla, fuente, anotación del eje y, 
+    si tiene más de un gráfico, la retícula de nr x nc gráficos con sus títulos.
+
+    Parámetros:
+    ------------
+    tamano_fuente : int
+        Tamaño de la fuente del gráfico y de las anotaciones.
+    nr, nc : int
+        Número de renglones y columnas de la retícula. El valor predeterminado es 1.
+    titulos : tuple
+        Títulos de los gráficos de la retícula.
+    **diseno
+        Especificaciones adicionales del diseño.
+
+    Regresa:
+    ------------
+    dict
+        Diseño del gráfico.
+    """
+    layout = json.loads(_esqueleto_subgraficos(nr, nc, tuple(titulos))) if nr*nc > 1 else {}
+    for a in layout.get('annotations', []):
+        a['font'] = dict(size=tamano_fuente)
+    layout['annotations'] = layout.get('annotations', []) + [anotacion_eje(tamano_fuente)]
+    layout.update(template=registrar_plantilla(), font=dict(size=tamano_fuente), **diseno)
+    return layout
+
+def actualizar_ejes(layout, eje, **propiedades):
+    """ 
+    Agrega "propiedades" a todos los ejes "eje" ('x' o 'y') del diseño "layout".
+    """
+    llaves = [k for k in layout if re.fullmatch(eje+'axis[0-9]*', k)] or [eje+'axis']
+    for k in llaves:
+        layout[k] = dict(layout.get(k, {}), **propiedades)
+    return layout
+
+def ejes_subgrafico(renglon, columna, nc):
+    """ 
+    Regresa las referencias ("x2", "y2", etc.) de los ejes del gráfico en (renglon, columna) 
+    de una retícula de nc columnas.
+    """
+    k = (renglon-1)*nc + columna
+    sufijo = '' if k == 1 else str(k)
+    return 'x'+sufijo, 'y'+sufijo
+
+def series_columnares(b, var_serie, columnas):
+    """ 
+    Divide las columnas "columnas" de "b" en arreglos por cada valor (ordenado) de "var_serie", 
+    con un solo ordenamiento en lugar de un "groupby".
+
+    Regresa:
+    ------------
+    list
+        Lista de parejas (valor, diccionario columna -> arreglo).
+    """
+    codigos, valores = pd.factorize(b[var_serie], sort=True)
+    validos = codigos >= 0
+    orden = np.argsort(codigos[validos], kind='stable')
+    cortes = np.cumsum(np.bincount(codigos[validos], minlength=len(valores)))[:-1]
+    arreglos = {c: np.split(b[c].to_numpy()[validos][orden], cortes) for c in columnas}
+    return [(v, {c: arreglos[c][i] for c in columnas}) for i, v in enumerate(valores)]
+
+def traza_barras(c, var_cat, texto, color, nombre=None, ejes=('x', 'y'), mostrar_leyenda=True):
+    """ 
+    Construye la traza de barras horizontales (con intervalos) a partir de los arreglos de "c" 
+    (ver "series_columnares"). Las trazas de una misma serie comparten "legendgroup" y sólo 
+    la primera se muestra en la leyenda.
+    """
+    return go.Bar(x=c['estimacion'],
+                  y=c[var_cat],
+                  name=nombre,
+                  legendgroup=nombre,
+                  showlegend=mostrar_leyenda,
+                  marker_color=color,
+                  text=c[texto],
+                  xaxis=ejes[0],
+                  yaxis=ejes[1],
+                  error_x=dict(type='data',
+                               symmetric=False,
+                               array=c["e_sup"],
+                               arrayminus=c["e_inf"]))
+
+# ------------------ Función que construye gráfico de dispersión con tabla ------------------ #
+def construir_dispersion(b0):
+    """ 
+    Construye el gráfico de dispersión de las estimaciones estatales (total de mujeres y hombres) 
+    con sus intervalos y una tabla con los valores.
+
+    Parámetros:
+    ------------
+    b0 : DataFrame
+        Tabulado estatal con las columnas "sexo", "entidad", "clave_entidad_dai", "estimacion", "ic_inf" e "ic_sup".
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    from plotly.subplots import make_subplots
 
     b= b0[b0['sexo']=='Mujeres y hombres']
     b.insert(0,'e_sup',(b['ic_sup']-b['estimacion']).round(2))
@@ -68,13 +209,85 @@ def grafico_dispersion(tabulado, ruta, extension = '.csv', ruta_salida = ('..','
     fig.update_yaxes(showline=True, linecolor='lightgray', nticks=60, gridwidth=1, griddash='dot', gridcolor='lightgray', showticklabels=False)
     fig.update_xaxes(zeroline=True, zerolinecolor='lightgray',zerolinewidth=1, showline=True, linecolor='lightgray', mirror=True, gridcolor='lightgray')
 
-    fig.show()
+    return fig
+
+# ------------------ Función que genera gráfico de dispersión con tabla ------------------ #
+def grafico_dispersion(tabulado, ruta, extension = '.csv', ruta_salida = ('..','..','informe-preliminar','salidas-graficas'), mostrar = True, cache = True):
+    """ 
+    Lee un tabulado estatal, genera su gráfico de dispersión con tabla (ver "construir_dispersion") y lo guarda en png.
+
+    Parámetros:
+    ------------
+    tabulado : str
+        Nombre del archivo del tabulado (sin extensión), también se usa para nombrar la imagen.
+    ruta : tuple
+        Carpetas donde está el tabulado.
+    extension : str
+        '.csv' o '.xlsx'. El valor predeterminado es '.csv'.
+    ruta_salida : tuple
+        Carpetas donde se guardará la imagen.
+    mostrar : bool
+        Si es True se muestra el gráfico. El valor predeterminado es True; en lote conviene False.
+    cache : bool
+        Si es True no se vuelve a generar la imagen cuando ya existe con los mismos datos.
+        El valor predeterminado es True.
+
+    Regresa:
+    ------------
+    archivo
+        archivo con la imagen del gráfico.
+    """
+    p = os.path.join( *(ruta + (tabulado+extension,)))
+    if extension == '.csv':
+        b0 = pd.read_csv(p)
+    elif extension == '.xlsx':
+        b0 = pd.read_excel(p)
+    else:
+        print('solo se aceptan archivos en csv o xlsx')
+
+    especificacion = {'nombre_salida': tabulado, 'tipo': 'dispersion', 'parametros': {'b0': b0}}
+    if mostrar:
+        especificacion['figura'] = construir_dispersion(b0)
+        especificacion['figura'].show()
     #ruta_salida = ('..','..','informe-preliminar','salidas-graficas')
-    fig.write_image(os.path.join( *(ruta_salida + (tabulado+'.png',))))
+    renderizar_lote([especificacion], ruta_salida=os.path.join(*ruta_salida), procesos=1, scale=1, cache=cache)
     
     
+# ------------------ Función que construye gráfico de barras desagregadas por sexo ------------------ #
+def construir_barras_sexo(b, categorias, orden_cat, espaciado=' '*10, aumento_rango=3):
+    """ 
+    Construye el gráfico de barras mostrando estimaciones agrupadas de acuerdo 
+    a la variable "categorias" y desglosadas por sexo (ver "barras_sexo").
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    #constantes
+    max_v= b.estimacion.max() + (b.e_sup.max()*aumento_rango)
+    columnas = ['estimacion', categorias, 'texto', 'e_sup', 'e_inf']
+
+    if orden_cat==[]:
+        b=b.sort_values('estimacion')
+
+    trazas = [traza_barras(c, categorias, 'texto', COLORES_SEXO[g], g) 
+              for g,c in series_columnares(b.assign(texto=espaciado+b['estimacion'].astype(str)), 'sexo', columnas)]
+
+    #especificaciones del grafico
+    layout = esqueleto(16, bargroupgap=0.0, bargap=0.15)
+    actualizar_ejes(layout, 'x', linecolor='lightgray', tickcolor='darkgray', autorangeoptions=dict(include=max_v))
+    if orden_cat!=[]:
+        actualizar_ejes(layout, 'y', linecolor='lightgray', categoryorder='array', categoryarray=orden_cat, ticks='')
+    else:
+        actualizar_ejes(layout, 'y', linecolor='lightgray', categoryorder='array', ticks='')
+
+    fig = go.Figure(data=trazas, layout=layout)
+
+    return fig
+
 # ------------------ Función que genera gráfico de barras desagregadas por sexo ------------------ #
-def barras_sexo(b, categorias, orden_cat, nombre_salida, espaciado=' '*10, aumento_rango=3):
+def barras_sexo(b, categorias, orden_cat, nombre_salida, espaciado=' '*10, aumento_rango=3, cache=True):
     """ 
     Genera gráfico de barras mostrando estimaciones agrupadas de acuerdo 
     a la variable "categorias" y desglosadas por sexo.
@@ -95,73 +308,48 @@ def barras_sexo(b, categorias, orden_cat, nombre_salida, espaciado=' '*10, aumen
     aumento_rango: int
         Longitud que se aumentará del rango.
         El valor predeterminado es 3
+    cache: bool
+        Si es True no se vuelve a generar la imagen cuando ya existe con los mismos datos y parámetros.
+        El valor predeterminado es True.
     
     Regresa:
     ------------
     archivo
         archivo con la imagen del gráfico.
     """
+    guardar_grafico('barras_sexo', dict(b=b, categorias=categorias, orden_cat=orden_cat, espaciado=espaciado, aumento_rango=aumento_rango),
+                    nombre_salida, cache=cache)
+    
+
+# ------------------ Función que construye gráfico de barras desagregadas por temporalidad ------------------ #    
+def construir_barras_temporalidad(b, categorias, espaciado=' '*10, aumento_rango=3):
+    """ 
+    Construye el gráfico de barras mostrando estimaciones desglosadas por temporalidad (ver "barras_temporalidad").
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
     #constantes
     max_v= b.estimacion.max() + (b.e_sup.max()*aumento_rango)
-    colores_hym = {'Mujeres':'#714859', 'Hombres': '#b38e5d'}
+    colores_hym = dict(zip(list(set(b.temporalidad)),COLORES_TEMPORALIDAD))#{'Último año':'#285c4d','Consumo actual':'#d4c19c'}#{'Último año':'#285c4d', 'Último mes':'#d4c19c'}#
+    columnas = ['estimacion', categorias, 'texto', 'e_sup', 'e_inf']
 
-    if orden_cat==[]:
-        b=b.sort_values('estimacion')
-    
-    pio.templates.default = "simple_white"
-    
-    fig = go.Figure()
-    for g,c in b.groupby('sexo'):
-        fig.add_trace(go.Bar(x=c['estimacion'],
-                             y=c[categorias],
-                             orientation='h',
-                             name=g,
-                             marker_color=colores_hym[g],
-                             text=[espaciado+str(x) for x in c['estimacion']],
-                             error_x=dict(type='data',
-                                          symmetric=False,
-                                          array=list(c["e_sup"]),
-                                          arrayminus=list(c["e_inf"])),
-                            )
-                     )
+    trazas = [traza_barras(c, categorias, 'texto', colores_hym[g], g) 
+              for g,c in series_columnares(b.assign(texto=espaciado+b['estimacion'].astype(str)), 'temporalidad', columnas)]
 
     #especificaciones del grafico
-    fig.update_layout(height=500,
-                      width=1000,
-                      paper_bgcolor ='rgba(0, 0, 0, 0)',
-                      font = dict(
-                               family = 'Montserrat',
-                               size = 16,
-                               color="dark gray" 
-                      ),
-                      barmode='group',
-                      bargroupgap=0.0,
-                      bargap=0.15,
-                     )
-
-    #para nombrar eje
-    fig.add_annotation(text='Porcentaje de las personas encuestadas',
-                       xref="paper", 
-                       yref="paper",
-                       x=0.5, y=-0.15, 
-                       showarrow=False)
-    
-    fig.update_xaxes(linecolor='lightgray', tickcolor='darkgray',  autorangeoptions_include=max_v,
-                    )
-    if orden_cat!=[]:
-        fig.update_yaxes(linecolor='lightgray', categoryorder='array', categoryarray= orden_cat, ticks='')
-    else:
-        fig.update_yaxes(linecolor='lightgray', categoryorder='array', ticks='')
+    layout = esqueleto(16, bargroupgap=0.0, bargap=0.15)
+    actualizar_ejes(layout, 'x', linecolor='lightgray', tickcolor='darkgray', autorangeoptions=dict(include=max_v))
+    actualizar_ejes(layout, 'y', linecolor='lightgray', ticks='') #categoryorder='array', categoryarray= orden_cat,
 
-    fig.update_traces(textposition = "outside")
-    fig.update_annotations(font_size=16)
-    
-    #para que muestre etiquetas una única vez
-    fig.write_image(os.path.join('salidas-graficas',nombre_salida+'.png'), scale=3)
-    
+    fig = go.Figure(data=trazas, layout=layout)
+
+    return fig
 
 # ------------------ Función que genera gráfico de barras desagregadas por temporalidad ------------------ #    
-def barras_temporalidad(b, categorias, nombre_salida, espaciado=' '*10, aumento_rango=3):
+def barras_temporalidad(b, categorias, nombre_salida, espaciado=' '*10, aumento_rango=3, cache=True):
     """ 
     Genera una retícula con gráficos de barras mostrando estimaciones desglosadas por la variable "var_barras". 
 
@@ -179,68 +367,59 @@ def barras_temporalidad(b, categorias, nombre_salida, espaciado=' '*10, aumento_
     aumento_rango: int
         Longitud que se aumentará del rango.
         El valor predeterminado es 3
+    cache: bool
+        Si es True no se vuelve a generar la imagen cuando ya existe con los mismos datos y parámetros.
+        El valor predeterminado es True.
     
     Regresa:
     ------------
     archivo
         archivo con la imagen del gráfico.
     """
-    #constantes
-    max_v= b.estimacion.max() + (b.e_sup.max()*aumento_rango)
-    colores_hym = dict(zip(list(set(b.temporalidad)),['#285c4d','#d4c19c']))#{'Último año':'#285c4d','Consumo actual':'#d4c19c'}#{'Último año':'#285c4d', 'Último mes':'#d4c19c'}#
-
-    
-    pio.templates.default = "simple_white"
+    guardar_grafico('barras_temporalidad', dict(b=b, categorias=categorias, espaciado=espaciado, aumento_rango=aumento_rango),
+                    nombre_salida, cache=cache)
     
-    fig = go.Figure()
-    for g,c in b.groupby('temporalidad'):
-        fig.add_trace(go.Bar(x=c['estimacion'],
-                             y=c[categorias],
-                             orientation='h',
-                             name=g,
-                             marker_color=colores_hym[g],
-                             text=[espaciado+str(x) for x in c['estimacion']],
-                             error_x=dict(type='data',
-                                          symmetric=False,
-                                          array=list(c["e_sup"]),
-                                          arrayminus=list(c["e_inf"])),
-                            )
-                     )
 
-    #especificaciones del grafico
-    fig.update_layout(height=500,
-                      width=1000,
-                      paper_bgcolor ='rgba(0, 0, 0, 0)',
-                      font = dict(
-                               family = 'Montserrat',
-                               size = 16,
-                               color="dark gray" 
-                      ),
-                      barmode='group',
-                      bargroupgap=0.0,
-                      bargap=0.15,
-                     )
-
-    #para nombrar eje
-    fig.add_annotation(text='Porcentaje de las personas encuestadas',
-                       xref="paper", 
-                       yref="paper",
-                       x=0.5, y=-0.15, 
-                       showarrow=False)
-    
-    fig.update_xaxes(linecolor='lightgray', tickcolor='darkgray',  autorangeoptions_include=max_v,
-                    )
-    fig.update_yaxes(linecolor='lightgray', ticks='') #categoryorder='array', categoryarray= orden_cat,
-    fig.update_traces(textposition = "outside")
-    fig.update_annotations(font_size=16)
-    
-    #para que muestre etiquetas una única vez
-    fig.write_image(os.path.join('salidas-graficas',nombre_salida+'.png'), scale=3)
+
+# ------------------ Función que construye renglón de gráficos de barras ------------------ # 
+def construir_barras_renglon(b, var_cols, categorias, orden_cat, orden_cols, espaciado=' '*10, aumento_rango=3):
+    """ 
+    Construye el renglón de gráficos de barras mostrando estimaciones agrupadas de acuerdo 
+    a la variable "categorias" y desglosadas por sexo (ver "barras_renglon").
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    #constantes
+    nc = len(set(b[var_cols]))
+    max_v= b.estimacion.max() + (b.e_sup.max()*6)
+    columnas = ['estimacion', categorias, 'texto', 'e_sup', 'e_inf']
     
+    #preprocesamiento para graficar (texto de todas las barras de una vez)
+    agrupado = dict(series_columnares(b.assign(texto='  '+b['estimacion'].astype(str)), var_cols, columnas+['sexo']))
+
+    #generacion de renglones con graficas, cada sexo es una serie con una sola entrada en la leyenda
+    trazas = []
+    en_leyenda = set()
+    for columna, f in enumerate(orden_cols, start=1):
+        sb = pd.DataFrame(agrupado[f])
+        for g,c in series_columnares(sb, 'sexo', columnas):
+            trazas.append(traza_barras(c, categorias, 'texto', COLORES_SEXO[g], g, ejes_subgrafico(1, columna, nc), g not in en_leyenda))
+            en_leyenda.add(g)
+
+    #especificaciones de forma de grafica
+    layout = esqueleto(14, 1, nc, orden_cols)
+    actualizar_ejes(layout, 'x', matches='x', autorangeoptions=dict(include=max_v), linecolor='lightgray', tickcolor='darkgray')
+    actualizar_ejes(layout, 'y', linecolor='lightgray', categoryorder='array', categoryarray=orden_cat, ticks='')
+
+    fig = go.Figure(data=trazas, layout=layout)
 
+    return fig
 
 # ------------------ Función que genera renglón de gráficos de barras ------------------ # 
-def barras_renglon(b, var_cols, categorias, orden_cat, orden_cols, nombre_salida, espaciado=' '*10, aumento_rango=3):
+def barras_renglon(b, var_cols, categorias, orden_cat, orden_cols, nombre_salida, espaciado=' '*10, aumento_rango=3, cache=True):
     """ 
     Genera columnas con gráficos de barras mostrando estimaciones agrupadas de acuerdo 
     a la variable "categorias" y desglosadas por sexo.
@@ -265,86 +444,60 @@ def barras_renglon(b, var_cols, categorias, orden_cat, orden_cols, nombre_salida
     aumento_rango: int
         Longitud que se aumentará del rango.
         El valor predeterminado es 3
+    cache: bool
+        Si es True no se vuelve a generar la imagen cuando ya existe con los mismos datos y parámetros.
+        El valor predeterminado es True.
     
     Regresa:
     ------------
     archivo
         archivo con la imagen del gráfico.
     """
-    #constantes
-    colores_hym = {'Mujeres':'#714859', 'Hombres': '#b38e5d'}
-    nr = 1
-    nc = len(set(b[var_cols]))
-    max_v= b.estimacion.max() + (b.e_sup.max()*6)
+    guardar_grafico('barras_renglon', dict(b=b, var_cols=var_cols, categorias=categorias, orden_cat=orden_cat, orden_cols=orden_cols,
+                                           espaciado=espaciado, aumento_rango=aumento_rango),
+                    nombre_salida, cache=cache)
     
-    #preprocesamiento para graficar
-    agrupado = b.groupby(var_cols)
-
-    #especificaciones de forma de grafica
-    pio.templates.default = "simple_white"
-    fig = make_subplots(
-        rows=1, 
-        cols=nc,
-        subplot_titles=(orden_cols),
-        shared_yaxes=True,
-        shared_xaxes=False,
-    )
-    #generacion de renglones con graficas
-    columna=0
-    for f in orden_cols:
-        columna+=1
-        sb=agrupado.get_group(f)
-        for g,c in sb.groupby('sexo'):
-            fig.add_trace(go.Bar(x=c['estimacion'],
-                                    y=c[categorias],
-                                    orientation='h',
-                                    name=g,
-                                    marker_color=colores_hym[g],
-                                    text=['  '+str(x) for x in c['estimacion']],
-                                    error_x=dict(type='data',
-                                                  symmetric=False,
-                                                  array=list(c["e_sup"]),
-                                                  arrayminus=list(c["e_inf"])),
-                                ),
-                          1,
-                          columna
-                         )
-
-    #mas especificaciones del grafico
-    fig.update_layout(height=500,
-                      width=1000,
-                      paper_bgcolor ='rgba(0, 0, 0, 0)',
-                      font = dict(
-                               family = 'Montserrat',
-                               size = 14,
-                               color="dark gray" 
-                      ),
-                      barmode='group'
-                     )
-
-
-    #para nombrar eje
-    fig.add_annotation(text='Porcentaje de las personas encuestadas',
-                       xref="paper", 
-                       yref="paper",
-                       x=0.5, y=-0.15, 
-                       showarrow=False)
     
-    fig.update_xaxes(matches='x', autorangeoptions_include=max_v, linecolor='lightgray', tickcolor='darkgray')
-    for i in range(1,nc+1):
-        fig.update_yaxes(col=i, linecolor='lightgray', categoryorder='array', categoryarray=orden_cat, ticks='')
-    fig.update_traces(textposition = "outside")
-    fig.update_annotations(font_size=14)
-    
-    #para que muestre etiquetas una única vez
-    names = set() 
-    fig.for_each_trace(lambda trace: trace.update(showlegend=False) if (trace.name in names) else names.add(trace.name))
+# ------------------ Función que construye retícula de gráficos de barras ------------------ # 
+def construir_barras_reticula(b, var_cols, var_reng, var_barras, orden_gps, espaciado=' '*10, aumento_rango=3):
+    """ 
+    Construye la retícula con gráficos de barras mostrando estimaciones desglosadas por la variable "var_barras"
+    (ver "barras_reticula").
 
-    fig.write_image(os.path.join('salidas-graficas',nombre_salida+'.png'), scale=3)
-    
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    #constantes y dic de utilidad
+    nr = len(set(b[var_reng]))
+    nc =len(set(b[var_cols]))
+    max_v = b.estimacion.max() + (b.e_sup.max()*aumento_rango)
+    columnas = ['estimacion', var_barras, 'texto', 'e_sup', 'e_inf']
     
+    #preprocesamiento para graficar (texto de todas las barras de una vez)
+    b = b.assign(texto=espaciado+b['estimacion'].astype(str))
+    b = b.assign(_gpo=pd.MultiIndex.from_frame(b[[var_cols, var_reng]]).to_flat_index())
+    agrupado = dict(series_columnares(b, '_gpo', columnas))
+
+    #las barras no tienen nombre, sólo la primera se muestra en la leyenda
+    trazas = []
+    for i,gpo in enumerate(orden_gps):
+        renglon=int(i%2 + 1)
+        columna=int(np.ceil((i%4 + 1)/2))
+        trazas.append(traza_barras(agrupado[gpo], var_barras, 'texto', COLORES_SEXO[gpo[0]], 
+                                   ejes=ejes_subgrafico(columna, renglon, nc), mostrar_leyenda=(i == 0)))
+
+    #especificaciones de forma de grafica
+    layout = esqueleto(12, nr, nc, [x[0]+' - '+x[1] for x in orden_gps])
+    actualizar_ejes(layout, 'x', matches='x', autorangeoptions=dict(include=max_v))
+
+    fig = go.Figure(data=trazas, layout=layout)
+
+    return fig
+
 # ------------------ Función que genera retícula de gráficos de barras ------------------ # 
-def barras_reticula(b, var_cols, var_reng, var_barras, orden_gps, nombre_salida, espaciado=' '*10, aumento_rango=3):
+def barras_reticula(b, var_cols, var_reng, var_barras, orden_gps, nombre_salida, espaciado=' '*10, aumento_rango=3, cache=True):
     """ 
     Genera una retícula con gráficos de barras mostrando estimaciones desglosadas por la variable "var_barras". 
 
@@ -369,75 +522,883 @@ def barras_reticula(b, var_cols, var_reng, var_barras, orden_gps, nombre_salida,
     aumento_rango: int
         Longitud que se aumentará del rango.
         El valor predeterminado es 3
+    cache: bool
+        Si es True no se vuelve a generar la imagen cuando ya existe con los mismos datos y parámetros.
+        El valor predeterminado es True.
     
     Regresa:
     ------------
     archivo
         archivo con la imagen del gráfico.
     """
-    #constantes y dic de utilidad
-    nr = len(set(b[var_reng]))
-    nc =len(set(b[var_cols]))
-    max_v = b.estimacion.max() + (b.e_sup.max()*aumento_rango)
-    colores_hym = {'Mujeres':'#714859', 'Hombres': '#b38e5d'}
-    
-    #preprocesamiento para graficar
-    agrupado = b.groupby([var_cols,var_reng])
+    guardar_grafico('barras_reticula', dict(b=b, var_cols=var_cols, var_reng=var_reng, var_barras=var_barras, orden_gps=orden_gps,
+                                            espaciado=espaciado, aumento_rango=aumento_rango),
+                    nombre_salida, cache=cache)
 
-    #especificaciones de forma de grafica
-    pio.templates.default = "simple_white"
-    fig = make_subplots(
-        rows=nr, 
-        cols=nc,
-        subplot_titles=[x[0]+' - '+x[1] for x in orden_gps],
-        shared_yaxes=True,
-        shared_xaxes=False,
-    )
-    for i,gpo in enumerate(orden_gps):
-        renglon=int(i%2 + 1)
-        columna=int(np.ceil((i%4 + 1)/2))
-        c=agrupado.get_group(gpo)
-        fig.add_trace(go.Bar(x=c['estimacion'],
-                             y=c[var_barras],
-                             orientation='h',
-                             #name=g,
-                             marker_color=colores_hym[gpo[0]],
-                             text=[espaciado+str(x) for x in c['estimacion']],
-                             error_x=dict(type='data',symmetric=False,
-                                          array=list(c["e_sup"]),
-                                          arrayminus=list(c["e_inf"]))
-                            ),
-                      columna,
-                      renglon,
-                     )
-        
-    
-    #mas especificaciones del grafico
-    fig.update_layout(height=500,
-                      width=1000,
-                      paper_bgcolor ='rgba(0, 0, 0, 0)',
-                      font = dict(
-                               family = 'Montserrat',
-                               size = 12,
-                               color="dark gray" 
-                      ),
-                      barmode='group'
-                     )
-
-
-    #para nombrar eje
-    fig.add_annotation(text='Porcentaje de las personas encuestadas',
-                       xref="paper", 
-                       yref="paper",
-                       x=0.5, y=-0.15, 
-                       showarrow=False)
-    
-    fig.update_xaxes(matches='x', autorangeoptions_include=max_v)
-    fig.update_traces(textposition = "outside")
-    fig.update_annotations(font_size=12)
-    
-    #para que muestre etiquetas una única vez
-    categorias = set()
-    fig.for_each_trace(lambda trace: trace.update(showlegend=False) if (trace.name in categorias) else categorias.add(trace.name))
 
-    fig.write_image(os.path.join('salidas-graficas',nombre_salida+'.png'), scale=3)
\ No newline at end of file
+# ------------------ Renderizado de gráficos en lote ------------------ #
+FORMATOS_IMAGEN = ('png', 'svg', 'pdf')
+
+CONSTRUCTORES = {'dispersion': construir_dispersion,
+                 'barras_sexo': construir_barras_sexo,
+                 'barras_temporalidad': construir_barras_temporalidad,
+                 'barras_renglon': construir_barras_renglon,
+                 'barras_reticula': construir_barras_reticula}
+
+# archivo (dentro de la carpeta de salida) con las huellas de las imágenes guardadas
+ARCHIVO_MANIFIESTO_GRAFICAS = 'graficas.manifiesto.json'
+
+# tamaño máximo (en bytes) de las imágenes registradas en el manifiesto antes de eliminar las que no se usan
+TAMANO_MAX_GRAFICAS = 200 * 1024**2
+
+# ------------------ Función que construye la figura de una especificación ------------------ #
+def construir_figura(especificacion):
+    """ 
+    Construye la figura descrita en una especificación del lote.
+
+    Parámetros:
+    ------------
+    especificacion : dict
+        Diccionario con la llave "nombre_salida" y, o bien la llave "figura" con una figura ya construida, 
+        o bien las llaves "tipo" (alguna de las llaves de CONSTRUCTORES) y "parametros" (diccionario con 
+        los parámetros de la función "construir_<tipo>").
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    if 'figura' in especificacion:
+        return especificacion['figura']
+
+    tipo = especificacion.get('tipo')
+    if tipo not in CONSTRUCTORES:
+        raise AssertionError("El tipo de gráfico '"+str(tipo)+"' no es válido, los tipos disponibles son: "+', '.join(CONSTRUCTORES))
+
+    return CONSTRUCTORES[tipo](**especificacion.get('parametros', {}))
+
+# ------------------ Funciones para la huella de los gráficos ------------------ #
+def _actualizar_huella(h, valor):
+    """ 
+    Agrega "valor" (DataFrame, Series, diccionario, lista, código o valor simple) a la huella "h".
+    """
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        d = valor.to_frame() if isinstance(valor, pd.Series) else valor
+        h.update(repr((type(valor).__name__, list(d.columns), [str(t) for t in d.dtypes])).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes())
+    elif isinstance(valor, dict):
+        for k in sorted(valor, key=str):
+            h.update(repr(k).encode('utf-8'))
+            _actualizar_huella(h, valor[k])
+    elif isinstance(valor, (list, tuple)):
+        h.update(('<'+str(len(valor))).encode('utf-8'))
+        for v in valor:
+            _actualizar_huella(h, v)
+    elif hasattr(valor, 'co_code'):
+        # el código de la función incluye sus constantes (colores, fuentes, tamaños, etc.)
+        h.update(valor.co_code)
+        _actualizar_huella(h, list(valor.co_consts))
+    elif hasattr(valor, '__code__'):
+        _actualizar_huella(h, valor.__code__)
+    else:
+        h.update(repr(valor).encode('utf-8'))
+
+def _dependencias(funcion):
+    """ 
+    Regresa las funciones de este módulo que usa "funcion", directa o indirectamente (incluida ella misma), y 
+    las constantes del módulo (nombres en mayúsculas) que consultan, en diccionarios ordenados por nombre.
+    """
+    funciones, constantes = {}, {}
+    pendientes = [funcion]
+    while pendientes:
+        f = pendientes.pop()
+        if f.__name__ in funciones:
+            continue
+        funciones[f.__name__] = f
+
+        # nombres globales del código de la función y de sus funciones internas, y sus valores predeterminados
+        nombres, codigos = set(), [f.__code__]
+        while codigos:
+            codigo = codigos.pop()
+            nombres.update(codigo.co_names)
+            codigos.extend(c for c in codigo.co_consts if hasattr(c, 'co_code'))
+        for nombre in sorted(nombres & set(globals())):
+            v = globals()[nombre]
+            v = getattr(v, '__wrapped__', v) if callable(v) else v  # funciones con lru_cache
+            if getattr(v, '__module__', None) == __name__ and hasattr(v, '__code__'):
+                pendientes.append(v)
+            elif isinstance(v, type) and v.__module__ == __name__:
+                # clases del módulo: se incluyen sus métodos
+                pendientes.extend(m for m in vars(v).values() if hasattr(m, '__code__'))
+            elif nombre.isupper() and not nombre.startswith('_'):
+                constantes[nombre] = v
+        constantes[f.__name__ + '.predeterminados'] = (f.__defaults__, f.__kwdefaults__)
+
+    return dict(sorted(funciones.items())), dict(sorted(constantes.items()))
+
+def huella_grafico(especificacion, formato='png', scale=3):
+    """ 
+    Regresa la huella (hash) de la imagen que produce una especificación del lote (ver "construir_figura").
+
+    Si la especificación tiene "tipo", la huella se calcula con los datos, los parámetros, el código de 
+    la función "construir_<tipo>" y de todas las funciones del módulo que usa (ver "_dependencias"), las constantes 
+    que consultan (colores, escalas, etc.) y la plantilla, sin construir la figura; si sólo tiene "figura", se calcula con la figura serializada. En ambos casos incluye la 
+    versión de plotly, el formato y la escala.
+
+    Regresa:
+    ------------
+    str
+        Huella de la imagen.
+    """
+    h = hashlib.sha1()
+    _actualizar_huella(h, (plotly.__version__, formato, scale))
+    if 'tipo' in especificacion:
+        if especificacion['tipo'] not in CONSTRUCTORES:
+            raise AssertionError("El tipo de gráfico '"+str(especificacion['tipo'])+"' no es válido, los tipos disponibles son: "+', '.join(CONSTRUCTORES))
+        funciones, constantes = _dependencias(CONSTRUCTORES[especificacion['tipo']])
+        _actualizar_huella(h, (especificacion['tipo'], funciones, constantes, especificacion.get('parametros', {})))
+        _actualizar_huella(h, pio.templates[registrar_plantilla()].to_plotly_json())
+    else:
+        h.update(especificacion['figura'].to_json().encode('utf-8'))
+    return h.hexdigest()[:16]
+
+# ------------------ Funciones del manifiesto de gráficos ------------------ #
+def leer_manifiesto_graficas(ruta_salida):
+    """ 
+    Lee el manifiesto de las imágenes guardadas en "ruta_salida". Regresa un diccionario vacío si no existe.
+    """
+    archivo = os.path.join(ruta_salida, ARCHIVO_MANIFIESTO_GRAFICAS)
+    if not os.path.exists(archivo):
+        return {}
+    with open(archivo, encoding='utf-8') as f:
+        return json.load(f)
+
+def depurar_graficas(ruta_salida, manifiesto, tamano_max=TAMANO_MAX_GRAFICAS, vigentes=()):
+    """ 
+    Elimina del manifiesto las imágenes que ya no existen y, si las imágenes registradas ocupan más de 
+    "tamano_max" bytes, elimina las usadas hace más tiempo (excepto las de "vigentes") hasta no rebasarlo.
+
+    Regresa:
+    ------------
+    list
+        Lista con los nombres de las imágenes eliminadas.
+    """
+    for a in [a for a in manifiesto if not os.path.exists(os.path.join(ruta_salida, a))]:
+        del manifiesto[a]
+
+    total = sum(e['bytes'] for e in manifiesto.values())
+    eliminadas = []
+    for a in sorted(manifiesto, key=lambda a: manifiesto[a]['usado']):
+        if total <= tamano_max:
+            break
+        if a in vigentes:
+            continue
+        os.remove(os.path.join(ruta_salida, a))
+        total -= manifiesto.pop(a)['bytes']
+        eliminadas.append(a)
+
+    return eliminadas
+
+def guardar_manifiesto_graficas(ruta_salida, manifiesto):
+    """ 
+    Guarda el manifiesto de las imágenes de "ruta_salida".
+    """
+    with open(os.path.join(ruta_salida, ARCHIVO_MANIFIESTO_GRAFICAS), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=4, ensure_ascii=False, sort_keys=True)
+
+# ------------------ Funciones del proceso de exportación ------------------ #
+def _iniciar_exportador():
+    """ 
+    Inicia el proceso de exportación de kaleido con una figura vacía, para que las
+    imágenes del lote no paguen el arranque del proceso.
+    """
+    pio.to_image(go.Figure(), format='png', width=10, height=10)
+
+def _exportar(tarea):
+    """ 
+    Exporta una figura (o su json) a cada una de las rutas indicadas.
+
+    Parámetros:
+    ------------
+    tarea : tuple
+        (figura o json de la figura, lista de parejas (ruta, formato), escala).
+
+    Regresa:
+    ------------
+    list
+        Lista de las rutas escritas.
+    """
+    fig, rutas, escala = tarea
+    if isinstance(fig, str):
+        fig = pio.from_json(fig)
+    for ruta, formato in rutas:
+        with open(ruta, 'wb') as f:
+            f.write(pio.to_image(fig, format=formato, scale=escala))
+    return [ruta for ruta, _ in rutas]
+
+# ------------------ Función que genera un lote de gráficos ------------------ #
+def renderizar_lote(especificaciones, formatos=('png',), ruta_salida='salidas-graficas', procesos=None, scale=3,
+                    cache=True, tamano_max=TAMANO_MAX_GRAFICAS):
+    """ 
+    Construye y guarda un lote de gráficos. Las figuras se construyen en este proceso y se exportan 
+    en paralelo en "procesos" procesos, cada uno con su exportador de kaleido iniciado una sola vez, 
+    en lugar de exportar cada gráfico por separado con "write_image".
+
+    Con "cache" sólo se construyen y exportan los gráficos cuya huella (ver "huella_grafico") no coincide 
+    con la registrada en el manifiesto de "ruta_salida", es decir, los de indicadores o estilos que cambiaron.
+
+    Parámetros:
+    ------------
+    especificaciones : list
+        Lista de especificaciones (ver "construir_figura") o de parejas (nombre_salida, figura).
+    formatos : tuple
+        Formatos en que se guardará cada gráfico ('png', 'svg' y/o 'pdf'). El valor predeterminado es ('png',).
+    ruta_salida : str
+        Carpeta donde se guardarán las imágenes. El valor predeterminado es 'salidas-graficas'.
+    procesos : int
+        Número de procesos de exportación. El valor predeterminado es None, el menor entre 4, 
+        el número de procesadores y el número de gráficos. Con 1 se exporta en este proceso.
+    scale : int
+        Escala de las imágenes. El valor predeterminado es 3.
+    cache : bool
+        Si es True se omiten los gráficos sin cambios. El valor predeterminado es True.
+    tamano_max : int
+        Tamaño máximo en bytes de las imágenes registradas en el manifiesto; al rebasarlo se eliminan 
+        las usadas hace más tiempo. El valor predeterminado es TAMANO_MAX_GRAFICAS (200 MB).
+
+    Regresa:
+    ------------
+    list
+        Lista con las rutas de las imágenes guardadas (no incluye las omitidas por no tener cambios).
+    """
+    formatos = (formatos,) if isinstance(formatos, str) else tuple(formatos)
+    invalidos = [f for f in formatos if f not in FORMATOS_IMAGEN]
+    if invalidos:
+        raise AssertionError('Formatos no válidos: '+', '.join(invalidos)+'. Los formatos disponibles son: '+', '.join(FORMATOS_IMAGEN))
+
+    os.makedirs(ruta_salida, exist_ok=True)
+    manifiesto = leer_manifiesto_graficas(ruta_salida) if cache else {}
+    ahora = time.time()
+
+    tareas, huellas, omitidas = [], {}, 0
+    for e in especificaciones:
+        if not isinstance(e, dict):
+            e = {'nombre_salida': e[0], 'figura': e[1]}
+
+        rutas = []
+        for f in formatos:
+            archivo = e['nombre_salida']+'.'+f
+            if cache:
+                huellas[archivo] = huella_grafico(e, f, scale)
+                registro = manifiesto.get(archivo)
+                if registro is not None and registro['huella'] == huellas[archivo] and os.path.exists(os.path.join(ruta_salida, archivo)):
+                    registro['usado'] = ahora
+                    omitidas += 1
+                    continue
+            rutas.append((os.path.join(ruta_salida, archivo), f))
+
+        if rutas:
+            tareas.append((construir_figura(e), rutas, scale))
+
+    if omitidas:
+        print('Se omitieron '+str(omitidas)+' imágenes sin cambios')
+
+    escritas = []
+    if tareas:
+        if procesos is None:
+            procesos = min(4, os.cpu_count() or 1, len(tareas))
+
+        if procesos == 1:
+            escritas = [_exportar(t) for t in tareas]
+        else:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_exportador) as ex:
+                escritas = list(ex.map(_exportar, [(fig.to_json(), rutas, escala) for fig, rutas, escala in tareas]))
+        escritas = [r for rutas in escritas for r in rutas]
+
+    if cache:
+        for r in escritas:
+            archivo = os.path.basename(r)
+            manifiesto[archivo] = {'huella': huellas[archivo], 'bytes': os.path.getsize(r), 'usado': ahora}
+        depurar_graficas(ruta_salida, manifiesto, tamano_max, vigentes=huellas)
+        guardar_manifiesto_graficas(ruta_salida, manifiesto)
+
+    return escritas
+
+# ------------------ Función que guarda un gráfico ------------------ #
+def guardar_grafico(tipo, parametros, nombre_salida, ruta_salida='salidas-graficas', formato='png', scale=3, cache=True):
+    """ 
+    Construye y guarda un gráfico del tipo "tipo" (alguna de las llaves de CONSTRUCTORES), omitiéndolo si 
+    ya está guardado con la misma huella (ver "renderizar_lote").
+
+    Regresa:
+    ------------
+    list
+        Lista con la ruta de la imagen guardada (vacía si no tuvo cambios).
+    """
+    return renderizar_lote([{'nombre_salida': nombre_salida, 'tipo': tipo, 'parametros': parametros}],
+                           formatos=(formato,), ruta_salida=ruta_salida, procesos=1, scale=scale, cache=cache)
+
+# ------------------ Tablero interactivo en un solo archivo ------------------ #
+# dimensiones que se pueden filtrar en el tablero y columnas de los tabulados que les corresponden
+DIMENSIONES_TABLERO = {'sexo': ['sexo'],
+                       'grupo_etario': ['grupo_etario'],
+                       'entidad': ['entidad', 'nom_ent']}
+
+COLORES_TABLERO = {'Mujer': '#714859', 'Mujeres': '#714859', 'Hombre': '#b38e5d', 'Hombres': '#b38e5d'}
+
+PLANTILLA_TABLERO = '''<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>__TITULO__</title>
+__PLOTLYJS__
+<style>
+body {font-family: Montserrat, sans-serif; color: rgb(36,36,36); margin: 20px;}
+#filtros {display: flex; flex-wrap: wrap; gap: 16px; margin-bottom: 12px;}
+#filtros label {display: flex; flex-direction: column; font-size: 13px;}
+#filtros select {font-size: 14px; min-width: 180px;}
+</style>
+</head>
+<body>
+<h2>__TITULO__</h2>
+<div id="filtros"></div>
+<div id="grafico"></div>
+<script type="application/json" id="datos">__DATOS__</script>
+<script>
+(function () {
+  var D = JSON.parse(document.getElementById('datos').textContent);
+  var nombres = {indicador: 'Indicador', eje: 'Desagregar por', sexo: 'Sexo', grupo_etario: 'Grupo etario', entidad: 'Entidad'};
+  var estado = {indicador: 0, eje: null};
+  var filtros = document.getElementById('filtros');
+  var selects = {};
+
+  function crearSelect(clave, opciones, alCambiar) {
+    var etiqueta = document.createElement('label');
+    etiqueta.textContent = nombres[clave];
+    var s = document.createElement('select');
+    opciones.forEach(function (o) {
+      var op = document.createElement('option');
+      op.value = o[0]; op.textContent = o[1]; s.appendChild(op);
+    });
+    s.addEventListener('change', alCambiar);
+    etiqueta.appendChild(s);
+    filtros.appendChild(etiqueta);
+    selects[clave] = s;
+    return s;
+  }
+
+  function dimensiones(ind) {
+    return Object.keys(D.dimensiones).filter(function (d) { return ind[d] !== undefined; });
+  }
+
+  function valores(ind, d) {
+    var vistos = {};
+    ind[d].forEach(function (c) { vistos[c] = true; });
+    return Object.keys(vistos).map(Number).sort(function (a, b) { return a - b; });
+  }
+
+  function armarFiltros() {
+    var ind = D.indicadores[estado.indicador];
+    filtros.innerHTML = '';
+    crearSelect('indicador', D.indicadores.map(function (x, i) { return [i, x.nombre]; }), function (e) {
+      estado.indicador = Number(e.target.value); estado.eje = null; armarFiltros();
+    }).value = estado.indicador;
+    var dims = dimensiones(ind);
+    if (estado.eje === null || dims.indexOf(estado.eje) < 0) {
+      estado.eje = dims.indexOf('entidad') >= 0 ? 'entidad' : (dims.indexOf('grupo_etario') >= 0 ? 'grupo_etario' : dims[0]);
+    }
+    crearSelect('eje', dims.map(function (d) { return [d, nombres[d]]; }), function (e) {
+      estado.eje = e.target.value; armarFiltros();
+    }).value = estado.eje;
+    dims.forEach(function (d) {
+      if (d === estado.eje) { return; }
+      var s = crearSelect(d, valores(ind, d).map(function (c) { return [c, D.dimensiones[d][c]]; }), dibujar);
+      if (estado[d] !== undefined && valores(ind, d).indexOf(estado[d]) >= 0) { s.value = estado[d]; }
+    });
+    dibujar();
+  }
+
+  function dibujar() {
+    var ind = D.indicadores[estado.indicador];
+    var dims = dimensiones(ind);
+    var fijos = dims.filter(function (d) { return d !== estado.eje; });
+    fijos.forEach(function (d) { estado[d] = Number(selects[d].value); });
+    var y = [], x = [], sup = [], inf = [], texto = [];
+    for (var i = 0; i < ind.n; i++) {
+      if (fijos.every(function (d) { return ind[d][i] === estado[d]; })) {
+        var v = ind.estimacion[i];
+        y.push(D.dimensiones[estado.eje][ind[estado.eje][i]]);
+        x.push(v);
+        sup.push(v === null || ind.ic_sup[i] === null ? null : ind.ic_sup[i] - v);
+        inf.push(v === null || ind.ic_inf[i] === null ? null : v - ind.ic_inf[i]);
+        texto.push(v === null ? '' : D.espaciado + v);
+      }
+    }
+    var color = D.colores[fijos.indexOf('sexo') >= 0 ? D.dimensiones.sexo[estado.sexo] : ''] || D.color;
+    var diseno = JSON.parse(JSON.stringify(D.diseno));
+    diseno.height = Math.max(400, 28 * y.length + 150);
+    diseno.yaxis = {categoryorder: 'array', categoryarray: y.slice().reverse(), linecolor: 'lightgray', ticks: '', automargin: true};
+    diseno.xaxis = {linecolor: 'lightgray', tickcolor: 'darkgray', title: {text: 'Porcentaje de las personas encuestadas'}};
+    Plotly.react('grafico', [{type: 'bar', orientation: 'h', x: x, y: y, text: texto, textposition: 'outside',
+                              marker: {color: color}, cliponaxis: false,
+                              error_x: {type: 'data', symmetric: false, array: sup, arrayminus: inf}}],
+                 diseno, {responsive: true});
+  }
+
+  armarFiltros();
+})();
+</script>
+</body>
+</html>
+'''
+
+# ------------------ Función que prepara los datos del tablero ------------------ #
+def datos_tablero(tabulados, decimales=2, espaciado=' '*4):
+    """ 
+    Prepara los datos compartidos del tablero: cada dimensión (ver DIMENSIONES_TABLERO) se guarda una sola 
+    vez como lista de etiquetas y cada indicador guarda, por columna, los códigos de sus etiquetas y sus 
+    estimaciones redondeadas.
+
+    Parámetros:
+    ------------
+    tabulados : dict
+        Diccionario {nombre del indicador: tabulado} o {nombre del indicador: [tabulados]}, por ejemplo 
+        el tabulado nacional y el estatal de un indicador; los renglones sin entidad se etiquetan como "Nacional".
+    decimales : int
+        Número de decimales de las estimaciones. El valor predeterminado es 2.
+    espaciado : str
+        Espacios en blanco entre la barra y el valor de la barra. El valor predeterminado es ' '*4.
+
+    Regresa:
+    ------------
+    dict
+        Datos del tablero (se guardan como json).
+    """
+    dimensiones = {d: {} for d in DIMENSIONES_TABLERO}
+    indicadores = []
+    for nombre, tabs in tabulados.items():
+        tabs = [tabs] if isinstance(tabs, pd.DataFrame) else list(tabs)
+
+        partes = []
+        for t in tabs:
+            t = t.reset_index(drop=True)
+            parte = pd.DataFrame(index=t.index)
+            for d, columnas in DIMENSIONES_TABLERO.items():
+                columna = next((c for c in columnas if c in t.columns), None)
+                if columna is not None:
+                    parte[d] = t[columna].astype(str)
+                elif d == 'entidad' and len(tabs) > 1:
+                    parte[d] = 'Nacional'
+            for c in ['estimacion', 'ic_inf', 'ic_sup']:
+                parte[c] = t[c].round(decimales) if c in t.columns else np.nan
+            partes.append(parte)
+        d_ind = pd.concat(partes, ignore_index=True)
+
+        ind = {'nombre': str(nombre), 'n': len(d_ind)}
+        for d in DIMENSIONES_TABLERO:
+            if d in d_ind.columns:
+                # los códigos son compartidos entre indicadores: cada etiqueta se guarda una sola vez
+                etiquetas = dimensiones[d]
+                for v in pd.unique(d_ind[d]):
+                    etiquetas.setdefault(v, len(etiquetas))
+                ind[d] = d_ind[d].map(etiquetas).tolist()
+        for c in ['estimacion', 'ic_inf', 'ic_sup']:
+            ind[c] = d_ind[c].astype(object).where(d_ind[c].notna(), None).tolist()
+        indicadores.append(ind)
+
+    return {'dimensiones': {d: list(e) for d, e in dimensiones.items()},
+            'indicadores': indicadores,
+            'colores': COLORES_TABLERO,
+            'color': COLORES_TEMPORALIDAD[0],
+            'espaciado': espaciado,
+            'diseno': dict(pio.templates[registrar_plantilla()].layout.to_plotly_json(), width=None, autosize=True,
+                           margin=dict(l=10, r=60, t=20, b=60))}
+
+# ------------------ Función que exporta el tablero interactivo ------------------ #
+def exportar_tablero(tabulados, titulo_salida, ruta_salida='salidas-graficas', titulo=None, decimales=2, incluir_plotlyjs=True):
+    """ 
+    Exporta un tablero interactivo en un solo archivo html: plotly.js se incluye una sola vez, todos los 
+    tabulados van en un mismo json compacto (ver "datos_tablero") y los gráficos se construyen en el 
+    navegador, con filtros de indicador, sexo, grupo etario y entidad que cambian la vista sin recargar.
+
+    Parámetros:
+    ------------
+    tabulados : dict
+        Diccionario {nombre del indicador: tabulado o lista de tabulados} (ver "datos_tablero").
+    titulo_salida : str
+        Nombre del archivo html (sin extensión).
+    ruta_salida : str
+        Carpeta donde se guardará el tablero. El valor predeterminado es 'salidas-graficas'.
+    titulo : str
+        Título del tablero. El valor predeterminado es None, se usa "titulo_salida".
+    decimales : int
+        Número de decimales de las estimaciones. El valor predeterminado es 2.
+    incluir_plotlyjs : bool o str
+        Si es True se incluye plotly.js en el archivo (funciona sin conexión); si es 'cdn' se carga desde la red.
+        El valor predeterminado es True.
+
+    Regresa:
+    ------------
+    str
+        Ruta del tablero.
+    """
+    if incluir_plotlyjs == 'cdn':
+        script = '<script src="https://cdn.plot.ly/plotly-'+plotly.offline.get_plotlyjs_version()+'.min.js" charset="utf-8"></script>'
+    elif incluir_plotlyjs is True:
+        script = '<script type="text/javascript">'+plotly.offline.get_plotlyjs()+'</script>'
+    else:
+        raise AssertionError("incluir_plotlyjs debe ser True o 'cdn'")
+
+    datos = json.dumps(datos_tablero(tabulados, decimales), ensure_ascii=False, separators=(',', ':'))
+    titulo = titulo_salida if titulo is None else titulo
+    titulo = titulo.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    html = (PLANTILLA_TABLERO.replace('__TITULO__', titulo)
+                             .replace('__DATOS__', datos.replace('</', '<\\/'))
+                             .replace('__PLOTLYJS__', script))
+
+    os.makedirs(ruta_salida, exist_ok=True)
+    ruta = os.path.join(ruta_salida, titulo_salida+'.html')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    return ruta
+
+# ------------------ Mapas de coropletas ------------------ #
+# tolerancias de simplificación (en grados) que se guardan para cada archivo de geometrías, 0 es la geometría completa
+TOLERANCIAS_MAPA = (0.0, 0.005, 0.02)
+
+ESCALA_MAPA = ['#f2ebe0', '#d4c19c', '#b38e5d', '#714859']
+
+# renglones de los tabulados que se dibujan en los mapas
+FILTRO_MAPA = {'sexo': 'Mujeres y hombres', 'grupo_etario': 'Población total'}
+
+# geometrías ya cargadas en la sesión, por (ruta, var_clave, tolerancias)
+_GEOMETRIAS = {}
+
+# ------------------ Función que simplifica un anillo ------------------ #
+def simplificar_anillo(puntos, tolerancia):
+    """ 
+    Simplifica un anillo (o línea) con el algoritmo de Douglas-Peucker: conserva los extremos y, en cada 
+    tramo, el punto más alejado del segmento que los une si está a más de "tolerancia"; las distancias de 
+    cada tramo se calculan de una sola vez con numpy.
+
+    Parámetros:
+    ------------
+    puntos : ndarray
+        Arreglo de (n, 2) con las coordenadas (longitud, latitud).
+    tolerancia : float
+        Distancia máxima (en grados) entre la geometría original y la simplificada.
+
+    Regresa:
+    ------------
+    ndarray
+        Arreglo con los puntos conservados. Si quedan menos de 4 puntos se regresa el anillo original.
+    """
+    n = len(puntos)
+    if tolerancia <= 0 or n <= 4:
+        return puntos
+
+    conservar = np.zeros(n, dtype=bool)
+    conservar[[0, n-1]] = True
+    pila = [(0, n-1)]
+    while pila:
+        i, j = pila.pop()
+        if j - i < 2:
+            continue
+        a = puntos[i]
+        d = puntos[j] - a
+        tramo = puntos[i+1:j] - a
+        norma = np.hypot(d[0], d[1])
+        if norma == 0:
+            # anillo cerrado: el segmento es un punto
+            distancia = np.hypot(tramo[:, 0], tramo[:, 1])
+        else:
+            distancia = np.abs(d[0]*tramo[:, 1] - d[1]*tramo[:, 0]) / norma
+        k = int(np.argmax(distancia))
+        if distancia[k] > tolerancia:
+            k += i + 1
+            conservar[k] = True
+            pila += [(i, k), (k, j)]
+
+    return puntos[conservar] if conservar.sum() >= 4 else puntos
+
+# ------------------ Clase con las geometrías simplificadas ------------------ #
+class Geometrias:
+    """ 
+    Geometrías (entidades o municipios) simplificadas a varias tolerancias, en arreglos compactos:
+
+    - claves: clave de cada geometría.
+    - poligono_entidad: geometría a la que pertenece cada polígono.
+    - anillo_poligono: polígono al que pertenece cada anillo (el primero de cada polígono es el exterior).
+    - coordenadas[t] y cortes[t]: coordenadas (longitud, latitud) de todos los anillos con la tolerancia t 
+      y dónde empieza cada anillo.
+
+    Se crean con "cargar_geometrias".
+    """
+    def __init__(self, claves, poligono_entidad, anillo_poligono, coordenadas, cortes, huella):
+        self.claves = claves
+        self.poligono_entidad = poligono_entidad
+        self.anillo_poligono = anillo_poligono
+        self.coordenadas = coordenadas
+        self.cortes = cortes
+        self.huella = huella
+        self.tolerancias = tuple(sorted(coordenadas))
+        self.posiciones = {c: i for i, c in enumerate(claves.tolist())}
+        self._trazos = {}
+
+    def __repr__(self):
+        # la representación se usa en la huella de los gráficos (ver "huella_grafico")
+        return 'Geometrias(' + self.huella + ')'
+
+    def tolerancia(self, tolerancia=None):
+        """ 
+        Regresa la tolerancia guardada más cercana a "tolerancia" (la más simplificada si es None).
+        """
+        if tolerancia is None:
+            return self.tolerancias[-1]
+        return min(self.tolerancias, key=lambda t: abs(t - tolerancia))
+
+    def trazos(self, tolerancia=None):
+        """ 
+        Regresa, para cada geometría, sus anillos proyectados (Mercator) en un solo arreglo de (n, 2) con 
+        renglones NaN entre anillos, listo para dibujarse con plotly. La proyección se calcula una sola vez 
+        por tolerancia y se comparte entre todos los mapas.
+        """
+        t = self.tolerancia(tolerancia)
+        if t not in self._trazos:
+            c = self.coordenadas[t].astype(float)
+            proyectadas = np.column_stack([np.radians(c[:, 0]), np.log(np.tan(np.pi/4 + np.radians(c[:, 1])/2))])
+
+            # un renglón NaN después de cada anillo
+            cortes = self.cortes[t]
+            n_anillos = len(cortes) - 1
+            trazo = np.full((len(proyectadas) + n_anillos, 2), np.nan)
+            destino = np.arange(len(proyectadas)) + np.repeat(np.arange(n_anillos), np.diff(cortes))
+            trazo[destino] = proyectadas
+
+            entidad_anillo = self.poligono_entidad[self.anillo_poligono]
+            limites = np.concatenate([[0], np.cumsum(np.bincount(entidad_anillo, minlength=len(self.claves)))])
+            inicio = cortes[limites[:-1]] + limites[:-1]
+            fin = cortes[limites[1:]] + limites[1:]
+            self._trazos[t] = [trazo[a:b] for a, b in zip(inicio, fin)]
+        return self._trazos[t]
+
+def normalizar_claves(claves):
+    """ 
+    Convierte las claves a enteros si todas son numéricas (por ejemplo '01' y 1 son la misma entidad).
+    """
+    claves = pd.Series(claves).astype(str).str.strip()
+    if claves.str.fullmatch('[0-9]+').all():
+        return claves.astype(np.int64).to_numpy()
+    return claves.to_numpy()
+
+# ------------------ Función que carga las geometrías ------------------ #
+def cargar_geometrias(ruta=os.path.join('datos','auxiliares','entidades.geojson'), var_clave='CVE_ENT', tolerancias=TOLERANCIAS_MAPA, ruta_cache=None):
+    """ 
+    Carga un archivo GeoJSON de entidades (o municipios) y lo simplifica a cada una de las "tolerancias". 
+    El resultado se guarda en un archivo npz junto al GeoJSON, que se usa mientras el GeoJSON y las 
+    tolerancias no cambien, y en memoria, de modo que en una sesión el archivo se lee una sola vez.
+
+    Parámetros:
+    ------------
+    ruta : str
+        Ruta del archivo GeoJSON. El valor predeterminado es "datos/auxiliares/entidades.geojson".
+    var_clave : str
+        Propiedad de cada geometría con su clave (por ejemplo 'CVE_ENT' o 'CVEGEO'). El valor predeterminado es 'CVE_ENT'.
+    tolerancias : tuple
+        Tolerancias de simplificación en grados. El valor predeterminado es TOLERANCIAS_MAPA.
+    ruta_cache : str
+        Ruta del archivo npz. El valor predeterminado es None, "<ruta sin extensión>.geometrias.npz".
+
+    Regresa:
+    ------------
+    Geometrias
+        Geometrías simplificadas.
+    """
+    tolerancias = tuple(sorted(set(float(t) for t in tolerancias)))
+    llave = (os.path.abspath(ruta), var_clave, tolerancias)
+    if llave in _GEOMETRIAS:
+        return _GEOMETRIAS[llave]
+
+    ruta_cache = os.path.splitext(ruta)[0] + '.geometrias.npz' if ruta_cache is None else ruta_cache
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    huella = hashlib.sha1(contenido + repr((var_clave, tolerancias)).encode('utf-8')).hexdigest()[:16]
+
+    if os.path.exists(ruta_cache):
+        with np.load(ruta_cache, allow_pickle=False) as z:
+            if str(z['huella']) == huella:
+                geo = Geometrias(z['claves'], z['poligono_entidad'], z['anillo_poligono'],
+                                 {t: z['coordenadas_'+str(i)] for i, t in enumerate(tolerancias)},
+                                 {t: z['cortes_'+str(i)] for i, t in enumerate(tolerancias)}, huella)
+                _GEOMETRIAS[llave] = geo
+                return geo
+
+    claves, poligono_entidad, anillo_poligono, anillos = [], [], [], []
+    for feature in json.loads(contenido)['features']:
+        geometria = feature['geometry']
+        if geometria is None:
+            continue
+        poligonos = [geometria['coordinates']] if geometria['type'] == 'Polygon' else geometria['coordinates']
+        for poligono in poligonos:
+            for anillo in poligono:
+                anillo_poligono.append(len(poligono_entidad))
+                anillos.append(np.asarray(anillo, dtype=float)[:, :2])
+            poligono_entidad.append(len(claves))
+        claves.append(feature['properties'][var_clave])
+
+    coordenadas, cortes = {}, {}
+    for t in tolerancias:
+        simplificados = [simplificar_anillo(a, t) for a in anillos]
+        coordenadas[t] = np.concatenate(simplificados).astype(np.float32)
+        cortes[t] = np.concatenate([[0], np.cumsum([len(a) for a in simplificados])]).astype(np.int64)
+
+    geo = Geometrias(normalizar_claves(claves), np.asarray(poligono_entidad, dtype=np.int32), 
+                     np.asarray(anillo_poligono, dtype=np.int32), coordenadas, cortes, huella)
+
+    arreglos = {'huella': np.array(huella), 'claves': geo.claves, 'poligono_entidad': geo.poligono_entidad, 
+                'anillo_poligono': geo.anillo_poligono}
+    for i, t in enumerate(tolerancias):
+        arreglos['coordenadas_'+str(i)] = coordenadas[t]
+        arreglos['cortes_'+str(i)] = cortes[t]
+    np.savez_compressed(ruta_cache, **arreglos)
+
+    _GEOMETRIAS[llave] = geo
+    return geo
+
+# ------------------ Función que construye un mapa de coropletas ------------------ #
+def filtrar_tabulado(d, filtro):
+    """
+    Regresa los renglones del tabulado "d" que se dibujan en el mapa: los que tienen los valores de "filtro" 
+    (las columnas de "filtro" que no están en el tabulado se ignoran).
+    """
+    for c, v in filtro.items():
+        if c in d.columns:
+            d = d[d[c] == v]
+    return d
+
+def construir_mapa(geometrias, d, var_union='clave_entidad_dai', var_valor='estimacion', tolerancia=None, titulo='', 
+                   filtro=FILTRO_MAPA, rango=None, clases=5):
+    """ 
+    Construye el mapa de coropletas de un tabulado estatal (o municipal), uniendo sus renglones con las 
+    geometrías por "var_union". Los valores se agrupan en "clases" intervalos iguales y cada clase es una 
+    sola traza con los polígonos proyectados de sus geometrías (ver "Geometrias.trazos"), por lo que el 
+    mapa no depende de los mapas base de plotly.
+
+    Parámetros:
+    ------------
+    geometrias : Geometrias
+        Geometrías cargadas con "cargar_geometrias".
+    d : DataFrame
+        Tabulado.
+    var_union : str
+        Columna del tabulado con la clave de la geometría. El valor predeterminado es 'clave_entidad_dai'.
+    var_valor : str
+        Columna con el valor que se representa. El valor predeterminado es 'estimacion'.
+    tolerancia : float
+        Tolerancia de simplificación (se usa la guardada más cercana). El valor predeterminado es None, la más simplificada.
+    titulo : str
+        Título del mapa.
+    filtro : dict
+        Valores de las columnas del tabulado con los que se seleccionan los renglones del mapa; se ignoran 
+        las columnas que el tabulado no tiene. El valor predeterminado es el total de mujeres y hombres y de la población.
+    rango : tuple
+        Valores mínimo y máximo de la escala de colores. El valor predeterminado es None, el rango de los datos.
+    clases : int
+        Número de intervalos de la escala de colores. El valor predeterminado es 5.
+
+    Regresa:
+    ------------
+    Figure
+        Figura de plotly.
+    """
+    from plotly.colors import sample_colorscale
+
+    d = filtrar_tabulado(d, filtro)
+
+    claves = normalizar_claves(d[var_union])
+    faltantes = set(claves.tolist()) - set(geometrias.posiciones)
+    if faltantes:
+        print('Las claves '+', '.join(map(str, sorted(faltantes)))+' no tienen geometría')
+
+    # valor de cada geometría (NaN si el tabulado no la tiene)
+    valores = np.full(len(geometrias.claves), np.nan)
+    posiciones = np.array([geometrias.posiciones.get(c, -1) for c in claves.tolist()], dtype=np.int64)
+    valores[posiciones[posiciones >= 0]] = d[var_valor].to_numpy(dtype=float)[posiciones >= 0]
+
+    if rango is None:
+        if np.isnan(valores).all():
+            print('El tabulado no tiene valores para ninguna geometría, el mapa sólo muestra "Sin dato"')
+            rango = (0.0, 1.0)
+        else:
+            rango = (np.nanmin(valores), np.nanmax(valores))
+    cortes = np.linspace(rango[0], rango[1], clases + 1)
+    clase = np.clip(np.searchsorted(cortes, valores, side='right') - 1, 0, clases - 1)
+    clase[np.isnan(valores)] = -1
+    colores = sample_colorscale(ESCALA_MAPA, clases) if clases > 1 else [ESCALA_MAPA[-1]]
+
+    trazos = geometrias.trazos(tolerancia)
+    datos = []
+    for k in range(-1, clases):
+        miembros = np.flatnonzero(clase == k)
+        if len(miembros) == 0:
+            continue
+        xy = np.concatenate([trazos[m] for m in miembros])
+        nombre = 'Sin dato' if k == -1 else '{:.1f} – {:.1f}'.format(cortes[k], cortes[k+1])
+        datos.append(go.Scatter(x=xy[:, 0], y=xy[:, 1], mode='lines', fill='toself', name=nombre, hoverinfo='skip',
+                                fillcolor='lightgray' if k == -1 else colores[k], line=dict(color='white', width=0.5)))
+
+    fig = go.Figure(data=datos,
+                    layout=dict(template=registrar_plantilla(), height=600, width=900, title=dict(text=titulo, x=0.5),
+                                legend=dict(title='Porcentaje', traceorder='reversed', x=0.02, y=0.05, yanchor='bottom'),
+                                margin=dict(l=10, r=10, t=60 if titulo else 10, b=10),
+                                xaxis=dict(visible=False), yaxis=dict(visible=False, scaleanchor='x')))
+
+    return fig
+
+CONSTRUCTORES['mapa'] = construir_mapa
+
+# ------------------ Función que genera un lote de mapas ------------------ #
+def mapas_lote(tabulados, geometrias=None, formatos=('png',), ruta_salida='salidas-graficas', rango_comun=False, 
+               procesos=None, scale=3, cache=True, **parametros):
+    """ 
+    Genera los mapas de coropletas de varios indicadores con las mismas geometrías (cargadas y simplificadas 
+    una sola vez) y los guarda con "renderizar_lote".
+
+    Parámetros:
+    ------------
+    tabulados : dict
+        Diccionario {nombre_salida: tabulado}.
+    geometrias : Geometrias
+        Geometrías cargadas con "cargar_geometrias". El valor predeterminado es None, las entidades de 
+        "datos/auxiliares/entidades.geojson".
+    formatos, ruta_salida, procesos, scale, cache
+        Ver "renderizar_lote".
+    rango_comun : bool
+        Si es True todos los mapas usan la misma escala de colores, para que sean comparables; el rango se toma de los 
+        renglones que pasan el "filtro". El valor predeterminado es False.
+    **parametros
+        Parámetros de "construir_mapa" (var_union, var_valor, tolerancia, filtro, etc.). El título de cada mapa es "nombre_salida" 
+        si no se indica.
+
+    Regresa:
+    ------------
+    list
+        Lista con las rutas de las imágenes guardadas.
+    """
+    geometrias = cargar_geometrias() if geometrias is None else geometrias
+
+    # el rango común se toma sólo de los renglones que se dibujan (ver "filtrar_tabulado")
+    if rango_comun:
+        var_valor = parametros.get('var_valor', 'estimacion')
+        filtro = parametros.get('filtro', FILTRO_MAPA)
+        valores = pd.concat([filtrar_tabulado(d, filtro)[var_valor] for d in tabulados.values()])
+        if valores.notna().any():
+            parametros['rango'] = (float(valores.min()), float(valores.max()))
+
+    especificaciones = [{'nombre_salida': nombre, 'tipo': 'mapa', 
+                         'parametros': dict({'titulo': nombre}, **parametros, geometrias=geometrias, d=d)}
+                        for nombre, d in tabulados.items()]
+
+    return renderizar_lote(especificaciones, formatos=formatos, ruta_salida=ruta_salida, procesos=procesos, scale=scale, cache=cache)
\ No newline at end of file
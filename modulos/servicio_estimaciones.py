@@ -0,0 +1,437 @@
+'''
+Este archivo contiene un servicio HTTP local para consultar estimaciones de la encuesta (una pregunta o
+un conjunto de preguntas, desagregadas por otras variables) sin tener que abrir un notebook.
+
+La base limpia se lee una sola vez al iniciar: cada proceso de cálculo la conserva en memoria. Las consultas
+se responden, en este orden, desde el almacén de estimaciones precalculadas, desde la memoria de resultados
+recientes (LRU) o calculándolas en el grupo de procesos.
+
+Uso:
+    python -m modulos.servicio_estimaciones --base datos/limpios/encodat_2016_2017.parquet
+
+Consultas (GET, la respuesta es json):
+    /proporciones?pregunta=ds9&des=ds8,sexo&alp=0.95
+    /prevalencias?vars=di1a,di1b&dicc=1:1,2:0,9:0&des=sexo
+    /estado
+'''
+import os
+import json
+import time
+import hashlib
+import asyncio
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+# ------------------ Lectura de la base limpia ------------------ #
+def cargar_base(ruta, columnas=None):
+    """
+    Lee la base limpia de acuerdo con la extensión del archivo (parquet, feather, pkl o csv).
+
+    Parámetros:
+    ------------
+    ruta: str
+        Ruta del archivo con la base limpia.
+    columnas: list
+        Lista con las columnas a leer. El valor predeterminado es None, todas.
+
+    Regresa:
+    ------------
+    DataFrame
+        Base limpia.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.parquet':
+        return pd.read_parquet(ruta, columns=columnas)
+    if extension == '.feather':
+        return pd.read_feather(ruta, columns=columnas)
+    if extension in ['.pkl', '.pickle']:
+        b = pd.read_pickle(ruta)
+        return b if columnas is None else b[columnas]
+    return pd.read_csv(ruta, usecols=columnas, low_memory=False)
+
+def columnas_base(ruta):
+    """
+    Regresa los nombres de las columnas de la base limpia sin leer los datos (salvo en archivos pkl).
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.read_schema(ruta).names
+    if extension in ['.pkl', '.pickle', '.feather']:
+        return list(cargar_base(ruta).columns)
+    return list(pd.read_csv(ruta, nrows=0).columns)
+
+# ------------------ Consultas ------------------ #
+def leer_dicc(texto):
+    """
+    Convierte un texto "1:1,2:0,9:0" en el diccionario {1: 1, 2: 0, 9: 0}.
+    """
+    dicc = {}
+    for par in filter(None, texto.split(',')):
+        clave, _, valor = par.partition(':')
+        clave = clave.strip()
+        dicc[int(clave) if clave.lstrip('-').isdigit() else clave] = int(valor)
+    return dicc
+
+def normalizar_consulta(tipo, parametros):
+    """
+    Valida los parámetros de una consulta y la regresa en forma canónica, de modo que dos consultas
+    equivalentes tienen la misma clave (ver "clave_consulta").
+
+    Parámetros:
+    ------------
+    tipo: str
+        'proporciones' o 'prevalencias'.
+    parametros: dict
+        Parámetros de la consulta (cada valor es un texto).
+
+    Regresa:
+    ------------
+    dict
+        Consulta canónica.
+    """
+    lista = lambda texto: [v.strip() for v in texto.split(',') if v.strip()]
+    des = lista(parametros.get('des', ''))
+    alp = float(parametros.get('alp', 0.95))
+    if not 0 < alp < 1:
+        raise AssertionError("El valor de 'alp' debe estar entre 0 y 1")
+
+    if tipo == 'proporciones':
+        if 'pregunta' not in parametros:
+            raise AssertionError("Es necesario indicar la 'pregunta'")
+        return {'tipo': tipo, 'pregunta': parametros['pregunta'].strip(), 'des': des, 'alp': alp}
+
+    if tipo == 'prevalencias':
+        if 'vars' not in parametros:
+            raise AssertionError("Es necesario indicar las variables en 'vars'")
+        dicc = leer_dicc(parametros.get('dicc', ''))
+        return {'tipo': tipo, 'vars': lista(parametros['vars']), 'des': des, 'alp': alp,
+                'dicc': sorted(([c, v] for c, v in dicc.items()), key=lambda x: str(x[0]))}
+
+    raise KeyError(tipo)
+
+def variables_consulta(consulta):
+    """
+    Regresa la lista de variables de la base que utiliza la consulta.
+    """
+    if consulta['tipo'] == 'proporciones':
+        return [consulta['pregunta']] + consulta['des']
+    return consulta['vars'] + consulta['des']
+
+def clave_consulta(consulta):
+    """
+    Regresa la clave (texto) de una consulta canónica.
+    """
+    return json.dumps(consulta, sort_keys=True, ensure_ascii=False)
+
+def huella_base(ruta_base, ponderador='factor_exp', estrato='estrato', upm='upm'):
+    """
+    Regresa la huella del archivo de la base limpia (su contenido, incluidos los factores de expansión) y de 
+    las columnas del diseño con las que se estima. Cambia al volver a limpiar o calibrar la base.
+    """
+    h = hashlib.sha1(json.dumps([ponderador, estrato, upm]).encode('utf-8'))
+    with open(ruta_base, 'rb') as fp:
+        for bloque in iter(lambda: fp.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+# ------------------ Cálculo en los procesos ------------------ #
+_BASE = None
+_DISENO = {}
+
+def _inicializar_proceso(ruta_base, ponderador, estrato, upm):
+    """
+    Lee la base limpia en el proceso de cálculo (una sola vez por proceso).
+    """
+    global _BASE, _DISENO
+    _BASE = cargar_base(ruta_base)
+    _DISENO = {'ponderador': ponderador, 'estrato': estrato, 'upm': upm}
+
+def _calcular(consulta):
+    """
+    Calcula una consulta canónica con las funciones de func_analisis y regresa el resultado en json.
+    """
+    from modulos.func_analisis import proporciones, proporciones_des, prevalencias, prevalencias_des
+
+    b, alp, des = _BASE, consulta['alp'], consulta['des']
+    if consulta['tipo'] == 'proporciones':
+        if des:
+            r = proporciones_des(b, consulta['pregunta'], des, alp, **_DISENO)
+        else:
+            r = proporciones(b, consulta['pregunta'], alp, **_DISENO)
+    else:
+        dicc = {c: v for c, v in consulta['dicc']}
+        if des:
+            r = prevalencias_des(b, consulta['vars'], dicc, des, alp, **_DISENO)
+        else:
+            r = prevalencias(b, consulta['vars'], dicc, alp, **_DISENO)
+
+    return r.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+# ------------------ Almacén de estimaciones precalculadas ------------------ #
+class AlmacenEstimaciones:
+    """
+    Almacén de estimaciones precalculadas en un archivo json por línea ({"clave": ..., "datos": [...]}).
+
+    La primera línea del archivo ({"huella": ...}) guarda la huella de la base y del diseño con los que se
+    calcularon las estimaciones (ver "huella_base"); al vincular el almacén con otra base se descarta.
+    Al iniciar se lee completo en un diccionario indexado por la clave de la consulta, con los resultados
+    ya codificados, de modo que una consulta precalculada se responde sin volver a serializar.
+
+    Parámetros:
+    ------------
+    ruta: str
+        Ruta del archivo del almacén. Si es None, el almacén está vacío y no se guarda.
+    """
+    def __init__(self, ruta=None):
+        self.ruta = ruta
+        self.huella = None
+        self.resultados = {}
+        if ruta and os.path.exists(ruta):
+            with open(ruta, encoding='utf-8') as fp:
+                for linea in fp:
+                    if linea.strip():
+                        registro = json.loads(linea)
+                        if 'huella' in registro:
+                            self.huella = registro['huella']
+                        else:
+                            self.resultados[registro['clave']] = json.dumps(registro['datos'], ensure_ascii=False).encode('utf-8')
+
+    def vincular(self, huella):
+        """
+        Vincula el almacén con la base de huella "huella". Si las estimaciones guardadas se calcularon con otra
+        base (o con una versión anterior del almacén, sin huella), se descartan.
+        """
+        if self.huella == huella:
+            return
+        if self.resultados:
+            print("Se descartan "+str(len(self.resultados))+" estimaciones precalculadas que no corresponden a la base actual")
+        self.huella = huella
+        self.resultados = {}
+        if self.ruta:
+            with open(self.ruta, 'w', encoding='utf-8') as fp:
+                fp.write(json.dumps({'huella': huella}) + '\n')
+
+    def __contains__(self, clave):
+        return clave in self.resultados
+
+    def __len__(self):
+        return len(self.resultados)
+
+    def obtener(self, clave):
+        return self.resultados.get(clave)
+
+    def agregar(self, clave, datos):
+        """
+        Agrega un resultado (json codificado) al almacén y al archivo.
+        """
+        self.resultados[clave] = datos
+        if self.ruta:
+            with open(self.ruta, 'a', encoding='utf-8') as fp:
+                fp.write('{"clave": ' + json.dumps(clave, ensure_ascii=False) + ', "datos": ' + datos.decode('utf-8') + '}\n')
+
+# ------------------ Servicio ------------------ #
+class ServicioEstimaciones:
+    """
+    Servicio HTTP de estimaciones.
+
+    Parámetros:
+    ------------
+    ruta_base: str
+        Ruta del archivo con la base limpia.
+    almacen: AlmacenEstimaciones
+        Almacén de estimaciones precalculadas.
+    procesos: int
+        Número de procesos de cálculo.
+    capacidad_cache: int
+        Número máximo de resultados recientes en memoria.
+    ponderador, estrato, upm: str
+        Nombres de las columnas del diseño muestral.
+    """
+    def __init__(self, ruta_base, almacen=None, procesos=2, capacidad_cache=256,
+                 ponderador='factor_exp', estrato='estrato', upm='upm'):
+        self.columnas = set(columnas_base(ruta_base))
+        faltantes = [v for v in [ponderador, estrato, upm] if v not in self.columnas]
+        if faltantes:
+            raise AssertionError("Las variables del diseño "+str(faltantes)+" no están en la base")
+
+        self.almacen = almacen if almacen is not None else AlmacenEstimaciones()
+        self.almacen.vincular(huella_base(ruta_base, ponderador, estrato, upm))
+        self.capacidad_cache = capacidad_cache
+        self.cache = OrderedDict()
+        self.en_curso = {}
+        self.contadores = {'precalculado': 0, 'cache': 0, 'calculado': 0}
+        self.ejecutor = ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                            initargs=(ruta_base, ponderador, estrato, upm))
+
+    def validar(self, consulta):
+        faltantes = [v for v in variables_consulta(consulta) if v not in self.columnas]
+        if faltantes:
+            raise AssertionError("Las variables "+str(faltantes)+" no están en la base")
+
+    def guardar_cache(self, clave, datos):
+        self.cache[clave] = datos
+        self.cache.move_to_end(clave)
+        while len(self.cache) > self.capacidad_cache:
+            self.cache.popitem(last=False)
+
+    async def estimar(self, consulta):
+        """
+        Regresa el resultado de una consulta canónica (json codificado) y su origen.
+        """
+        clave = clave_consulta(consulta)
+
+        datos = self.almacen.obtener(clave)
+        if datos is not None:
+            return datos, 'precalculado'
+
+        if clave in self.cache:
+            self.cache.move_to_end(clave)
+            return self.cache[clave], 'cache'
+
+        # las consultas iguales que llegan al mismo tiempo comparten el cálculo
+        futuro = self.en_curso.get(clave)
+        if futuro is None:
+            self.validar(consulta)
+            futuro = asyncio.get_running_loop().run_in_executor(self.ejecutor, _calcular, consulta)
+            self.en_curso[clave] = futuro
+            try:
+                datos = await futuro
+            finally:
+                self.en_curso.pop(clave, None)
+            self.guardar_cache(clave, datos)
+        else:
+            datos = await futuro
+
+        return datos, 'calculado'
+
+    async def precalcular(self, consultas):
+        """
+        Calcula y guarda en el almacén las consultas que todavía no están en él.
+        """
+        pendientes = []
+        for tipo, parametros in consultas:
+            consulta = normalizar_consulta(tipo, parametros)
+            if clave_consulta(consulta) not in self.almacen:
+                self.validar(consulta)
+                pendientes.append(consulta)
+
+        ciclo = asyncio.get_running_loop()
+        resultados = await asyncio.gather(*[ciclo.run_in_executor(self.ejecutor, _calcular, c) for c in pendientes])
+        for consulta, datos in zip(pendientes, resultados):
+            self.almacen.agregar(clave_consulta(consulta), datos)
+
+        return len(pendientes)
+
+    async def atender(self, lector, escritor):
+        """
+        Atiende una conexión HTTP (una solicitud GET por conexión).
+        """
+        try:
+            linea = (await lector.readline()).decode('latin-1').split()
+            while (await lector.readline()) not in [b'\r\n', b'\n', b'']:
+                pass
+
+            if len(linea) < 2 or linea[0] != 'GET':
+                estado, cuerpo = 405, {'error': 'sólo se admiten solicitudes GET'}
+            else:
+                estado, cuerpo = await self.responder(linea[1])
+        except Exception as e:
+            estado, cuerpo = 500, {'error': str(e)}
+
+        if isinstance(cuerpo, dict):
+            cuerpo = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8')
+
+        motivos = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+        escritor.write(f"HTTP/1.1 {estado} {motivos[estado]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                       f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode('latin-1') + cuerpo)
+        try:
+            await escritor.drain()
+        finally:
+            escritor.close()
+
+    async def responder(self, objetivo):
+        """
+        Regresa el estado HTTP y el cuerpo de la respuesta de una ruta.
+        """
+        partes = urlsplit(objetivo)
+        tipo = partes.path.strip('/')
+        parametros = {k: v[-1] for k, v in parse_qs(partes.query).items()}
+
+        if tipo == 'estado':
+            return 200, {'precalculadas': len(self.almacen), 'cache': len(self.cache), 'consultas': self.contadores}
+
+        if tipo not in ['proporciones', 'prevalencias']:
+            return 404, {'error': 'ruta desconocida: /' + tipo}
+
+        inicio = time.perf_counter()
+        try:
+            consulta = normalizar_consulta(tipo, parametros)
+            datos, origen = await self.estimar(consulta)
+        except (AssertionError, ValueError) as e:
+            return 400, {'error': str(e)}
+
+        self.contadores[origen] += 1
+        milisegundos = round((time.perf_counter() - inicio) * 1000, 2)
+        encabezado = json.dumps({'origen': origen, 'milisegundos': milisegundos, 'consulta': consulta}, ensure_ascii=False)
+        return 200, encabezado[:-1].encode('utf-8') + b', "datos": ' + datos + b'}'
+
+    async def iniciar(self, anfitrion='127.0.0.1', puerto=8765):
+        """
+        Inicia el servicio y atiende solicitudes hasta que se interrumpe.
+        """
+        servidor = await asyncio.start_server(self.atender, anfitrion, puerto)
+        print(f"Servicio de estimaciones en http://{anfitrion}:{puerto} ({len(self.almacen)} estimaciones precalculadas)")
+        async with servidor:
+            await servidor.serve_forever()
+
+    def cerrar(self):
+        self.ejecutor.shutdown(cancel_futures=True)
+
+# ------------------ Ejecución desde la línea de comandos ------------------ #
+def leer_consultas(ruta):
+    """
+    Lee un archivo json con una lista de consultas para precalcular, por ejemplo:
+    [{"tipo": "prevalencias", "vars": "al4", "dicc": "1:1,2:0", "des": "sexo"}]
+    """
+    with open(ruta, encoding='utf-8') as fp:
+        consultas = json.load(fp)
+    return [(c['tipo'], {k: str(v) for k, v in c.items() if k != 'tipo'}) for c in consultas]
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Servicio HTTP local de estimaciones de la encuesta.')
+    parser.add_argument('--base', required=True, help='archivo con la base limpia (parquet, feather, pkl o csv)')
+    parser.add_argument('--almacen', default=os.path.join('datos', 'procesados', 'estimaciones_precalculadas.jsonl'),
+                        help='archivo del almacén de estimaciones precalculadas')
+    parser.add_argument('--precalcular', default=None, help='archivo json con consultas para agregar al almacén')
+    parser.add_argument('--anfitrion', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--procesos', type=int, default=2)
+    parser.add_argument('--cache', type=int, default=256, help='número de resultados recientes en memoria')
+    parser.add_argument('--ponderador', default='factor_exp')
+    parser.add_argument('--estrato', default='estrato')
+    parser.add_argument('--upm', default='upm')
+    args = parser.parse_args(argumentos)
+
+    servicio = ServicioEstimaciones(args.base, AlmacenEstimaciones(args.almacen), args.procesos, args.cache,
+                                    args.ponderador, args.estrato, args.upm)
+
+    async def ejecutar():
+        if args.precalcular:
+            num = await servicio.precalcular(leer_consultas(args.precalcular))
+            print(f"Se precalcularon {num} estimaciones")
+        await servicio.iniciar(args.anfitrion, args.puerto)
+
+    try:
+        asyncio.run(ejecutar())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servicio.cerrar()
+
+if __name__ == '__main__':
+    main()
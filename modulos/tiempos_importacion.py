@@ -0,0 +1,105 @@
+'''
+Este archivo mide el tiempo de importación del paquete "modulos", de cada uno de sus módulos y de las
+bibliotecas pesadas que usan. Cada importación se mide en un proceso nuevo de python, de modo que no
+influyen las bibliotecas ya cargadas.
+
+Uso:
+    python -m modulos.tiempos_importacion
+    python -m modulos.tiempos_importacion --repeticiones 5 --detalle modulos.func_visualizacion
+'''
+import os
+import sys
+import argparse
+import subprocess
+
+IMPORTACIONES = ['modulos',
+                 'from modulos import prevalencias',
+                 'modulos.func_analisis',
+                 'modulos.func_transformacion',
+                 'modulos.func_derivadas',
+                 'modulos.func_calibracion',
+                 'modulos.func_validacion',
+                 'modulos.func_salida',
+                 'modulos.func_visualizacion',
+                 'modulos.servicio_estimaciones',
+                 'pandas',
+                 'samplics',
+                 'openpyxl',
+                 'plotly.express']
+
+# ------------------ Función que mide el tiempo de una importación ------------------ #
+def tiempo_importacion(importacion, repeticiones=3):
+    """
+    Mide el tiempo (en segundos) de una importación en un proceso nuevo de python.
+
+    Parámetros:
+    ------------
+    importacion: str
+        Nombre del módulo (por ejemplo 'modulos.func_analisis') o instrucción completa (por ejemplo 'from modulos import prevalencias').
+    repeticiones: int
+        Número de veces que se mide. El valor predeterminado es 3.
+
+    Regresa:
+    ------------
+    float
+        El menor de los tiempos medidos.
+    """
+    instruccion = importacion if ' ' in importacion else 'import ' + importacion
+    codigo = 'import time; t = time.perf_counter(); ' + instruccion + '; print(time.perf_counter() - t)'
+
+    # el paquete se importa desde la carpeta que contiene a "modulos"
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    entorno = dict(os.environ, PYTHONPATH=os.pathsep.join([raiz] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]))
+
+    tiempos = []
+    for _ in range(repeticiones):
+        r = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, env=entorno)
+        if r.returncode != 0:
+            return float('nan')
+        tiempos.append(float(r.stdout.strip().splitlines()[-1]))
+    return min(tiempos)
+
+# ------------------ Función que desglosa una importación ------------------ #
+def detalle_importacion(modulo, n=15):
+    """
+    Regresa las "n" bibliotecas que más tardan en importarse al importar "modulo" (con "python -X importtime").
+
+    Regresa:
+    ------------
+    list
+        Lista de parejas (biblioteca, segundos acumulados).
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    entorno = dict(os.environ, PYTHONPATH=os.pathsep.join([raiz] + [p for p in os.environ.get('PYTHONPATH', '').split(os.pathsep) if p]))
+    r = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + modulo], capture_output=True, text=True, env=entorno)
+
+    tiempos = {}
+    for linea in r.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _, acumulado, nombre = linea[len('import time:'):].split('|')
+        # sólo las bibliotecas de primer nivel de cada paquete
+        nombre = nombre.strip()
+        if '.' not in nombre:
+            tiempos[nombre] = max(tiempos.get(nombre, 0), int(acumulado) / 1e6)
+
+    return sorted(tiempos.items(), key=lambda x: -x[1])[:n]
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description='Tiempos de importación del paquete modulos')
+    parser.add_argument('--repeticiones', type=int, default=3, help='número de mediciones de cada importación')
+    parser.add_argument('--detalle', default=None, help='módulo del que se muestran las bibliotecas que más tardan')
+    args = parser.parse_args(argumentos)
+
+    print('{:<40} {:>10}'.format('importación', 'segundos'))
+    for importacion in IMPORTACIONES:
+        print('{:<40} {:>10.3f}'.format(importacion, tiempo_importacion(importacion, args.repeticiones)))
+
+    if args.detalle:
+        print()
+        print('{:<40} {:>10}'.format(args.detalle, 'segundos'))
+        for nombre, segundos in detalle_importacion(args.detalle):
+            print('{:<40} {:>10.3f}'.format(nombre, segundos))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+'''
+Datos sintéticos con la estructura de la base limpia de la ENCODAT para las pruebas de los módulos.
+'''
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def base_sintetica(n=3000, semilla=0):
+    """
+    Regresa una base con identificadores, diseño muestral (estrato, upm, factor_exp), variables de desagregación
+    y claves de respuesta como las de los cuestionarios (al4: 1/2, tb08: 0 a 5, di1a-di1i: 1/2/9).
+    """
+    r = np.random.default_rng(semilla)
+    b = pd.DataFrame({'id_pers': [f'{i:020d}' for i in range(n)]})
+    b['estrato'] = r.integers(1, 11, n)
+    b['upm'] = b['estrato'] * 100 + r.integers(0, 6, n)
+    b['factor_exp'] = r.integers(100, 2000, n)
+    b['sexo'] = r.choice(['Hombre', 'Mujer'], n)
+    b['grupo_etario'] = r.choice(['12-17', '18-34', '35-59', '60-75'], n)
+    b['cve_ent'] = r.integers(1, 5, n)
+    b['al4'] = r.choice([1, 2], n, p=[.4, .6])
+    b['tb08'] = r.choice([0, 1, 2, 3, 4, 5], n)
+    for v in 'abcdefghi':
+        b['di1' + v] = r.choice([1, 2, 9], n, p=[.05, .9, .05])
+    return b
+
+@pytest.fixture
+def base():
+    return base_sintetica()
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modulos.func_analisis import agregados_upm
+
+INDICADORES = {'alcohol': (['al4'], {1: 1, 2: 0}),
+               'drogas': (['di1' + v for v in 'abcdefghi'], {1: 1, 2: 0, 9: 0})}
+
+def ordenar(a, llaves):
+    return a.sort_values(llaves).reset_index(drop=True)
+
+def test_duckdb_igual_a_pandas_con_llaves_nulas(base):
+    pytest.importorskip('duckdb')
+    b = base.astype({'estrato': 'float64', 'upm': 'float64'})
+    b.loc[b.index[::17], 'estrato'] = np.nan
+    b.loc[b.index[::23], 'upm'] = np.nan
+    b.loc[b.index[::29], 'sexo'] = None
+    llaves = ['estrato', 'upm', 'sexo']
+
+    p = ordenar(agregados_upm(b, INDICADORES, ['sexo'], motor='pandas'), llaves)
+    d = ordenar(agregados_upm(b, INDICADORES, ['sexo'], motor='duckdb'), llaves)
+
+    assert p[llaves].notna().all().all()
+    pd.testing.assert_frame_equal(p, d[p.columns], check_dtype=False)
@@ -0,0 +1,53 @@
+import asyncio
+
+from modulos.servicio_estimaciones import AlmacenEstimaciones, ServicioEstimaciones, huella_base
+
+def test_huella_cambia_con_la_base_y_el_diseno(base, tmp_path):
+    ruta = str(tmp_path / 'base.pkl')
+    base.to_pickle(ruta)
+    huella = huella_base(ruta)
+    assert huella_base(ruta) == huella
+    assert huella_base(ruta, ponderador='otro') != huella
+
+    base.assign(factor_exp=base['factor_exp'] * 1.1).to_pickle(ruta)
+    assert huella_base(ruta) != huella
+
+def test_almacen_se_conserva_o_se_descarta(tmp_path):
+    ruta = str(tmp_path / 'almacen.jsonl')
+    a = AlmacenEstimaciones(ruta)
+    a.vincular('h1')
+    a.agregar('c', b'[{"estimacion": 1.0}]')
+
+    a = AlmacenEstimaciones(ruta)
+    a.vincular('h1')
+    assert a.obtener('c') == b'[{"estimacion": 1.0}]'
+
+    a.vincular('h2')
+    assert len(a) == 0
+    assert len(AlmacenEstimaciones(ruta)) == 0 and AlmacenEstimaciones(ruta).huella == 'h2'
+
+def test_almacen_sin_huella_se_descarta(tmp_path):
+    ruta = tmp_path / 'almacen.jsonl'
+    ruta.write_text('{"clave": "c", "datos": []}\n', encoding='utf-8')
+    a = AlmacenEstimaciones(str(ruta))
+    assert len(a) == 1
+    a.vincular('h1')
+    assert len(a) == 0
+
+def test_servicio_descarta_estimaciones_de_otra_base(base, tmp_path):
+    ruta_base, ruta_almacen = str(tmp_path / 'base.pkl'), str(tmp_path / 'almacen.jsonl')
+    consultas = [('prevalencias', {'vars': 'al4', 'dicc': '1:1,2:0'})]
+
+    def corrida():
+        s = ServicioEstimaciones(ruta_base, AlmacenEstimaciones(ruta_almacen), procesos=1)
+        try:
+            return asyncio.run(s.precalcular(consultas))
+        finally:
+            s.cerrar()
+
+    base.to_pickle(ruta_base)
+    assert corrida() == 1
+    assert corrida() == 0
+
+    base.assign(factor_exp=base['factor_exp'] * 1.1).to_pickle(ruta_base)
+    assert corrida() == 1
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('plotly')
+
+import modulos.func_visualizacion as fv
+
+def especificacion(desplazamiento=0.0):
+    b = pd.DataFrame({'categoria': np.repeat(['A', 'B'], 2), 'sexo': ['Hombres', 'Mujeres'] * 2,
+                      'estimacion': [1.0, 2.0, 3.0, 4.0 + desplazamiento], 'e_inf': 0.5, 'e_sup': 0.5})
+    return {'nombre_salida': 'g', 'tipo': 'barras_sexo',
+            'parametros': dict(b=b, categorias='categoria', orden_cat=['A', 'B'])}
+
+def test_huella_estable_y_depende_de_los_datos():
+    assert fv.huella_grafico(especificacion()) == fv.huella_grafico(especificacion())
+    assert fv.huella_grafico(especificacion()) != fv.huella_grafico(especificacion(1.0))
+    assert fv.huella_grafico(especificacion(), formato='svg') != fv.huella_grafico(especificacion())
+
+def test_huella_cambia_con_las_funciones_auxiliares(monkeypatch):
+    original = fv.huella_grafico(especificacion())
+
+    def otra_series_columnares(b, var_serie, columnas):
+        return None
+
+    monkeypatch.setattr(fv.series_columnares, '__code__', otra_series_columnares.__code__)
+    assert fv.huella_grafico(especificacion()) != original
+
+def test_huella_cambia_con_las_constantes(monkeypatch):
+    original = fv.huella_grafico(especificacion())
+    monkeypatch.setattr(fv, 'COLORES_SEXO', {'Mujeres': '#000000', 'Hombres': '#ffffff'})
+    assert fv.huella_grafico(especificacion()) != original
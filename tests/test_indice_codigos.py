@@ -0,0 +1,46 @@
+import os
+import time
+
+import pytest
+
+from modulos.func_analisis import codigos_observados
+from modulos.func_validacion import IndiceCodigos
+
+def test_indice_se_reutiliza_sin_leer_la_base(base, tmp_path):
+    ruta_base, ruta = str(tmp_path / 'base.pkl'), str(tmp_path / 'codigos.json')
+    base.to_pickle(ruta_base)
+    indice = IndiceCodigos.para_base(base, ruta_base, ruta=ruta)
+    assert indice.codigos('al4') == {1, 2}
+    assert 'id_pers' not in indice.observados
+
+    # con la misma huella el índice se lee del archivo y no se consulta la base
+    leido = IndiceCodigos.para_base(None, ruta_base, ruta=ruta)
+    assert leido.observados == indice.observados and leido.corresponde(ruta_base)
+
+def test_indice_se_recalcula_al_escribir_de_nuevo_la_base(base, tmp_path):
+    ruta_base, ruta = str(tmp_path / 'base.pkl'), str(tmp_path / 'codigos.json')
+    base.to_pickle(ruta_base)
+    indice = IndiceCodigos.para_base(base, ruta_base, ruta=ruta)
+
+    b = base.replace({'al4': {2: 3}})
+    b.to_pickle(ruta_base)
+    os.utime(ruta_base, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert not indice.corresponde(ruta_base)
+    assert IndiceCodigos.para_base(b, ruta_base, ruta=ruta).codigos('al4') == {1, 3}
+
+def test_el_indice_no_se_guarda_en_la_base(base, tmp_path):
+    ruta_base = str(tmp_path / 'base.pkl')
+    base.to_pickle(ruta_base)
+    IndiceCodigos.para_base(base, ruta_base, ruta=str(tmp_path / 'codigos.json'))
+    assert base.attrs == {}
+    assert codigos_observados(base.replace({'al4': {2: 3}}), 'al4') == {1, 3}
+
+def test_validar_dicc_y_reemplazo(base, tmp_path):
+    ruta_base = str(tmp_path / 'base.pkl')
+    base.to_pickle(ruta_base)
+    indice = IndiceCodigos.para_base(base, ruta_base, ruta=str(tmp_path / 'codigos.json'))
+    indice.validar_dicc(['al4'], {1: 1, 2: 0})
+    with pytest.raises(AssertionError, match='falta incluir'):
+        indice.validar_dicc(['di1a'], {1: 1, 2: 0})
+    with pytest.raises(AssertionError, match='faltan claves'):
+        indice.validar_reemplazo({'al4': {1: 'Sí'}})
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modulos.func_analisis import (SIN_CLASIFICAR, prevalencias, prevalencias_des, proporciones, proporciones_des, recodificar,
+                                   tabla_recodificacion)
+
+COLUMNAS = ['estimacion', 'ic_inf', 'ic_sup', 'poblacion', 'error_std', 'cv']
+
+def indicador_referencia(b, lista_vars, dicc):
+    # reclasificación de la versión original de "prevalencias" (replace y suma por renglón)
+    return (b[lista_vars].replace(dicc).sum(axis=1) > 0).astype(int)
+
+def prevalencia_referencia(b, lista_vars, dicc, var_des=None):
+    b_red = b[['factor_exp', 'estrato', 'upm'] + ([var_des] if var_des else [])].copy()
+    b_red['var_agrupada'] = indicador_referencia(b, lista_vars, dicc)
+    if var_des is None:
+        r = proporciones(b_red, 'var_agrupada')
+        return r[r['clave_respuesta'] == 1][COLUMNAS].reset_index(drop=True)
+    r = proporciones_des(b_red, 'var_agrupada', [var_des])
+    return r[r['clave_respuesta'] == 1][[var_des] + COLUMNAS].reset_index(drop=True)
+
+@pytest.mark.parametrize('lista_vars, dicc', [(['al4'], {1: 1, 2: 0}),
+                                              (['tb08'], {1: 1, 2: 1, 3: 1, 4: 0, 5: 0}),
+                                              (['di1' + v for v in 'abcdefghi'], {1: 1, 2: 0, 9: 0})])
+def test_prevalencias_igual_a_la_version_original(base, lista_vars, dicc):
+    r = prevalencias(base, lista_vars, dicc).reset_index(drop=True)
+    pd.testing.assert_frame_equal(r[COLUMNAS], prevalencia_referencia(base, lista_vars, dicc), check_dtype=False)
+
+def test_prevalencias_des_igual_a_la_version_original(base):
+    lista_vars, dicc = ['di1a', 'di1b'], {1: 1, 2: 0, 9: 0}
+    r = prevalencias_des(base, lista_vars, dicc, ['sexo']).reset_index(drop=True)
+    esperado = prevalencia_referencia(base, lista_vars, dicc, 'sexo')
+    pd.testing.assert_frame_equal(r[['sexo'] + COLUMNAS], esperado, check_dtype=False)
+
+def test_recodificar_igual_a_replace(base):
+    dicc = {1: 1, 2: 1, 3: 1, 4: 0, 5: 0}
+    np.testing.assert_array_equal(recodificar(base, 'tb08', dicc), base['tb08'].replace(dicc).to_numpy())
+
+def test_recodificar_clave_faltante(base):
+    with pytest.raises(AssertionError, match='falta incluir'):
+        recodificar(base, 'di1a', {1: 1, 2: 0})
+
+def test_tabla_recodificacion():
+    tabla = tabla_recodificacion({3: 1, 4: 0}, 5)
+    assert tabla[[0, 1, 3, 4]].tolist() == [0, 1, 1, 0]
+    assert tabla[2] == tabla[5] == SIN_CLASIFICAR
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modulos.func_analisis import (CONTEO_BITS, patrones_policonsumo, prevalencias, prevalencias_subconjuntos,
+                                   proporciones)
+
+DROGAS = ['di1' + v for v in 'abcdefghi']
+DICC = {1: 1, 2: 0, 9: 0}
+COLUMNAS = ['estimacion', 'ic_inf', 'ic_sup', 'poblacion', 'error_std', 'cv']
+
+def test_conteo_bits():
+    enteros = np.arange(2**16)
+    assert CONTEO_BITS.tolist() == [bin(x).count('1') for x in enteros]
+
+def test_al_menos_uno_igual_a_prevalencias(base):
+    subconjuntos = {'ab': ['di1a', 'di1b'], 'todas': DROGAS}
+    r = prevalencias_subconjuntos(base, DROGAS, DICC, subconjuntos)
+    for nombre, lista_vars in subconjuntos.items():
+        esperado = prevalencias(base, lista_vars, DICC).reset_index(drop=True)[COLUMNAS]
+        obtenido = r[r['indicador'] == nombre].reset_index(drop=True)[COLUMNAS]
+        pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+
+def test_al_menos_k_igual_a_la_suma_de_indicadores(base):
+    r = prevalencias_subconjuntos(base, DROGAS, DICC, {'dos_o_mas': {'variables': DROGAS, 'k': 2}})
+
+    b_red = base[['factor_exp', 'estrato', 'upm']].copy()
+    b_red['var_agrupada'] = (base[DROGAS].replace(DICC).sum(axis=1) >= 2).astype(int)
+    esperado = proporciones(b_red, 'var_agrupada')
+    esperado = esperado[esperado['clave_respuesta'] == 1].reset_index(drop=True)[COLUMNAS]
+
+    pd.testing.assert_frame_equal(r[COLUMNAS], esperado, check_dtype=False)
+
+def test_numero_de_eventos_igual_a_la_suma_de_indicadores(base):
+    num, pat = patrones_policonsumo(base, DROGAS[:3], DICC)
+
+    b_red = base[['factor_exp', 'estrato', 'upm']].copy()
+    b_red['num_eventos'] = base[DROGAS[:3]].replace(DICC).sum(axis=1)
+    esperado = proporciones(b_red, 'num_eventos')
+
+    pd.testing.assert_frame_equal(num.reset_index(drop=True), esperado.reset_index(drop=True), check_dtype=False)
+    assert set(pat['patron']) <= {'Ninguno', 'di1a', 'di1b', 'di1c', 'di1a + di1b', 'di1a + di1c', 'di1b + di1c', 'di1a + di1b + di1c'}
+
+def test_subconjunto_invalido(base):
+    with pytest.raises(AssertionError):
+        prevalencias_subconjuntos(base, DROGAS, DICC, {'ab': ('di1a', 'di1b')})
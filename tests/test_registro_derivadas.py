@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from modulos.func_analisis import indicador_prevalencia
+from modulos.func_derivadas import RegistroDerivadas
+
+def registro(ruta, dicc=None):
+    return (RegistroDerivadas(str(ruta))
+            .registrar('al_anual', ['al4'], dicc if dicc else {1: 1, 2: 0})
+            .registrar('dos_drogas', ['di1' + v for v in 'abcdefghi'], {1: 1, 2: 0, 9: 0}, k=2))
+
+def test_agregar_igual_al_indicador(base, tmp_path):
+    b = registro(tmp_path).agregar(base.copy())
+    np.testing.assert_array_equal(b['al_anual'], indicador_prevalencia(base, ['al4'], {1: 1, 2: 0}))
+
+def test_se_reutiliza_con_la_misma_base(base, tmp_path):
+    assert registro(tmp_path).materializar(base) == ['al_anual', 'dos_drogas']
+    assert registro(tmp_path).materializar(base) == []
+
+def test_se_recalcula_al_cambiar_la_definicion(base, tmp_path):
+    registro(tmp_path).materializar(base)
+    assert registro(tmp_path, {1: 0, 2: 1}).materializar(base) == ['al_anual']
+
+def test_se_recalcula_al_cambiar_las_variables_de_origen(base, tmp_path):
+    registro(tmp_path).materializar(base)
+    b = base.replace({'al4': {2: 1}})
+    r = registro(tmp_path)
+    with pytest.raises(AssertionError, match='base distinta'):
+        r.cargar('al_anual', b)
+    assert r.materializar(b) == ['al_anual']
+    assert r.cargar('al_anual', b).all()
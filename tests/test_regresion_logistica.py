@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modulos.func_analisis import prevalencias, regresiones_logisticas
+
+ALCOHOL = {'alcohol': (['al4'], {1: 1, 2: 0})}
+
+def test_intercepto_igual_a_la_prevalencia(base):
+    # con sólo el intercepto, el coeficiente es el logit de la prevalencia y su error estándar
+    # es el de la prevalencia por el método delta
+    r = regresiones_logisticas(base, ALCOHOL, [])
+    p = prevalencias(base, ['al4'], {1: 1, 2: 0}).iloc[0]
+    q = p['estimacion'] / 100
+
+    assert r.loc[0, 'coeficiente'] == pytest.approx(np.log(q / (1 - q)), rel=1e-9)
+    assert r.loc[0, 'error_std'] == pytest.approx(p['error_std'] / 100 / (q * (1 - q)), rel=1e-6)
+
+def test_coeficientes_igual_a_glm_ponderado(base):
+    sm = pytest.importorskip('statsmodels.api')
+    r = regresiones_logisticas(base, ALCOHOL, ['sexo', 'grupo_etario'])
+
+    X = pd.get_dummies(base[['sexo', 'grupo_etario']], drop_first=True, dtype=float)
+    X.insert(0, 'intercepto', 1.0)
+    y = (base['al4'] == 1).astype(float)
+    glm = sm.GLM(y, X, family=sm.families.Binomial(), var_weights=base['factor_exp'].astype(float)).fit(tol=1e-12)
+
+    np.testing.assert_allclose(r['coeficiente'].to_numpy(), glm.params.to_numpy(), rtol=1e-7)
+
+def test_matriz_dispersa_igual_a_densa(base):
+    densa = regresiones_logisticas(base, ALCOHOL, ['sexo', 'cve_ent'], categoricas=['sexo', 'cve_ent'])
+    dispersa = regresiones_logisticas(base, ALCOHOL, ['sexo', 'cve_ent'], categoricas=['sexo', 'cve_ent'], disperso=True)
+    pd.testing.assert_frame_equal(densa, dispersa, rtol=1e-9)
+
+def test_respuesta_sin_reclasificar(base):
+    with pytest.raises(AssertionError, match='0 o 1'):
+        regresiones_logisticas(base, {'alcohol': 'al4'}, ['sexo'])
+
+def test_terminos_colineales(base):
+    b = base.assign(sexo_2=base['sexo'])
+    with pytest.raises(AssertionError, match='sexo_2'):
+        regresiones_logisticas(b, ALCOHOL, ['sexo', 'sexo_2'])
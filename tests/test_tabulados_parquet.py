@@ -0,0 +1,15 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow', exc_type=ImportError)
+
+from modulos.func_salida import guardar_tabulados_parquet, leer_tabulados_parquet
+
+def test_tipos_distintos_entre_particiones(tmp_path):
+    a = pd.DataFrame({'cve_ent': [1, 2], 'estimacion': [1, 2]})
+    b = pd.DataFrame({'cve_ent': ['NAC', '1'], 'estimacion': [1.5, 2.5]})
+    guardar_tabulados_parquet({('a', 'estatal'): a, ('b', 'estatal'): b}, '2016-2017', ruta=str(tmp_path))
+
+    r = leer_tabulados_parquet(str(tmp_path)).sort_values(['indicador', 'estimacion'])
+    assert r['cve_ent'].tolist() == ['1', '2', 'NAC', '1']
+    assert r['estimacion'].tolist() == [1.0, 2.0, 1.5, 2.5]
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from modulos.func_transformacion import claves_enteras, vincular_hogares
+
+def test_equivalente_al_merge():
+    r = np.random.default_rng(1)
+    ids = [f'{r.integers(10**9, 10**10)}{i:010d}' for i in range(300)]
+    h = pd.DataFrame({'id_hogar': ids, 'estrato': r.integers(1, 20, 300), 'upm': r.integers(100, 160, 300)})
+    bb = pd.DataFrame({'id_pers': [i + f'{k:02d}' for i in ids for k in range(2)] + ['0' * 20 + '01']})
+    bb['al4'] = r.choice([1, 2], len(bb))
+    bb.index = bb.index * 3 + 5
+
+    esperado = bb.copy()
+    esperado.insert(0, 'id_hogar', esperado['id_pers'].str[:20])
+    esperado = esperado.merge(h[['id_hogar', 'estrato', 'upm']], on='id_hogar', how='left')
+
+    pd.testing.assert_frame_equal(vincular_hogares(bb, h, ['estrato', 'upm']), esperado)
+
+def test_ceros_a_la_izquierda():
+    k_pers, k_hog = claves_enteras(pd.Series(['012', '12']), pd.Series(['12', '012', '0012']))
+    assert k_pers[0] == k_hog[1] and k_pers[1] == k_hog[0]
+    assert len(set(k_hog.tolist())) == 3